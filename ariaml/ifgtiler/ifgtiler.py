@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from __future__ import absolute_import, print_function, division
 from builtins import str
+import numpy as np
 import pylab as pl
 import sys
 from imtiler import *
@@ -11,11 +12,36 @@ unwpng = 'filt_topophase.unw.geo.browse.png'
 cohpng = 'topophase_ph_only.cor.geo.browse.png'
 
 from skimage.transform import resize as imresize
+def convex_hull(xy):
+    '''
+    convex hull (monotone chain) of 2xN points, returned as 2xH counterclockwise vertices
+    '''
+    pts = np.unique(np.asarray(xy,dtype=np.float64).T,axis=0)
+    if pts.shape[0] < 3:
+        return pts.T
+
+    def half(points):
+        chain = []
+        for p in points:
+            while len(chain) >= 2:
+                o,a = chain[-2],chain[-1]
+                if (a[0]-o[0])*(p[1]-o[1]) - (a[1]-o[1])*(p[0]-o[0]) > 0:
+                    break
+                chain.pop()
+            chain.append(p)
+        return chain
+
+    lower = half(pts)
+    upper = half(pts[::-1])
+    return np.array(lower[:-1]+upper[:-1]).T
+
 def rotate_bbox(bbox_xy,snap=1.0):
     '''
     computes rotation matrix minimizing *width* of bounding box
+    the width is minimal with a hull edge parallel to the y axis (rotating
+    calipers), so only the hull edge normals need to be checked
     '''
-    from numpy import cos, sin, arange, abs, dot, radians
+    from numpy import cos, sin, abs, dot, radians, degrees, arctan2
     rot_xy = bbox_xy
     rot_mat = [[1.0,0.0],[0.0,1.0]]
     rot_deg = 0.0
@@ -24,34 +50,52 @@ def rotate_bbox(bbox_xy,snap=1.0):
 
     xr = extrema(bbox_xy[0,:])
     rot_min = abs(xr[1]-xr[0])
-    for r in arange(-90,91,snap):
-        ar    = radians(r)
-        cosr  = cos(ar)
-        sinr  = sin(ar)
-        r_ar   = [[cosr,-sinr], [sinr,cosr]]
-        r_xy   = dot(r_ar,bbox_xy)
-        xr     = extrema(r_xy[0,:])
-        r_diff = abs(xr[1]-xr[0])
-        # NOTE (BDB, 09/01/15): code below finds min size (not min width) bbox
-        # yr = extrema(rxy[1,:])
-        # r_diff = np_min([xr[1]-xr[0],yr[1]-yr[0]]) 
-        if r_diff < rot_min:
-            rot_min = r_diff
-            rot_xy,rot_mat,rot_deg  = r_xy,r_ar,r
+
+    hull = convex_hull(bbox_xy)
+    if hull.shape[1] < 3:
+        return rot_xy, rot_mat, rot_deg
+    edges = np.roll(hull,-1,axis=1) - hull
+    # rotating by r maps x to cos(r)*x - sin(r)*y, so the width along the
+    # edge normal (nx,ny) is the x extent after rotating by atan2(-ny,nx)
+    angles = degrees(arctan2(-edges[0],-edges[1]))
+    angles = (angles + 90.0) % 180.0 - 90.0
+    # keep the angles on the snap grid of the exhaustive search
+    angles = np.unique(np.clip(np.round(angles/snap)*snap,-90,90))
+    ar = radians(angles)
+    widths = np.ptp(cos(ar)[:,None]*hull[0] - sin(ar)[:,None]*hull[1],axis=1)
+    best = np.argmin(widths)
+    if widths[best] < rot_min:
+        r = angles[best]
+        cosr,sinr = cos(radians(r)),sin(radians(r))
+        rot_mat = [[cosr,-sinr], [sinr,cosr]]
+        rot_xy = dot(rot_mat,bbox_xy)
+        rot_deg = r
 
     return rot_xy, rot_mat, rot_deg
 
+def footprint_xy(valid):
+    '''
+    first and last valid column of every row of a mask as 2xN (x,y) points,
+    which have the same convex hull as the whole valid footprint
+    '''
+    rows = np.where(valid.any(axis=1))[0]
+    first = valid[rows].argmax(axis=1)
+    last = valid.shape[1]-1-valid[rows][:,::-1].argmax(axis=1)
+    return np.c_[np.r_[first,last],np.r_[rows,rows]].T
+
 def rotate_crop_geo(ifg,coh):
     # rotate and crop zero boundaries of orthorectified IFGs
     # to extract more informative tiles 
     from skimage.transform import rotate as imrotate
-    from skimage.segmentation import find_boundaries
     assert(ifg.dtype==np.float32 and coh.dtype == np.float32)
-    zero_bounds = find_boundaries((ifg!=0).all(axis=2),mode='thick')
-    bbox_xy = np.c_[np.where(zero_bounds.T)].T
-    rot_xy, rot_mat, rot_deg = rotate_bbox(bbox_xy,snap=1.0)    
-    ifg = imrotate(ifg,-rot_deg,preserve_range=True)
-    coh   = imrotate(coh,-rot_deg,preserve_range=True)
+    bbox_xy = footprint_xy((ifg!=0).all(axis=2))
+    rot_xy, rot_mat, rot_deg = rotate_bbox(bbox_xy,snap=1.0)
+    # resample ifg and coherence together in a single pass
+    nband = ifg.shape[2]
+    stack = np.concatenate((ifg,coh if coh.ndim==3 else coh[:,:,None]),axis=2)
+    stack = imrotate(stack,-rot_deg,preserve_range=True)
+    ifg = stack[:,:,:nband]
+    coh = stack[:,:,nband:] if coh.ndim==3 else stack[:,:,nband]
     nonzero =  (ifg!=0).any(axis=2)
     keeprows = nonzero.any(axis=1)
     keepcols = nonzero.any(axis=0)
@@ -1,14 +1,67 @@
 #!/usr/bin/env python
-import os, sys, fcntl, errno, traceback, time, re, shutil
+import os, sys, fcntl, errno, traceback, time, re, shutil, json, argparse, stat
 from glob import glob
 
 
 PROD_RE = re.compile(r'datastager-(.*?)-')
 
+INDEX_FILE = '.janitor_index.json'
 
-def janitor(root_work_dir):
-    """Clean up large files when no longer needed."""
 
+def dir_size(path):
+    """Total size in bytes of the files under path."""
+
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try: total += os.lstat(os.path.join(root, f)).st_size
+            except OSError: pass
+    return total
+
+
+def last_access(path):
+    """
+    Latest use of path: modification time of the directory and access or
+    modification time of its top level entries. Directory access times are
+    ignored since listing them (as the janitor does) updates them.
+    """
+
+    latest = os.stat(path).st_mtime
+    for i in os.listdir(path):
+        try: st = os.lstat(os.path.join(path, i))
+        except OSError: continue
+        if stat.S_ISDIR(st.st_mode): latest = max(latest, st.st_mtime)
+        else: latest = max(latest, st.st_atime, st.st_mtime)
+    return latest
+
+
+def free_fraction(path):
+    """Fraction of the file system holding path that is free."""
+
+    st = os.statvfs(path)
+    return float(st.f_bavail) / st.f_blocks
+
+
+def load_index(index_file):
+    try:
+        with open(index_file) as f: return json.load(f)
+    except (IOError, OSError, ValueError): return {}
+
+
+def save_index(index_file, index):
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'w') as f: json.dump(index, f, indent=2, sort_keys=True)
+    os.rename(tmp_file, index_file)
+
+
+def update_index(root_work_dir, index):
+    """
+    Refresh the index of staged products: size, last access and whether the
+    job that staged it is done. Sizes are only recomputed when the product
+    directory changed since the last run.
+    """
+
+    current = {}
     ds_dirs = glob("%s/????/??/??/datastager-*" % root_work_dir)
     for ds_dir in ds_dirs:
         match = PROD_RE.search(ds_dir)
@@ -16,12 +69,73 @@ def janitor(root_work_dir):
 
         prod = match.group(1)
         prod_dir = os.path.join(ds_dir, prod)
-        if os.path.exists(os.path.join(ds_dir, '.done')):
-            if os.path.exists(prod_dir): shutil.rmtree(prod_dir)
-            
-        
+        if not os.path.exists(prod_dir): continue
+        mtime = os.stat(prod_dir).st_mtime
+        entry = index.get(prod_dir)
+        if entry is None or entry['mtime'] != mtime:
+            entry = {'mtime': mtime, 'size': dir_size(prod_dir)}
+        entry['atime'] = last_access(prod_dir)
+        entry['done'] = os.path.exists(os.path.join(ds_dir, '.done'))
+        current[prod_dir] = entry
+    return current
+
+
+def janitor(root_work_dir, target_free=0.2, max_age=7., dry_run=False):
+    """
+    Clean up staged products of finished jobs.
+
+    Products older than max_age days are always removed. The others are
+    removed least recently used first, only while the free space of the work
+    area is below the target_free fraction. Products of running jobs (no .done)
+    are never touched. Returns the number of bytes reclaimed.
+    """
+
+    index_file = os.path.join(root_work_dir, INDEX_FILE)
+    index = update_index(root_work_dir, load_index(index_file))
+
+    now = time.time()
+    candidates = sorted([(e['atime'], p) for p, e in index.items() if e['done']])
+    need = max(0., target_free - free_fraction(root_work_dir))
+    st = os.statvfs(root_work_dir)
+    need_bytes = need * st.f_blocks * st.f_frsize
+
+    reclaimed = 0
+    removed = 0
+    for atime, prod_dir in candidates:
+        size = index[prod_dir]['size']
+        expired = now - atime > max_age * 86400.
+        if not expired and reclaimed >= need_bytes: continue
+        print("Removing %s (%d bytes, last access %s)%s" % (prod_dir, size,
+              time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(atime)),
+              " [dry run]" if dry_run else ""))
+        if not dry_run:
+            shutil.rmtree(prod_dir, ignore_errors=True)
+            del index[prod_dir]
+        reclaimed += size
+        removed += 1
+
+    if not dry_run: save_index(index_file, index)
+    print("Reclaimed %d bytes from %d of %d finished products (%d held by running jobs)" %
+          (reclaimed, removed, len(candidates), len([e for e in index.values() if not e['done']])))
+    return reclaimed
+
+
+def parse():
+    parser = argparse.ArgumentParser(description="Clean up staged products of finished datastager jobs.")
+    parser.add_argument('--root', default="/data/work/jobs", help="root work directory")
+    parser.add_argument('--target-free', type=float, default=0.2, dest='target_free',
+                        help="free space fraction to reach by removing products")
+    parser.add_argument('--max-age', type=float, default=7., dest='max_age',
+                        help="days after last access when products are always removed")
+    parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                        help="only report what would be removed")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
 
+    inps = parse()
+
     # lock so that only one instance can run
     lock_file = "/tmp/datastager_janitor.lock"
     f = open(lock_file, 'w')
@@ -35,8 +149,7 @@ if __name__ == "__main__":
         raise
 
     # run cleanup
-    root_work_dir = "/data/work/jobs"
-    try: janitor(root_work_dir)
+    try: janitor(inps.root, inps.target_free, inps.max_age, inps.dry_run)
     finally:
         f.close()
         os.unlink(lock_file)
@@ -25,6 +25,7 @@ from frameMetadata.FrameMetadata import FrameMetadata
 from frameMetadata.OrbitInfo import OrbitInfo
 from utils.UrlUtils import UrlUtils
 from utils.queryBuilder import postQuery,buildQuery,createMetaObjects
+from utils import baseline_cache
 import math
 
 # at the moment there is no localized config with the grq server. get it from the PegRegionChecker
@@ -230,7 +231,6 @@ class FrameInfoExtractor():
     def computeBaseline(self, fm):
        
         ret = True
-        oi = OrbitInfo(fm)
         requester = Http()
         uu = UrlUtils()
         rest_url = uu.rest_url
@@ -273,7 +273,7 @@ class FrameInfoExtractor():
         #print("params", params)
         query = buildQuery(params,['within'])
         #print("query: %s" % json.dumps(query, indent=2))
-        metList,status = postQuery(query)
+        metList,status = baseline_cache.queryReferences(params,query)
                 
         # if empty no results available
         if status:
@@ -284,10 +284,8 @@ class FrameInfoExtractor():
                     print("WARNING FrameInfoExtractor: Expecting only one frame to be reference")
                 
                 fmRef = metObj[0]
-                oiRef = OrbitInfo(fmRef)
-                oi.computeBaseline(oiRef)
-                bl = oi.getBaseline()
-                baseline = [bl['horz'], bl['vert'], bl['total']]
+                refId = metList[0].get('id',metList[0].get('url'))
+                baseline = baseline_cache.getBaseline(fm,fmRef,refId)
                 fm.refbbox = fmRef.refbbox
                 fm.reference = False
                 fm._bbox = []
@@ -8,6 +8,7 @@ from isceobj.Planet.Planet import Planet
 import stdproc
 from iscesys.StdOEL.StdOELPy import create_writer
 import numpy
+from frameMetadata.OrbitInterpolator import OrbitInterpolator
 
 
 class OrbitInfo(object):
@@ -26,6 +27,7 @@ class OrbitInfo(object):
 
         self.coherenceThreshold = 0.2
         self.orbVec = None 
+        self.interpolator = None
         self.tMid = self.tStart +old_div(sum([self.tStop-self.tStart,
                     datetime.timedelta()],datetime.timedelta()),2)
         self.pos = None
@@ -66,12 +68,30 @@ class OrbitInfo(object):
                     velocity=satVel[kk])
             self.orbVec.addStateVector(tempVec)
 
-        stateVec = self.orbVec.interpolateOrbit(self.tMid, 'hermite')
-        self.pos = stateVec.getPosition()
-        self.vel = stateVec.getVelocity()
+        ####State vector windows are set up once for all later interpolations
+        self.interpolator = OrbitInterpolator(relTims, satPos, satVel, refTime)
+        pos, vel = self.interpolator.interpolate([self.tMid])
+        self.pos = pos[0].tolist()
+        self.vel = vel[0].tolist()
         return
 
 
+    def interpolateAt(self, times):
+        '''
+        Return (position, velocity) arrays of shape (N,3) at the given epochs,
+        evaluated in one call.
+        '''
+        return self.interpolator.interpolate(times)
+
+    def ensureLookAngle(self):
+        '''
+        Estimate the look angle from the peg if not already available.
+        '''
+        if self.clook is None:
+            if self.hgt is None:
+                self.computePeg()
+            self.computeLookAngle()
+
     def computeLookAngle(self):
         self.clook = old_div((2*self.hgt*self.rds+self.hgt**2+self.rng**2),(2*self.rng*(self.rds+self.hgt)))
         self.slook = numpy.sqrt(1-self.clook**2)
@@ -81,10 +101,10 @@ class OrbitInfo(object):
     def computePeg(self):
 
         shortOrb = Orbit()
-        for i in range(-10,10):
-            time = self.tMid + datetime.timedelta(seconds=(old_div(i,self.prf)))
-            sv = self.orbVec.interpolateOrbit(time, method='hermite')
-            shortOrb.addStateVector(sv)
+        times = [self.tMid + datetime.timedelta(seconds=(old_div(i,self.prf))) for i in range(-10,10)]
+        pos, vel = self.interpolateAt(times)
+        for time,svpos,svvel in zip(times,pos,vel):
+            shortOrb.addStateVector(StateVector(time=time, position=svpos.tolist(), velocity=svvel.tolist()))
 
         objPeg = stdproc.createGetpeg()
         objPeg.wireInputPort(name='planet', object=self.planet)
@@ -109,6 +129,7 @@ class OrbitInfo(object):
         This is meant to be used during data ingest.
         '''
 
+        self.ensureLookAngle()
         mpos = numpy.array(self.pos)
         mvel = numpy.array(self.vel)
 
@@ -135,13 +156,12 @@ class OrbitInfo(object):
 #            raise Exception('Out of bounds. Try the next frame in time.')
 
         try:
-            svector = slave.orbVec.interpolateOrbit(slave_time, method='hermite')
+            spos, svel = slave.interpolateAt([slave_time])
         except:
             raise Exception('Error in interpolating orbits. Possibly using non geo-located images.')
 
-        spos = numpy.array(svector.getPosition())
-        svel = numpy.array(svector.getVelocity())
-        svel = numpy.linalg.norm(svel)
+        spos = spos[0]
+        svel = numpy.linalg.norm(svel[0])
 
         dx = spos-mpos
         hb = numpy.dot(dx, crp)
@@ -203,3 +223,96 @@ class OrbitInfo(object):
         if(self.coherence >= threshold):
             ret = True
         return ret
+
+
+class CoherenceEngine(object):
+    '''
+    Expected coherence of many frame pairs at once.
+
+    Every frame is unpacked into an OrbitInfo (orbit and peg) only once, each
+    slave orbit is interpolated once at all the epochs its pairs need and the
+    baselines of all the pairs are computed as arrays. Gives the same values as
+    OrbitInfo.computeCoherenceNoRef for each pair.
+    '''
+    def __init__(self, Bcrit=400., Tau=180.0, Doppler=0.4):
+        self.Bcrit = Bcrit
+        self.Tau = Tau
+        self.Doppler = Doppler
+        #frames are keyed by object id, so keep them alive with their OrbitInfo
+        self._orbits = {}
+
+    def orbitInfo(self, fm):
+        '''
+        OrbitInfo of the frame, created once per frame.
+        '''
+        key = id(fm)
+        if key not in self._orbits:
+            self._orbits[key] = (fm, OrbitInfo(fm))
+        return self._orbits[key][1]
+
+    def coherence(self, pairs):
+        '''
+        Expected coherence of a list of (master, slave) FrameMetadata pairs.
+        '''
+        npairs = len(pairs)
+        if npairs == 0:
+            return numpy.zeros(0)
+
+        masters = [self.orbitInfo(fm1) for fm1,fm2 in pairs]
+        slaves = [self.orbitInfo(fm2) for fm1,fm2 in pairs]
+        for oi in masters:
+            oi.ensureLookAngle()
+
+        mpos = numpy.array([oi.pos for oi in masters], dtype=float)
+        mvel = numpy.array([oi.vel for oi in masters], dtype=float)
+        spos = numpy.array([oi.pos for oi in slaves], dtype=float)
+        sprf = numpy.array([oi.prf for oi in slaves], dtype=float)
+
+        #######From the ROI-PAC scripts, see OrbitInfo.computeBaseline
+        rvec = mpos / numpy.linalg.norm(mpos, axis=1)[:,None]
+        crp = numpy.cross(rvec, mvel) / numpy.linalg.norm(mvel, axis=1)[:,None]
+        crp = crp / numpy.linalg.norm(crp, axis=1)[:,None]
+        vvec = numpy.cross(crp, rvec)
+        mveln = numpy.linalg.norm(mvel, axis=1)
+
+        z_offset = sprf * numpy.sum((spos - mpos) * vvec, axis=1) / mveln
+        shift = z_offset / sprf
+
+        ####Interpolate every slave orbit once at the epochs of all its pairs
+        bySlave = {}
+        for kk,oi in enumerate(slaves):
+            bySlave.setdefault(id(oi), []).append(kk)
+
+        for index in bySlave.values():
+            oi = slaves[index[0]]
+            times = [oi.tMid - datetime.timedelta(seconds=shift[kk]) for kk in index]
+            try:
+                pos, vel = oi.interpolateAt(times)
+            except:
+                raise Exception('Error in interpolating orbits. Possibly using non geo-located images.')
+            spos[index] = pos
+
+        dx = spos - mpos
+        hb = numpy.sum(dx * crp, axis=1)
+        vb = numpy.sum(dx * rvec, axis=1)
+
+        lookSide = numpy.array([oi.lookSide for oi in masters], dtype=float)
+        clook = numpy.array([oi.clook for oi in masters], dtype=float)
+        slook = numpy.array([oi.slook for oi in masters], dtype=float)
+        Bperp = numpy.abs(lookSide*hb*clook + vb*slook)
+
+        Btemp = numpy.array([abs(fm1.sensingStart.toordinal() - fm2.sensingStart.toordinal())
+                    for fm1,fm2 in pairs], dtype=float)
+        Bdop = numpy.array([abs((oi.fd * oi.prf - fm2.doppler * fm2.prf) / oi.prf)
+                    for oi,(fm1,fm2) in zip(masters, pairs)], dtype=float)
+
+        geomRho = (1-numpy.clip(Bperp/self.Bcrit, 0., 1.))
+        tempRho = numpy.exp(-1.0*Btemp/self.Tau)
+        dopRho  = Bdop < self.Doppler
+        return geomRho * tempRho * dopRho
+
+    def isCoherent(self, pairs, threshold=0.3):
+        '''
+        Boolean array, True for the pairs with expected coherence >= threshold.
+        '''
+        return self.coherence(pairs) >= threshold
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+'''
+Vectorized Hermite interpolation of orbit state vectors.
+
+Same scheme as the hermite method of isce Orbit.interpolateOrbit: position and
+velocity at an epoch come from the 4 state vectors around it (2 before, 2
+after). The windows and their node differences are set up once, so arrays of
+epochs are evaluated in a single call.
+
+Running this module times it against the per-epoch isce path on a synthetic
+orbit:
+
+    python OrbitInterpolator.py --epochs 1000
+'''
+from __future__ import division
+from __future__ import print_function
+import datetime
+import numpy
+
+class OrbitInterpolator(object):
+    '''
+    Hermite interpolator over a set of state vectors.
+    '''
+    #number of state vectors used for each epoch
+    NPOINTS = 4
+
+    def __init__(self, times, pos, vel, refTime=None):
+        '''
+        @param times: state vector times, seconds since refTime (or datetimes)
+        @param pos: (N,3) positions
+        @param vel: (N,3) velocities
+        @param refTime: datetime of time 0, needed for datetime epochs
+        '''
+        if refTime is None and len(times) and isinstance(times[0], datetime.datetime):
+            refTime = times[0]
+        self.refTime = refTime
+        times = self.toSeconds(times)
+        order = numpy.argsort(times)
+        self.times = times[order]
+        self.pos = numpy.asarray(pos, dtype=float)[order]
+        self.vel = numpy.asarray(vel, dtype=float)[order]
+        if len(self.times) < self.NPOINTS:
+            raise ValueError('Need at least %d state vectors for hermite interpolation' % self.NPOINTS)
+
+        ####Precompute 1/(t_i - t_j) of every window, 0 on the diagonal
+        nwin = len(self.times) - self.NPOINTS + 1
+        idx = numpy.arange(nwin)[:,None] + numpy.arange(self.NPOINTS)[None,:]
+        tw = self.times[idx]
+        diff = tw[:,:,None] - tw[:,None,:]
+        eye = numpy.eye(self.NPOINTS, dtype=bool)
+        diff[:,eye] = 1.0
+        inv = 1.0 / diff
+        inv[:,eye] = 0.0
+        self._winTimes = tw
+        self._winInv = inv
+        self._winSum = inv.sum(axis=2)
+
+    def toSeconds(self, epochs):
+        '''
+        Convert datetimes (or seconds) to seconds since refTime.
+        '''
+        epochs = list(epochs) if not isinstance(epochs, numpy.ndarray) else epochs
+        if len(epochs) and isinstance(epochs[0], datetime.datetime):
+            return numpy.array([(t - self.refTime).total_seconds() for t in epochs])
+        return numpy.asarray(epochs, dtype=float)
+
+    def interpolate(self, epochs):
+        '''
+        Return (position, velocity) arrays of shape (M,3) at the epochs.
+        Epochs are datetimes or seconds since refTime.
+        '''
+        t = numpy.atleast_1d(self.toSeconds(epochs))
+        if numpy.any(t < self.times[0]) or numpy.any(t > self.times[-1]):
+            raise ValueError('Requested epoch outside of the orbit state vectors')
+
+        npts = self.NPOINTS
+        start = numpy.searchsorted(self.times, t, side='right') - npts//2
+        start = numpy.clip(start, 0, len(self.times) - npts)
+        idx = start[:,None] + numpy.arange(npts)[None,:]
+
+        tw = self._winTimes[start]
+        inv = self._winInv[start]
+        S = self._winSum[start]
+        X = self.pos[idx]
+        V = self.vel[idx]
+
+        d = t[:,None] - tw
+        #r_ij = (t - t_j)/(t_i - t_j), 1 on the diagonal
+        r = d[:,None,:] * inv
+        eye = numpy.eye(npts, dtype=bool)
+        r[:,eye] = 1.0
+
+        #Lagrange basis and its derivative
+        h = numpy.prod(r, axis=2)
+        hdot = numpy.zeros_like(h)
+        for j in range(npts):
+            rj = r.copy()
+            rj[:,:,j] = 1.0
+            hdot += inv[:,:,j] * numpy.prod(rj, axis=2)
+
+        f0 = 1.0 - 2.0 * d * S
+        g0 = 2.0 * (f0 * hdot - h * S)
+        g1 = h + 2.0 * d * hdot
+
+        pos = numpy.einsum('mik,mi->mk', X, f0*h*h) + numpy.einsum('mik,mi->mk', V, d*h*h)
+        vel = numpy.einsum('mik,mi->mk', X, g0*h) + numpy.einsum('mik,mi->mk', V, g1*h)
+        return pos, vel
+
+
+def syntheticOrbit(nvec=20, spacing=10.0):
+    '''
+    Circular orbit state vectors: (times, pos, vel, refTime).
+    '''
+    radius = 7.07e6
+    omega = 2*numpy.pi / 5900.0
+    times = numpy.arange(nvec) * spacing
+    inc = numpy.radians(98.0)
+    ang = omega * times
+    pos = radius * numpy.stack([numpy.cos(ang), numpy.sin(ang)*numpy.cos(inc), numpy.sin(ang)*numpy.sin(inc)], axis=1)
+    vel = radius * omega * numpy.stack([-numpy.sin(ang), numpy.cos(ang)*numpy.cos(inc), numpy.cos(ang)*numpy.sin(inc)], axis=1)
+    return times, pos, vel, datetime.datetime(2020, 1, 1)
+
+def benchmark(nepochs=1000, nvec=20):
+    '''
+    Time the vectorized path against the per-epoch path and report the largest
+    position difference between them.
+    '''
+    import time
+    times, pos, vel, refTime = syntheticOrbit(nvec)
+    epochs = [refTime + datetime.timedelta(seconds=s)
+              for s in numpy.random.uniform(times[0], times[-1], nepochs)]
+
+    t0 = time.time()
+    interp = OrbitInterpolator(times, pos, vel, refTime)
+    vpos, vvel = interp.interpolate(epochs)
+    vecTime = time.time() - t0
+
+    try:
+        from isceobj.Orbit.Orbit import Orbit, StateVector
+        orb = Orbit()
+        for kk in range(nvec):
+            orb.addStateVector(StateVector(time=refTime + datetime.timedelta(seconds=times[kk]),
+                                           position=list(pos[kk]), velocity=list(vel[kk])))
+        scalar = lambda epoch: orb.interpolateOrbit(epoch, method='hermite').getPosition()
+        label = 'isce Orbit.interpolateOrbit'
+    except ImportError:
+        scalar = lambda epoch: interp.interpolate([epoch])[0][0]
+        label = 'per epoch OrbitInterpolator (isce not available)'
+
+    t0 = time.time()
+    spos = numpy.array([scalar(epoch) for epoch in epochs])
+    scaTime = time.time() - t0
+
+    print('epochs: %d, state vectors: %d' % (nepochs, nvec))
+    print('scalar path (%s): %.4f s' % (label, scaTime))
+    print('vectorized path: %.4f s (x%.1f)' % (vecTime, scaTime / max(vecTime, 1e-9)))
+    print('max position difference: %.3e m' % numpy.abs(spos - vpos).max())
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark vectorized hermite orbit interpolation')
+    parser.add_argument('--epochs', type=int, default=1000, help='number of epochs to interpolate')
+    parser.add_argument('--vectors', type=int, default=20, help='number of state vectors')
+    inps = parser.parse_args()
+    benchmark(inps.epochs, inps.vectors)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+'''
+Vectorized zero-Doppler radar to geographic coordinates.
+
+RadarGeometry merges the state vectors of the bursts of a product once
+(sorted by time, duplicates dropped) and locates on the WGS84 ellipsoid the
+points seen at arrays of azimuth times and slant ranges in a single call, with
+the same geometry as isce Orbit.rdr2geo (zero Doppler, right looking by
+default). That makes dense footprint polygons as cheap as the four corners.
+
+    geom = RadarGeometry.fromBursts(prod.bursts)
+    llh = geom.rdr2geo([t0, t0, t1, t1], [r0, r1, r1, r0])
+    ring = geom.footprint(t0, t1, r0, r1, nazimuth=20, nrange=10)
+'''
+from __future__ import division
+import datetime
+import numpy
+from frameMetadata.OrbitInterpolator import OrbitInterpolator
+
+#WGS84
+SEMI_MAJOR = 6378137.0
+ECC2 = 0.0066943799901
+
+def llh2ecef(lat, lon, hgt):
+    '''
+    Geodetic latitude, longitude (degrees) and height to ECEF (N,3).
+    '''
+    lat = numpy.radians(lat)
+    lon = numpy.radians(lon)
+    rn = SEMI_MAJOR / numpy.sqrt(1.0 - ECC2 * numpy.sin(lat)**2)
+    return numpy.stack([(rn + hgt) * numpy.cos(lat) * numpy.cos(lon),
+                        (rn + hgt) * numpy.cos(lat) * numpy.sin(lon),
+                        (rn * (1.0 - ECC2) + hgt) * numpy.sin(lat)], axis=-1)
+
+def ecef2llh(xyz, niter=5):
+    '''
+    ECEF (N,3) to geodetic latitude, longitude (degrees) and height.
+    '''
+    xyz = numpy.atleast_2d(xyz)
+    x, y, z = xyz[:,0], xyz[:,1], xyz[:,2]
+    p = numpy.hypot(x, y)
+    lon = numpy.arctan2(y, x)
+    lat = numpy.arctan2(z, p * (1.0 - ECC2))
+    for ii in range(niter):
+        rn = SEMI_MAJOR / numpy.sqrt(1.0 - ECC2 * numpy.sin(lat)**2)
+        hgt = p / numpy.cos(lat) - rn
+        lat = numpy.arctan2(z, p * (1.0 - ECC2 * rn / (rn + hgt)))
+    rn = SEMI_MAJOR / numpy.sqrt(1.0 - ECC2 * numpy.sin(lat)**2)
+    hgt = p / numpy.cos(lat) - rn
+    return numpy.degrees(lat), numpy.degrees(lon), hgt
+
+def mergeStateVectors(orbits):
+    '''
+    Return (times, pos, vel) of the state vectors of several isce orbits,
+    sorted by time with duplicate epochs dropped.
+    '''
+    svs = {}
+    for orbit in orbits:
+        for sv in orbit:
+            svs.setdefault(sv.getTime(), sv)
+    times = sorted(svs)
+    pos = numpy.array([svs[t].getPosition() for t in times], dtype=float)
+    vel = numpy.array([svs[t].getVelocity() for t in times], dtype=float)
+    return times, pos, vel
+
+class RadarGeometry(object):
+    '''
+    Zero-Doppler geolocation for an orbit.
+    '''
+    def __init__(self, times, pos, vel, side=-1):
+        '''
+        @param times: state vector datetimes
+        @param pos: (N,3) ECEF positions
+        @param vel: (N,3) ECEF velocities
+        @param side: -1 for right looking, 1 for left looking (isce convention)
+        '''
+        self.interpolator = OrbitInterpolator(times, pos, vel)
+        self.side = side
+
+    @classmethod
+    def fromBursts(cls, bursts, side=-1):
+        '''
+        Geometry of the merged orbits of a list of bursts.
+        '''
+        return cls(*mergeStateVectors([bb.orbit for bb in bursts]), side=side)
+
+    def rdr2geo(self, times, ranges, height=0., niter=10):
+        '''
+        Return (N,3) latitude, longitude (degrees) and height of the points at
+        the given azimuth times (datetimes) and slant ranges (meters) on the
+        ellipsoid raised by height.
+        '''
+        if isinstance(times, datetime.datetime):
+            times = [times]
+        pos, vel = self.interpolator.interpolate(times)
+        rng = numpy.broadcast_to(numpy.asarray(ranges, dtype=float), (len(pos),))
+
+        #look directions lie in the zero-Doppler plane, spanned by the
+        #downward direction u1 and the cross track direction u2
+        vhat = vel / numpy.linalg.norm(vel, axis=1)[:,None]
+        pperp = pos - numpy.sum(pos * vhat, axis=1)[:,None] * vhat
+        pperpNorm = numpy.linalg.norm(pperp, axis=1)
+        u1 = -pperp / pperpNorm[:,None]
+        u2 = numpy.cross(vhat, -u1)
+        u2 = -self.side * u2 / numpy.linalg.norm(u2, axis=1)[:,None]
+
+        #|pos + rng*l|^2 = |pos|^2 + rng^2 - 2 rng |pperp| cos(phi); start on a
+        #sphere through the nadir point and correct the target radius by the
+        #geodetic height error
+        rho2 = numpy.sum(pos * pos, axis=1)
+        lat, lon, hsat = ecef2llh(pos)
+        radius = numpy.linalg.norm(llh2ecef(lat, lon, 0.0), axis=1) + height
+        for ii in range(niter):
+            cosphi = numpy.clip((rho2 + rng**2 - radius**2) / (2.0 * rng * pperpNorm), -1.0, 1.0)
+            sinphi = numpy.sqrt(1.0 - cosphi**2)
+            targ = pos + rng[:,None] * (cosphi[:,None] * u1 + sinphi[:,None] * u2)
+            lat, lon, hgt = ecef2llh(targ)
+            radius = numpy.linalg.norm(targ, axis=1) - (hgt - height)
+        return numpy.stack([lat, lon, hgt], axis=1)
+
+    def footprint(self, tstart, tstop, rnear, rfar, nazimuth=2, nrange=2, height=0.):
+        '''
+        Closed ring of (lat, lon) around the swath, going from (tstart, rnear)
+        to (tstart, rfar), (tstop, rfar) and (tstop, rnear), with nazimuth
+        points along track and nrange points across track on each side.
+        '''
+        dt = (tstop - tstart).total_seconds()
+        az = [tstart + datetime.timedelta(seconds=dt * f) for f in numpy.linspace(0., 1., nazimuth)]
+        rg = list(numpy.linspace(rnear, rfar, nrange))
+        times = [tstart] * nrange + az[1:] + [tstop] * (nrange - 1) + az[-2::-1]
+        ranges = rg + [rfar] * (nazimuth - 1) + rg[-2::-1] + [rnear] * (nazimuth - 1)
+        llh = self.rdr2geo(times, ranges, height=height)
+        return llh[:,0:2].tolist()
@@ -21,10 +21,16 @@
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 
+from __future__ import division
+from __future__ import print_function
+import os
 import sys
+import zlib
+import struct
 from os import path
 from datetime import datetime
 from optparse import OptionParser
+from multiprocessing import Pool
 
 import h5py
 import numpy
@@ -42,62 +48,208 @@ handler.setFormatter(formatter)
 logger.addHandler(handler) # do not want to potentially enable full verbose to stdout.
 
 
+QUICKLOOK_DATASET = 'S01/QLK'
+
+# bytes of the quicklook dataset read at a time
+CHUNK_BYTES = 16 * 1024 * 1024
+
 
 def showUsage(thisCommand):
-    print '\n Extracts a quick look dataset from CSK h5 and exports to a raster image file.\n'
-    print '  Usage: %s [options]  {csk_h5}  {browse_image} \n' % (thisCommand)
-    print '  Examples:\n'
-    print '      %s  CSKS1_RAW_B_HI_01_HH_RD_SF_20130629021016_20130629021023.h5  CSKS1_RAW_B_HI_01_HH_RD_SF_20130629021016_20130629021023.png' % (thisCommand)
-    print '''  Options:
+    print('\n Extracts a quick look dataset from CSK h5 and exports to a raster image file.\n')
+    print('  Usage: %s [options]  {csk_h5}  {browse_image} ' % (thisCommand))
+    print('         %s [options]  {csk_h5_dir}  {browse_dir} \n' % (thisCommand))
+    print('  Examples:\n')
+    print('      %s  CSKS1_RAW_B_HI_01_HH_RD_SF_20130629021016_20130629021023.h5  CSKS1_RAW_B_HI_01_HH_RD_SF_20130629021016_20130629021023.png' % (thisCommand))
+    print('      %s  -w 8  h5_products/  browse/' % (thisCommand))
+    print('''  Options:
     -h/--help               This help text.
     -v/--verbose            Verbose output.
     -d/--debug              Verbose with debug output. Assumes verbose.
     -s/--settings           The settings json file.
-'''
-    print '''  Arguments
-    csk_h5    the CSK h5 file to read.
-    browse_image  a browse image to export to.
-'''
+    -m/--max-size           Downsample the browse image to at most this many pixels on a side.
+    -w/--workers            Number of worker processes for a directory of products.
+''')
+    print('''  Arguments
+    csk_h5    the CSK h5 file to read, or a directory of them.
+    browse_image  a browse image to export to, or a directory to export them to.
+''')
 # end def
 
 
-def h5_to_browse(h5Filepath, browseFilepath):
+class PngWriter(object):
     '''
-    Exports a HDF5 quick look dataset 'S01/QLK' to a browse raster image file. 
+    Writes an 8 bit grayscale or RGB PNG one block of rows at a time, so
+    that the image is never held in memory as a whole.
     '''
-    with h5py.File(h5Filepath,'r') as f:
+    def __init__(self, fp, width, height, channels=1):
+        self.fp = fp
+        self.compressor = zlib.compressobj(6)
+        self.fp.write(b'\x89PNG\r\n\x1a\n')
+        colorType = {1: 0, 3: 2}[channels]
+        self.writeChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, colorType, 0, 0, 0))
+    # end def
+
+    def writeChunk(self, tag, data):
+        self.fp.write(struct.pack('>I', len(data)))
+        self.fp.write(tag + data)
+        self.fp.write(struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+    # end def
+
+    def writeRows(self, rows):
+        '''
+        Append a (nrows, width) or (nrows, width, 3) uint8 block.
+        '''
+        rows = numpy.ascontiguousarray(rows, dtype=numpy.uint8).reshape(rows.shape[0], -1)
+        # filter type 0 (none) in front of every scanline
+        lines = numpy.hstack([numpy.zeros((rows.shape[0], 1), dtype=numpy.uint8), rows])
+        data = self.compressor.compress(lines.tobytes())
+        if data:
+            self.writeChunk(b'IDAT', data)
+    # end def
+
+    def close(self):
+        self.writeChunk(b'IDAT', self.compressor.flush())
+        self.writeChunk(b'IEND', b'')
+    # end def
+# end class
+
+
+def iterRows(dataset, step=1, chunkBytes=CHUNK_BYTES):
+    '''
+    Yield the dataset decimated by step along both axes, as blocks of rows
+    read one at a time. Blocks follow the HDF5 chunking when there is one.
+    '''
+    nrows = dataset.shape[0]
+    rowBytes = max(1, dataset.dtype.itemsize * int(numpy.prod(dataset.shape[1:])))
+    block = max(1, chunkBytes // rowBytes)
+    if dataset.chunks is not None:
+        block = max(dataset.chunks[0], block - block % dataset.chunks[0])
+    # whole multiple of step so that the decimation is continuous across blocks
+    block = max(step, block - block % step)
+    for r0 in range(0, nrows, block):
+        yield dataset[r0:min(nrows, r0 + block):step, ::step]
+# end def
 
-        # show contents
-        def visitCallback(item):
-            logger.info('%s' % (str(item)))
-        # end def
-        f.visit(visitCallback)
+
+def h5_to_browse(h5Filepath, browseFilepath, maxSize=None):
+    '''
+    Exports a HDF5 quick look dataset 'S01/QLK' to a browse PNG image file.
+
+    The dataset is opened directly and streamed by blocks of rows; with
+    maxSize it is decimated so that neither side exceeds maxSize pixels.
+    Quicklooks that are not 8 bit are scaled between their minimum and
+    maximum, as scipy.misc.imsave did.
+    '''
+    with h5py.File(h5Filepath,'r') as f:
 
         # get quicklooks dataset
-        datasetQuicklook = None
         try:
-            datasetQuicklook = f['S01/QLK']
-            logger.info('found quicklook dataset (S01/QLK) : %s' % str(datasetQuicklook))
-        except Exception, e:
-            logger.error('unable to read quicklook dataset (S01/QLK) in %s: %s' % (h5Filepath, str(e)) )
-            raise Exception('unable to read quicklook dataset (S01/QLK) in %s.' % h5Filepath)
+            datasetQuicklook = f[QUICKLOOK_DATASET]
+            logger.info('found quicklook dataset (%s) : %s' % (QUICKLOOK_DATASET, str(datasetQuicklook)))
+        except Exception as e:
+            logger.error('unable to read quicklook dataset (%s) in %s: %s' % (QUICKLOOK_DATASET, h5Filepath, str(e)) )
+            raise Exception('unable to read quicklook dataset (%s) in %s.' % (QUICKLOOK_DATASET, h5Filepath))
         # end try-except
 
-        # save array to png
+        shape = datasetQuicklook.shape
+        channels = shape[2] if len(shape) == 3 else 1
+        if len(shape) not in (2, 3) or channels not in (1, 3):
+            raise Exception('unsupported quicklook dataset shape %s in %s' % (str(shape), h5Filepath))
+        # end if
+
+        step = 1
+        if maxSize:
+            step = max(1, -(-max(shape[0], shape[1]) // maxSize))
+        # end if
+
+        # non 8 bit data are scaled to their full range, which needs a first pass
+        scale = None
+        if datasetQuicklook.dtype != numpy.uint8:
+            cmin, cmax = numpy.inf, -numpy.inf
+            for rows in iterRows(datasetQuicklook, step):
+                cmin = min(cmin, float(rows.min()))
+                cmax = max(cmax, float(rows.max()))
+            # end for
+            scale = (cmin, 255.0 / (cmax - cmin) if cmax > cmin else 1.0)
+        # end if
+
+        # save array to png, renamed into place once complete
+        tmpFilepath = browseFilepath + '.tmp'
         try:
-            import scipy.misc
-            scipy.misc.imsave(browseFilepath, datasetQuicklook)
-            logger.info('exported quicklook dataset (S01/QLK) to %s' % str(browseFilepath))
-        except Exception, e:
-            logger.error('unable to export quicklook dataset (S01/QLK) to %s: %s' % (str(browseFilepath), str(e)) )
-            raise Exception('unable to export quicklook dataset (S01/QLK) to %s' % str(browseFilepath))
+            with open(tmpFilepath, 'wb') as fp:
+                writer = PngWriter(fp, -(-shape[1] // step), -(-shape[0] // step), channels)
+                for rows in iterRows(datasetQuicklook, step):
+                    if scale is not None:
+                        rows = numpy.clip((rows - scale[0]) * scale[1] + 0.4999, 0, 255)
+                    # end if
+                    writer.writeRows(rows)
+                # end for
+                writer.close()
+            # end with fp
+            os.rename(tmpFilepath, browseFilepath)
+            logger.info('exported quicklook dataset (%s) to %s' % (QUICKLOOK_DATASET, str(browseFilepath)))
+        except Exception as e:
+            if path.exists(tmpFilepath):
+                os.remove(tmpFilepath)
+            # end if
+            logger.error('unable to export quicklook dataset (%s) to %s: %s' % (QUICKLOOK_DATASET, str(browseFilepath), str(e)) )
+            raise Exception('unable to export quicklook dataset (%s) to %s' % (QUICKLOOK_DATASET, str(browseFilepath)))
         # end try-except
-
-#        from matplotlib import pyplot as plt
-#        plt.imshow(datasetQuicklook, interpolation='nearest')
-#        plt.show()
     # end with f
-    
+
+# end def
+
+
+def _browseJob(job):
+    '''
+    Pool worker: returns (h5Filepath, error or None).
+    '''
+    h5Filepath, browseFilepath, maxSize = job
+    try:
+        h5_to_browse(h5Filepath, browseFilepath, maxSize)
+        return h5Filepath, None
+    except Exception as e:
+        return h5Filepath, str(e)
+    # end try-except
+# end def
+
+
+def h5_dir_to_browse(h5Dir, browseDir, maxSize=None, workers=4):
+    '''
+    Exports the quicklooks of all CSK h5 files of a directory to browse PNGs
+    named after them in browseDir, with a pool of worker processes. Browse
+    images that already exist are kept. Returns the list of (h5, error) of
+    the products that failed.
+    '''
+    if not path.isdir(browseDir):
+        os.makedirs(browseDir)
+    # end if
+    jobs = []
+    for name in sorted(os.listdir(h5Dir)):
+        if not name.endswith('.h5'):
+            continue
+        # end if
+        browseFilepath = path.join(browseDir, path.splitext(name)[0] + '.png')
+        if path.exists(browseFilepath):
+            continue
+        # end if
+        jobs.append((path.join(h5Dir, name), browseFilepath, maxSize))
+    # end for
+    logger.info('%d quicklooks to export from %s' % (len(jobs), h5Dir))
+
+    failed = []
+    pool = Pool(workers)
+    try:
+        for h5Filepath, error in pool.imap_unordered(_browseJob, jobs):
+            if error is not None:
+                failed.append((h5Filepath, error))
+            # end if
+        # end for
+    finally:
+        pool.close()
+        pool.join()
+    # end try-finally
+    return failed
 # end def
 
 if __name__ == '__main__':
@@ -113,10 +265,10 @@ if __name__ == '__main__':
         # optlist is list of (option, value)
         # args is list of arguments, not including options.
         # http://docs.python.org/library/getopt.html
-        (optlist, args) = getopt(sys.argv[1:], 'hvds:c:', ['help','verbose','debug','settings='])
-    except GetoptError, e:
-        print >>sys.stderr, str(e)
-        print >>sys.stderr, "for help use --help"
+        (optlist, args) = getopt(sys.argv[1:], 'hvds:c:m:w:', ['help','verbose','debug','settings=','max-size=','workers='])
+    except GetoptError as e:
+        print(str(e), file=sys.stderr)
+        print("for help use --help", file=sys.stderr)
         sys.exit(2)
     # end try-except
 
@@ -129,6 +281,8 @@ if __name__ == '__main__':
     # default option values
     logFilePath = None
     settingsFilepath = path.join(confPath,'settings.json')
+    maxSize = None
+    workers = 4
 
     # handle command-line options
     for (option, value) in optlist:
@@ -143,6 +297,10 @@ if __name__ == '__main__':
             logger.setLevel(logging.DEBUG)
         elif option in ('-s', '--settings'):
             settingsFilepath = value
+        elif option in ('-m', '--max-size'):
+            maxSize = int(value)
+        elif option in ('-w', '--workers'):
+            workers = int(value)
         # end if
     # end for
     
@@ -150,8 +308,8 @@ if __name__ == '__main__':
     # if have less than the number of required arguments, then show usage.
     # args is a list of arguments (not including the executable and options).
     if (len(args) < 2):
-        print >>sys.stderr, 'Insufficient arguments %s' % str(args)
-        print >>sys.stderr, "For help use -h or --help"
+        print('Insufficient arguments %s' % str(args), file=sys.stderr)
+        print("For help use -h or --help", file=sys.stderr)
         sys.exit(1)
     # end if
 
@@ -175,14 +333,14 @@ if __name__ == '__main__':
     h5Filepath = None
     try:
          h5Filepath = args[0]
-    except IndexError, e:
+    except IndexError as e:
         logger.error('unable to get argument for "h5Filepath": %s' % str(e) )
     # end try-except
 
     browseFilepath = None
     try:
          browseFilepath = args[1]
-    except IndexError, e:
+    except IndexError as e:
         logger.error('unable to get argument for "browseFilepath": %s' % str(e) )
     # end try-except
 
@@ -191,7 +349,10 @@ if __name__ == '__main__':
     # -------------------------------------------------------------------------
 
     # convert to absolute paths
-    if path.isfile(h5Filepath):
+    if path.isdir(h5Filepath):
+        h5Filepath = path.abspath(h5Filepath)
+        logger.info('h5 directory: %s' % (h5Filepath))
+    elif path.isfile(h5Filepath):
         h5Filepath = path.abspath(h5Filepath)
         logger.info('h5Filepath: %s' % (h5Filepath))
     else:
@@ -207,11 +368,19 @@ if __name__ == '__main__':
         # -------------------------------------------------------------------------
 
         # exports a CSK HDF5 quick look dataset to a browse raster image file.
-        try:
-            h5_to_browse(h5Filepath, browseFilepath)
-        except Exception, e:
-            logger.error('unable to create browse image: %s' % str(e))
-        # end try-except
+        # or all quick looks of a directory of products with a worker pool.
+        if path.isdir(h5Filepath):
+            failed = h5_dir_to_browse(h5Filepath, browseFilepath, maxSize, workers)
+            for (failedFilepath, error) in failed:
+                logger.error('unable to create browse image of %s: %s' % (failedFilepath, error))
+            # end for
+        else:
+            try:
+                h5_to_browse(h5Filepath, browseFilepath, maxSize)
+            except Exception as e:
+                logger.error('unable to create browse image: %s' % str(e))
+            # end try-except
+        # end if
 
         sys.exit(0)
 
@@ -220,9 +389,9 @@ if __name__ == '__main__':
 #        try:
 #            import psyco
 #            psyco.full()
-#            print '**** using psyco ****'
-#        except ImportError, e:
-#            print '**** not using psyco ****'
+#            print('**** using psyco ****')
+#        except ImportError as e:
+#            print('**** not using psyco ****')
 #        # end try-except
 
 # -----------------------
@@ -240,32 +409,32 @@ if __name__ == '__main__':
 
 # -----------------------
 
-    except SystemExit, e:
+    except SystemExit as e:
         # sys.exit() throws exception SystemExit with exit value
         logging.shutdown()
-        print '\n'
+        print('\n')
         #print '# %s Exiting main() with return value: %s' % ( str(datetime.now()), str(e) )
 
-    except KeyboardInterrupt, e:
-        print >>sys.stderr, '\n'
-        print >>sys.stderr, '# ---------------------------------------------------'
-        print >>sys.stderr, '# PROCESS CANCELLED BY USER. Traceback:'
+    except KeyboardInterrupt as e:
+        print('\n', file=sys.stderr)
+        print('# ---------------------------------------------------', file=sys.stderr)
+        print('# PROCESS CANCELLED BY USER. Traceback:', file=sys.stderr)
         # get the stack trace
         import traceback
         traceback.print_exc(file=sys.stderr)
-        print >>sys.stderr, '# ---------------------------------------------------'
+        print('# ---------------------------------------------------', file=sys.stderr)
         sys.exit(2)
 
-    except Exception, e:
-        print >>sys.stderr, '\n'
-        print >>sys.stderr, '# ---------------------------------------------------'
-        print >>sys.stderr, '# %s Exception uncaught at main():' % ( str(e) )
-        print >>sys.stderr, '# %s' % (str(e))
-        print >>sys.stderr, '# Traceback:'
+    except Exception as e:
+        print('\n', file=sys.stderr)
+        print('# ---------------------------------------------------', file=sys.stderr)
+        print('# %s Exception uncaught at main():' % ( str(e) ), file=sys.stderr)
+        print('# %s' % (str(e)), file=sys.stderr)
+        print('# Traceback:', file=sys.stderr)
         # get the stack trace
         import traceback
         traceback.print_exc(file=sys.stderr)
-        print >>sys.stderr, '# ---------------------------------------------------'
+        print('# ---------------------------------------------------', file=sys.stderr)
         sys.exit(2)
 
     # end try-except
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Size bounded cache of localized inputs shared by the workers of a node.
+
+Each url is downloaded once into <root>/a/b/c/d/<md5 of url>/ and marked
+complete by a .localized signal file, the same layout the sling extractors
+always used. On top of that:
+
+- fills are coordinated with a lock file per entry, so concurrent requesters
+  of the same url wait on one download instead of racing on the directory,
+- hits refresh the modification time of the signal file, which is the last
+  access time used for LRU eviction,
+- after every fill the least recently used entries are evicted until the
+  cache is back under its byte quota. Entries being filled or used within
+  the last min_age seconds are never evicted,
+- entries are handed to jobs as hard links (copies across file systems)
+  made under the entry lock, never as symbolic links into the cache, so an
+  eviction can never remove the inputs of a running job: the data of an
+  evicted entry lives on until the last job directory linking it is removed,
+- hit, miss and eviction counters are kept in <root>/.stats.json.
+
+The quota defaults to half of the file system holding the cache and can be set
+in bytes with ARIA_LOCALIZE_CACHE_QUOTA.
+"""
+
+import os
+import json
+import time
+import errno
+import fcntl
+import shutil
+import hashlib
+import logging
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('localize_cache')
+
+SIGNAL_FILE = '.localized'
+STATS_FILE = '.stats.json'
+LOCK_FILE = '.cache.lock'
+
+
+@contextmanager
+def file_lock(lock_file, blocking=True):
+    """Hold an exclusive flock on lock_file. Yields False if non blocking and busy."""
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o664)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def link_file(src, dst):
+    """Hard link src to dst, copying it if they are on different file systems."""
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copy2(src, dst)
+
+
+def link_tree(src, dst):
+    """Recreate the file or directory src at dst with hard linked files."""
+    if not os.path.isdir(src):
+        link_file(src, dst)
+        return
+    for root, dirs, files in os.walk(src):
+        out_dir = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        for f in files:
+            link_file(os.path.join(root, f), os.path.join(out_dir, f))
+
+
+def dir_size(path):
+    """Total size in bytes of the files under path."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class LocalizeCache(object):
+    """LRU cache of downloaded urls under root."""
+
+    def __init__(self, root, quota=None, min_age=3600):
+        self.root = root
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        if quota is None:
+            quota = os.environ.get('ARIA_LOCALIZE_CACHE_QUOTA')
+        if quota is None:
+            st = os.statvfs(root)
+            quota = st.f_blocks * st.f_frsize // 2
+        self.quota = int(quota)
+        self.min_age = min_age
+
+    def entry_dir(self, url):
+        """Cache directory of a url."""
+        url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, *(list(url_hash[0:4]) + [url_hash]))
+
+    def get(self, url, fetch, path=None):
+        """
+        Return the cache directory holding url, calling fetch(cache_dir) to
+        download it on a miss. Concurrent callers for the same url wait for
+        the first one to finish. If path is given, the localized files are
+        also linked there (see link()) before the entry lock is released.
+        """
+        cache_dir = self.entry_dir(url)
+        hash_dir = os.path.dirname(cache_dir)
+        if not os.path.isdir(hash_dir):
+            try:
+                os.makedirs(hash_dir)
+            except OSError:
+                if not os.path.isdir(hash_dir):
+                    raise
+        signal_file = os.path.join(cache_dir, SIGNAL_FILE)
+
+        with file_lock(cache_dir + '.lock'):
+            if os.path.exists(signal_file):
+                logger.info("cache hit for {} at {}".format(url, cache_dir))
+                os.utime(signal_file, None)
+                self.count('hits')
+                if path is not None:
+                    self.link(cache_dir, path)
+                return cache_dir
+
+            logger.info("cache miss for {}".format(url))
+            self.count('misses')
+            if os.path.exists(cache_dir):
+                #leftover of an interrupted fill
+                shutil.rmtree(cache_dir)
+            os.makedirs(cache_dir)
+            try:
+                fetch(cache_dir)
+            except Exception as e:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                tb = traceback.format_exc()
+                raise RuntimeError("Failed to download %s to cache %s: %s\n%s" % (url, cache_dir, str(e), tb))
+            size = dir_size(cache_dir)
+            tmp_file = signal_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write("%sZ\n%d\n" % (datetime.utcnow().isoformat(), size))
+            os.rename(tmp_file, signal_file)
+            if path is not None:
+                self.link(cache_dir, path)
+
+        self.evict(keep=[cache_dir])
+        return cache_dir
+
+    def link(self, cache_dir, path):
+        """
+        Hard link the localized files of cache_dir into path: each file or
+        directory goes to path/<name> if path is a directory, to path itself
+        otherwise. The job keeps its inputs even if the entry is evicted.
+        Call with the entry lock held, as get() does.
+        """
+        for i in os.listdir(cache_dir):
+            if i == SIGNAL_FILE: continue
+            dst = os.path.join(path, i) if os.path.isdir(path) else path
+            try:
+                link_tree(os.path.join(cache_dir, i), dst)
+            except (IOError, OSError) as e:
+                raise RuntimeError("Failed to link {} to {}: {}".format(os.path.join(cache_dir, i), dst, e))
+
+    def entries(self):
+        """List of (last access, size, cache_dir) of the complete entries."""
+        ret = []
+        for root, dirs, files in os.walk(self.root):
+            if SIGNAL_FILE in files:
+                signal_file = os.path.join(root, SIGNAL_FILE)
+                try:
+                    atime = os.stat(signal_file).st_mtime
+                    with open(signal_file) as f:
+                        lines = f.read().split()
+                    size = int(lines[1]) if len(lines) > 1 else dir_size(root)
+                except (OSError, ValueError):
+                    continue
+                ret.append((atime, size, root))
+                #nothing to look for inside an entry
+                del dirs[:]
+        return ret
+
+    def evict(self, keep=()):
+        """Evict least recently used entries until under quota. Returns bytes freed."""
+        freed = 0
+        with file_lock(os.path.join(self.root, LOCK_FILE), blocking=False) as locked:
+            #another worker is already evicting
+            if not locked:
+                return freed
+            entries = self.entries()
+            total = sum([e[1] for e in entries])
+            if total <= self.quota:
+                return freed
+            now = time.time()
+            for atime, size, cache_dir in sorted(entries):
+                if total <= self.quota:
+                    break
+                if cache_dir in keep or now - atime < self.min_age:
+                    continue
+                with file_lock(cache_dir + '.lock', blocking=False) as idle:
+                    if not idle:
+                        continue
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                logger.info("evicted {} ({} bytes) from cache".format(cache_dir, size))
+                total -= size
+                freed += size
+                self.count('evictions')
+                self.count('evicted_bytes', size)
+        return freed
+
+    def count(self, name, value=1):
+        """Increment a counter in the stats file."""
+        stats_file = os.path.join(self.root, STATS_FILE)
+        try:
+            with file_lock(stats_file + '.lock'):
+                stats = self.stats()
+                stats[name] = stats.get(name, 0) + value
+                tmp_file = stats_file + '.tmp'
+                with open(tmp_file, 'w') as f:
+                    json.dump(stats, f, indent=2, sort_keys=True)
+                os.rename(tmp_file, stats_file)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to update cache stats: {}".format(e))
+
+    def stats(self):
+        """Return the hit/miss/eviction counters."""
+        try:
+            with open(os.path.join(self.root, STATS_FILE)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
@@ -33,6 +33,11 @@ import os
 import numpy as np
 import pickle
 import re
+from utils import s1_parse_cache
+
+#parsed annotations of this module in the S1 parse cache; bump the version
+#whenever parse() changes what it stores on the bursts
+ANNOTATION_CACHE_NAMESPACE = 'frameMetadata.sentinel.Sentinel1_TOPS:1'
 
 sep = "\n"
 tab = "    "
@@ -54,6 +59,7 @@ class Sentinel1_TOPS(Component):
          
         
         self._xml_root=None
+        self._annotationOrbit = None
         self.descriptionOfVariables = {}
         self.dictionaryOfVariables = {'XML': ['self.xml','str','mandatory'],
                                       'TIFF': ['self.tiff','str','mandatory'],
@@ -61,22 +67,34 @@ class Sentinel1_TOPS(Component):
         
                                                
     def parse(self):
-        try:
-            fp = open(self.xml,'r')
-        except IOError as strerr:
-            print("IOError: %s" % strerr)
-            return
-        self._xml_root = ElementTree(file=fp).getroot()
-        self.numberBursts = self.getNumberOfBursts()
+        ####Burst metadata and header orbit are cached per annotation file
+        cacheKey = s1_parse_cache.makeKey('annotation', s1_parse_cache.fileSignature(self.xml),
+                                           namespace=ANNOTATION_CACHE_NAMESPACE)
+        cached = s1_parse_cache.load(cacheKey)
+        if cached is not None:
+            self.bursts, self._annotationOrbit = cached
+            self.numberBursts = len(self.bursts)
+        else:
+            try:
+                fp = open(self.xml,'r')
+            except IOError as strerr:
+                print("IOError: %s" % strerr)
+                return
+            self._xml_root = ElementTree(file=fp).getroot()
+            fp.close()
+            self.numberBursts = self.getNumberOfBursts()
 
-        for kk in range(self.numberBursts):
-            slc = BurstSLC()
-            slc.configure()
-            self.bursts.append(slc)
+            for kk in range(self.numberBursts):
+                slc = BurstSLC()
+                slc.configure()
+                self.bursts.append(slc)
 
-        self.populateCommonMetadata()
+            self.populateCommonMetadata()
 
-        self.populateBurstSpecificMetadata()
+            self.populateBurstSpecificMetadata()
+
+            self._annotationOrbit = self.readAnnotationStateVectors()
+            s1_parse_cache.dump(cacheKey, (self.bursts, self._annotationOrbit))
 
         ####Read in the orbits
         if self.orbitFile:
@@ -90,10 +108,6 @@ class Sentinel1_TOPS(Component):
             for sv in orb:
                 burst.orbit.addStateVector(sv)
 
-
-
-        fp.close()
-
     def getxmlattr(self, path, key):
         try:
             res = self._xml_root.find(path).attrib[key]
@@ -283,27 +297,34 @@ class Sentinel1_TOPS(Component):
 
             print('Doppler matching: Burst %d to Poly %d'%(index, arg))
         
-    def extractOrbit(self):
+    def readAnnotationStateVectors(self):
         '''
-        Extract orbit information from xml node.
+        Read the state vectors of the annotation XML as (time, pos, vel) tuples.
         '''
         node = self._xml_root.find('generalAnnotation/orbitList')
 
-        frameOrbit = Orbit()
-        frameOrbit.configure()
-
+        svs = []
         for child in node.getchildren():
             timestamp = self.convertToDateTime(child.find('time').text)
-            pos = []
-            vel = []
             posnode = child.find('position')
             velnode = child.find('velocity')
-            for tag in ['x','y','z']:
-                pos.append(float(posnode.find(tag).text))
+            pos = [float(posnode.find(tag).text) for tag in ['x','y','z']]
+            vel = [float(velnode.find(tag).text) for tag in ['x','y','z']]
+            svs.append((timestamp, pos, vel))
 
-            for tag in ['x','y','z']:
-                vel.append(float(velnode.find(tag).text))
+        return svs
 
+    def extractOrbit(self):
+        '''
+        Extract orbit information from xml node.
+        '''
+        if self._annotationOrbit is None:
+            self._annotationOrbit = self.readAnnotationStateVectors()
+
+        frameOrbit = Orbit()
+        frameOrbit.configure()
+
+        for timestamp, pos, vel in self._annotationOrbit:
             vec = StateVector()
             vec.setTime(timestamp)
             vec.setPosition(pos)
@@ -325,15 +346,11 @@ class Sentinel1_TOPS(Component):
         Extract precise orbit from given Orbit file.
         '''
         try:
-            fp = open(self.orbitFile,'r')
+            svs = s1_parse_cache.readPreciseOrbit(self.orbitFile)
         except IOError as strerr:
             print("IOError: %s" % strerr)
             return
 
-        _xml_root = ElementTree(file=fp).getroot()
-       
-        node = _xml_root.find('Data_Block/List_of_OSVs')
-
         orb = Orbit()
         orb.configure()
 
@@ -341,20 +358,8 @@ class Sentinel1_TOPS(Component):
         tstart = self.bursts[0].sensingStart - margin
         tend = self.bursts[-1].sensingStop + margin
 
-        for child in node.getchildren():
-            timestamp = self.convertToDateTime(child.find('UTC').text[4:])
-
+        for timestamp, pos, vel in svs:
             if (timestamp >= tstart) and (timestamp < tend):
-
-                pos = [] 
-                vel = []
-
-                for tag in ['VX','VY','VZ']:
-                    vel.append(float(child.find(tag).text))
-
-                for tag in ['X','Y','Z']:
-                    pos.append(float(child.find(tag).text))
-
                 vec = StateVector()
                 vec.setTime(timestamp)
                 vec.setPosition(pos)
@@ -362,8 +367,6 @@ class Sentinel1_TOPS(Component):
                 print(vec)
                 orb.addStateVector(vec)
 
-        fp.close()
-
         return orb
 
 
@@ -15,6 +15,7 @@ from lxml import objectify as OBJ
 from FrameInfoExtractor import FrameInfoExtractor as FIE
 import numpy as np
 from osgeo import ogr, osr
+from utils.geom_union import FootprintUnion
 import os, sys, re, requests, json, shutil, traceback, logging, hashlib, math
 
 DATASETTYPE_RE = re.compile(r'-(raw|slc)-')
@@ -212,22 +213,16 @@ def set_value(param, value):
         print(traceback.format_exc())
 
 
+def get_union(frame_infoes, bbox_type):
+    """Union of the frame footprints with its envelope, area and orientation."""
+    union = FootprintUnion([get_loc(frameInfo, bbox_type)["coordinates"][0] for frameInfo in frame_infoes])
+    print("final geom_union : %s" %union.geometry)
+    print("get_union : %d footprints, area : %s, orientation : %s" %(len(frame_infoes), union.area, union.orientation))
+    return union
+
+
 def get_union_geom(frame_infoes, bbox_type):
-    geom_union = None
-    for frameInfo in frame_infoes:
-        loc = get_loc(frameInfo, bbox_type)
-
-        print("get_union_geom loc : %s" %loc)
-        geom = ogr.CreateGeometryFromJson(json.dumps(loc))
-        print("get_union_geom : geom : %s" %get_union_geom)
-        if geom_union is None:
-            geom_union = geom
-        else:
-            geom_union = geom_union.Union(geom)
-        print("union geom : %s " %geom_union)
-    print("final geom_union : %s" %geom_union)
-    print("extract data geom_union type : %s" %type(geom_union))
-    return geom_union
+    return get_union(frame_infoes, bbox_type).geometry
 
 
 def get_env_box(env):
@@ -247,19 +242,19 @@ def create_stitched_met_json( frame_infoes, met_json_file):
 
     # build met
 
-    geom_union = get_union_geom(frame_infoes, "bbox")
-    print("create_stitched_met_json : bbox geom_union : %s" %geom_union)
-    bbox = json.loads(geom_union.ExportToJson())["coordinates"][0]
+    union = get_union(frame_infoes, "bbox")
+    print("create_stitched_met_json : bbox geom_union : %s" %union.geometry)
+    bbox = json.loads(union.geometry.ExportToJson())["coordinates"][0]
     print("create_stitched_met_json : bbox : %s" %bbox)
-    bbox = get_env_box(geom_union.GetEnvelope())
+    bbox = get_env_box(union.envelope)
     bbox = change_direction(bbox)
     print("create_stitched_met_json :Final bbox : %s" %bbox)
 
-    geom_union = get_union_geom(frame_infoes, "refbbox")
-    print("create_stitched_met_json : refbbox geom_union : %s" %geom_union)
-    refbbox = json.loads(geom_union.ExportToJson())["coordinates"][0]
+    union = get_union(frame_infoes, "refbbox")
+    print("create_stitched_met_json : refbbox geom_union : %s" %union.geometry)
+    refbbox = json.loads(union.geometry.ExportToJson())["coordinates"][0]
     print("create_stitched_met_json : refbbox : %s" %refbbox)
-    refbbox = get_env_box(geom_union.GetEnvelope())
+    refbbox = get_env_box(union.envelope)
     refbbox = change_direction(refbbox)
     print("create_stitched_met_json :Final refbbox : %s" %refbbox)
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
-import os, sys, re, json, shutil, zipfile, argparse
-from glob import glob
+import os, sys, re, json, shutil, argparse
 
+from utils.safe_archive import SafeArchive
 import create_met_json
 import create_dataset_json
 
@@ -39,22 +39,25 @@ def harvest(extracted, safe_dir, productType):
 
 
 def extract(zip_file):
-    """Extract the zipfile."""
-
-    with zipfile.ZipFile(zip_file, 'r') as zf:
-        zf.extractall()
+    """
+    Extract the metadata of the zipfile. The measurement TIFFs are not needed
+    to split swaths and are left in the zip; their names are returned.
+    """
+
+    with SafeArchive(zip_file) as safe:
+        safe_dir = safe.extract_metadata()
+        tiff_files = [os.path.join(safe_dir, i) for i in safe.measurements()]
     prod = zip_file.replace(".zip", "")
-    safe_dir = "%s.SAFE" % prod
-    return prod, safe_dir
+    return prod, safe_dir, tiff_files
 
 
-def split_swaths(extracted, safe_dir, job_dir):
+def split_swaths(extracted, safe_dir, job_dir, tiff_files):
     """Create separate products for each swath."""
 
     # create swath product
     print("extracted: %s" % extracted)
     print("safe_dir: %s" % safe_dir)
-    for tiff_file in  glob("%s/measurement/*.tiff" % safe_dir):
+    for tiff_file in tiff_files:
         print("tiff_file: %s" % tiff_file)
         id = os.path.splitext(os.path.basename(tiff_file))[0]
         prod_dir = os.path.join(job_dir, "swaths", id) 
@@ -97,8 +100,8 @@ if __name__ == "__main__":
     else:
         raise RuntimeError("Unknown type: %s" % args.zip_file)
 
-    extracted, safe_dir = extract(args.zip_file)
-    split_swaths(extracted, safe_dir, args.job_dir)
+    extracted, safe_dir, tiff_files = extract(args.zip_file)
+    split_swaths(extracted, safe_dir, args.job_dir, tiff_files)
     harvest(extracted, safe_dir, typ)
     browse(extracted, safe_dir, typ)
     os.system("rm -rf %s" % safe_dir)
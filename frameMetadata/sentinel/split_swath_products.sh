@@ -1,6 +1,8 @@
 #!/usr/bin/env bash
 
 source $HOME/verdi/bin/activate
+export ARIAMH_HOME=$HOME/ariamh
+export PYTHONPATH=$ARIAMH_HOME:$PYTHONPATH
 
 PROD_DIR=$1
 JOB_DIR=$PWD
@@ -15,6 +15,7 @@ import tarfile, zipfile
 from hysds.recognize import Recognizer
 import osaka.main
 from atomicwrites import atomic_write
+from localize_cache import LocalizeCache
 import hysds
 from hysds.log_utils import logger, log_prov_es
 from hysds.celery import app
@@ -267,41 +268,10 @@ def download_file(url, path, cache=False):
 
     params = get_download_params(url)
     if cache:
-        url_hash = hashlib.md5(url).hexdigest()
-        hash_dir = os.path.join(app.conf.ROOT_WORK_DIR, 'cache', *url_hash[0:4])
-        cache_dir = os.path.join(hash_dir, url_hash)
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-        signal_file = os.path.join(cache_dir, '.localized')
-        if os.path.exists(signal_file):
-            logging.info("cache hit for {} at {}".format(url, cache_dir))
-        else:
-            logging.info("cache miss for {}".format(url))
-            try:
-                osaka.main.get(url, cache_dir, params=params)
-            except Exception as e:
-                shutil.rmtree(cache_dir)
-                tb = traceback.format_exc()
-                raise RuntimeError("Failed to download %s to cache %s: %s\n%s" % (url, cache_dir, str(e), tb))
-            with atomic_write(signal_file, overwrite=True) as f:
-                f.write("%sZ\n" % datetime.utcnow().isoformat())
-        for i in os.listdir(cache_dir):
-            if i == '.localized':
-                continue
-            cached_obj = os.path.join(cache_dir, i)
-            if os.path.isdir(cached_obj):
-                dst = os.path.join(path, i) if os.path.isdir(path) else path
-                try:
-                    os.symlink(cached_obj, dst)
-                except:
-                    logger.error("Failed to soft link {} to {}".format(cached_obj, dst))
-                    raise RuntimeError("Failed to soft link {} to {}".format(cached_obj, dst))
-            else:
-                try:
-                    os.symlink(cached_obj, path)
-                except:
-                    logger.error("Failed to soft link {} to {}".format(cached_obj, path))
-                    raise RuntimeError("Failed to soft link {} to {}".format(cached_obj, dst))
+        cache_root = os.path.join(app.conf.ROOT_WORK_DIR, 'cache')
+        # inputs are hard linked so that evictions never remove them
+        LocalizeCache(cache_root).get(url,
+            lambda dest: osaka.main.get(url, dest, params=params), path)
     else:
         return osaka.main.get(url, path, params=params)
 
@@ -155,10 +155,7 @@ class IfgStitcher(object):
             self.create_wbd_template()
             bbox = ''.join(str([ int(np.floor(minlat)),  int(np.ceil(maxlat)),  int(np.floor(minlon)), int(np.ceil(maxlon))]).split())
             uu = UrlUtils()
-            command = 'wbdStitcher.py wbdStitcher.xml wbdstitcher.wbdstitcher.bbox=' + bbox \
-                    + ' wbdstitcher.wbdstitcher.outputfile=' + oname \
-                    + ' wbdstitcher.wbdstitcher.url=' + uu.wbd_url
-            if os.system(command) != 0:
+            if not stitch_water_mask(oname,bbox,uu.wbd_url):
                 print("Error creating water mask")
                 raise Exception
         self._wmask = get_image(oname + '.xml')
@@ -228,10 +225,9 @@ class IfgStitcher(object):
         ilatend = ilatstart + factor*latsize1
         ilonstart = abs(int(round(old_div((lonstart2-lonstart1),londelta2))))
         ilonend = ilonstart + factor*lonsize1
-        imIn = im2.memMap(band=0)
-        imCrop = np.memmap(outname,im2.toNumpyDataType(),'w+',shape=(latsize1,lonsize1))    
-        imCrop[:,:] =  imIn[ilatstart:ilatend:factor,ilonstart:ilonend:factor]
-        return np.copy(imCrop)
+        imCrop = read_window(im2,ilatstart,ilatend - ilatstart,ilonstart,ilonend - ilonstart,factor)
+        imCrop.tofile(outname)
+        return imCrop
     
     #create a memmap. if filename is empty create a tempfile
     def get_memmap(self,dtype,mode,shape,filename=''):
@@ -34,6 +34,11 @@ import glob
 import numpy as np
 import shelve
 import re
+from utils import s1_parse_cache
+
+#parsed annotations of this module in the S1 parse cache; bump the version
+#whenever parse() changes what it stores on the bursts
+ANNOTATION_CACHE_NAMESPACE = 'interferogram.sentinel.Sentinel1_TOPS:1'
 
 sep = "\n"
 tab = "    "
@@ -59,29 +64,42 @@ class Sentinel1_TOPS(Component):
         self.bursts = []
 
         self._xml_root=None
+        self._annotationOrbit = None
         self.descriptionOfVariables = {}
         self.dictionaryOfVariables = {'XML': ['self.xml','str','mandatory'],
                                       'TIFF': ['self.tiff','str','mandatory'],
                                       'PREFIX': ['self.prefix','str','optional']}
                                                
     def parse(self):
-        try:
-            fp = open(self.xml,'r')
-        except IOError as strerr:
-            print("IOError: %s" % strerr)
-            return
-        self._xml_root = ElementTree(file=fp).getroot()
-        self.numberBursts = self.getNumberOfBursts()
+        ####Burst metadata and header orbit are cached per annotation file
+        cacheKey = s1_parse_cache.makeKey('annotation', s1_parse_cache.fileSignature(self.xml),
+                                           namespace=ANNOTATION_CACHE_NAMESPACE)
+        cached = s1_parse_cache.load(cacheKey)
+        if cached is not None:
+            self.bursts, self._annotationOrbit = cached
+            self.numberBursts = len(self.bursts)
+        else:
+            try:
+                fp = open(self.xml,'r')
+            except IOError as strerr:
+                print("IOError: %s" % strerr)
+                return
+            self._xml_root = ElementTree(file=fp).getroot()
+            fp.close()
+            self.numberBursts = self.getNumberOfBursts()
+
+            for kk in range(self.numberBursts):
+                slc = BurstSLC()
+                slc.configure()
+                slc.burstNumber = kk+1
+                self.bursts.append(slc)
 
-        for kk in range(self.numberBursts):
-            slc = BurstSLC()
-            slc.configure()
-            slc.burstNumber = kk+1
-            self.bursts.append(slc)
+            self.populateCommonMetadata()
 
-        self.populateCommonMetadata()
+            self.populateBurstSpecificMetadata()
 
-        self.populateBurstSpecificMetadata()
+            self._annotationOrbit = self.readAnnotationStateVectors()
+            s1_parse_cache.dump(cacheKey, (self.bursts, self._annotationOrbit))
 
         ####Tru and locate an orbit file
         if self.orbitFile is None:
@@ -101,8 +119,6 @@ class Sentinel1_TOPS(Component):
             for sv in orb:
                 burst.orbit.addStateVector(sv)
 
-        fp.close()
-
         self.populateIPFVersion()
 
         if self.IPFversion == '002.36':
@@ -415,28 +431,35 @@ class Sentinel1_TOPS(Component):
 
             return None
 
-    def extractOrbit(self):
+    def readAnnotationStateVectors(self):
         '''
-        Extract orbit information from xml node.
+        Read the state vectors of the annotation XML as (time, pos, vel) tuples.
         '''
         node = self._xml_root.find('generalAnnotation/orbitList')
 
-        print('Extracting orbit from annotation XML file')
-        frameOrbit = Orbit()
-        frameOrbit.configure()
-
+        svs = []
         for child in node.getchildren():
             timestamp = self.convertToDateTime(child.find('time').text)
-            pos = []
-            vel = []
             posnode = child.find('position')
             velnode = child.find('velocity')
-            for tag in ['x','y','z']:
-                pos.append(float(posnode.find(tag).text))
+            pos = [float(posnode.find(tag).text) for tag in ['x','y','z']]
+            vel = [float(velnode.find(tag).text) for tag in ['x','y','z']]
+            svs.append((timestamp, pos, vel))
+
+        return svs
 
-            for tag in ['x','y','z']:
-                vel.append(float(velnode.find(tag).text))
+    def extractOrbit(self):
+        '''
+        Extract orbit information from xml node.
+        '''
+        if self._annotationOrbit is None:
+            self._annotationOrbit = self.readAnnotationStateVectors()
 
+        print('Extracting orbit from annotation XML file')
+        frameOrbit = Orbit()
+        frameOrbit.configure()
+
+        for timestamp, pos, vel in self._annotationOrbit:
             vec = StateVector()
             vec.setTime(timestamp)
             vec.setPosition(pos)
@@ -458,15 +481,11 @@ class Sentinel1_TOPS(Component):
         Extract precise orbit from given Orbit file.
         '''
         try:
-            fp = open(self.orbitFile,'r')
+            svs = s1_parse_cache.readPreciseOrbit(self.orbitFile)
         except IOError as strerr:
             print("IOError: %s" % strerr)
             return
 
-        _xml_root = ElementTree(file=fp).getroot()
-       
-        node = _xml_root.find('Data_Block/List_of_OSVs')
-
         print('Extracting orbit from Orbit File: ', self.orbitFile)
         orb = Orbit()
         orb.configure()
@@ -475,20 +494,8 @@ class Sentinel1_TOPS(Component):
         tstart = self.bursts[0].sensingStart - margin
         tend = self.bursts[-1].sensingStop + margin
 
-        for child in node.getchildren():
-            timestamp = self.convertToDateTime(child.find('UTC').text[4:])
-
+        for timestamp, pos, vel in svs:
             if (timestamp >= tstart) and (timestamp < tend):
-
-                pos = [] 
-                vel = []
-
-                for tag in ['VX','VY','VZ']:
-                    vel.append(float(child.find(tag).text))
-
-                for tag in ['X','Y','Z']:
-                    pos.append(float(child.find(tag).text))
-
                 vec = StateVector()
                 vec.setTime(timestamp)
                 vec.setPosition(pos)
@@ -496,8 +503,6 @@ class Sentinel1_TOPS(Component):
 #                print(vec)
                 orb.addStateVector(vec)
 
-        fp.close()
-
         return orb
 
 
@@ -638,16 +643,7 @@ class Sentinel1_TOPS(Component):
         theta_sub = np.array(burst.elevationAngle)
         ###########################################
         #Reading the 2 way EAP (Elevation Antenna Pattern from AUX_CAL file)
-        fp = open(burst.auxFile,'r')
-        xml_root = ElementTree(file=fp).getroot()
-        res = xml_root.find('calibrationParamsList/calibrationParams')
-        paramsList = xml_root.find('calibrationParamsList')
-        for par in (paramsList.getchildren()):
-            if par.find('swath').text == burst.swath and par.find('polarisation').text == burst.polarization:
-              print (par.find('swath').text)
-              print (par.find('polarisation').text)
-              delta_theta = float(par.find('elevationAntennaPattern/elevationAngleIncrement').text)
-              Geap_IQ = [float(val) for val in par.find('elevationAntennaPattern/values').text.split()]
+        delta_theta, Geap_IQ = s1_parse_cache.readElevationAntennaPattern(burst.auxFile, burst.swath, burst.polarization)
         I = np.array(Geap_IQ[0::2])
         Q = np.array(Geap_IQ[1::2])
         Geap = I[:]+Q[:]*1j   # Complex vector of Elevation Antenna Pattern
@@ -6,13 +6,16 @@ existing interferograms to ensure that they exist
 @author mstarch
 '''
 from builtins import range
+import os
 import sys
 import json
+import time
 import logging
 import traceback
 import enumerate_topsapp_cfgs
 from hysds_commons.request_utils import post_scrolled_json_responses
 from utils.UrlUtils import UrlUtils as UU
+from utils.cache_utils import cache_dir, atomic_write
 
 LOG_FORMAT = "[%(asctime)s: %(levelname)s/%(funcName)s] %(message)s"
 logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
@@ -26,85 +29,122 @@ LOGGER.setLevel(logging.INFO)
 LOGGER.addFilter(LogFilter())
 
 
-def get_audit_existence_query(configs, version):
+#Number of ids resolved per existence query; a terms query is rewritten to a
+#boolean query, which elastic search limits to 1024 clauses
+EXISTENCE_CHUNK = 1000
+
+#Seconds an id found to exist is trusted before it is queried again, so that
+#products purged for reprocessing are audited again. ARIA_AUDIT_INDEX_TTL overrides it.
+INDEX_TTL = 24 * 3600
+
+class ExistingIdIndex(object):
+    '''
+    Sorted index of product ids known to exist, persisted between audits.
+    Each id is kept with the time it was last found, and ids older than ttl
+    seconds are dropped on load, so that only new candidates and expired ids
+    hit elastic search.
+    '''
+    def __init__(self, filename=None, ttl=None, now=None):
+        '''
+        @param filename: file to load/persist the index, None for memory only
+        @param ttl: seconds an id is trusted, defaults to ARIA_AUDIT_INDEX_TTL or INDEX_TTL
+        @param now: current epoch time, for tests
+        '''
+        self.filename = filename
+        self.ttl = float(os.environ.get("ARIA_AUDIT_INDEX_TTL", INDEX_TTL)) if ttl is None else ttl
+        self.now = time.time() if now is None else now
+        self.ids = {}
+        if filename is not None and os.path.exists(filename):
+            expired = 0
+            with open(filename, "r") as fh:
+                for line in fh:
+                    fields = line.split()
+                    #entries without a time predate the ttl and are re-verified
+                    if len(fields) != 2:
+                        expired += 1
+                        continue
+                    if self.now - float(fields[1]) > self.ttl:
+                        expired += 1
+                        continue
+                    self.ids[fields[0]] = float(fields[1])
+            LOGGER.info("Loaded %d known ids from %s, %d expired" % (len(self.ids), filename, expired))
+    def __contains__(self, product_id):
+        return product_id in self.ids
+    def __len__(self):
+        return len(self.ids)
+    def update(self, product_ids):
+        '''
+        Add ids found to exist now to the index
+        @param product_ids: iterable of existing ids
+        '''
+        for product_id in product_ids:
+            self.ids[product_id] = self.now
+    def save(self):
+        '''
+        Write the sorted index atomically
+        '''
+        if self.filename is None:
+            return
+        atomic_write(self.filename, lambda fh: fh.writelines(
+            "%s %d\n" % (product_id, self.ids[product_id]) for product_id in sorted(self.ids)))
+
+def get_index_file(es_index, version):
+    '''
+    Location of the persisted existing id index, None if ARIA_AUDIT_CACHE is "none"
+    @param es_index: elastic search index
+    @param version: version of interferogram
+    '''
+    audit_dir = cache_dir("audit", "ARIA_AUDIT_CACHE")
+    if audit_dir is None:
+        return None
+    return os.path.join(audit_dir, "existing_%s_%s.txt" % (es_index.replace("*", "ALL"), version))
+
+def get_audit_existence_query(ifg_ids, version):
     '''
-    Build query from configurations
-    @param cfgs: configurations
+    Build query from interferogram ids
+    @param ifg_ids: interferogram ids
     @param version: version of interferogram
     '''
-    query = {
+    return {
         "query": {
-            "bool": {
-                "should" : []
+            "terms": {
+                "id.raw": [ifg+"-"+version for ifg in ifg_ids]
             }
         },
         "fields":[]
     }
-    for ifg in configs[3]:
-        query["query"]["bool"]["should"].append({"term": {"id.raw": ifg+"-"+version}})
-    return query
 
-def audit(configs, es_url, es_index, version):
+def audit(configs, es_url, es_index, version, index_file=None, ttl=None):
     '''
     Audit cfgs and return only the ones that do not exist
-    @param configs: job configurationsa
+    @param configs: job configurations
     @param es_url: elastic search url
     @param es_index: elastic search index
     @param version: version of interferogram to check
+    @param index_file: persisted existing id index, defaults to get_index_file()
+    @param ttl: seconds an indexed id is trusted, see ExistingIdIndex
     '''
     #Query here
     start_url = "{}/{}/_search".format(es_url, es_index)
     scroll_url = "{}/_search".format(es_url)
-    ret = ([],[],[],[],[],[],[],[],[],[])
-    def chunk(items, size):
-        '''
-        Chunks the lists inside the supplied tuple into
-        evenly spaces sets of size items.
-        Note: to be memory efficient this destroys "items"
-        @param items: items tuple to chunk and eat
-        @param size: size to chunk into
-        '''
-        chunks = [[] for i in items]
-        while len(items[0]) > 0:
-            for i in range(0, len(chunks)):
-                chunks[i] = items[i][0: size]
-                del items[i][0: size]
-            yield tuple(chunks)
-    #Go through the configs 300 at a time, filtering each set
-    #Note: this destroys configs
-    for subcfgs in chunk(configs, 300): 
-        query = json.dumps(get_audit_existence_query(subcfgs, version))
-        #LOGGER.info("Running existence query: %s" % query)
+    if index_file is None:
+        index_file = get_index_file(es_index, version)
+    existing = ExistingIdIndex(index_file, ttl)
+    #Only ids not already known to exist are resolved against elastic search
+    unknown = sorted({ifg for ifg in configs[3] if ifg not in existing})
+    LOGGER.info("Enumerated: %d interferograms, %d not in local index" % (len(configs[3]), len(unknown)))
+    for start in range(0, len(unknown), EXISTENCE_CHUNK):
+        query = json.dumps(get_audit_existence_query(unknown[start:start+EXISTENCE_CHUNK], version))
         resps = post_scrolled_json_responses(start_url, scroll_url, True, data=query, logger=LOGGER)
-        #LOGGER.info("Responses: %s" % resps)
-        interferograms = {result.get("_id", "no-id").replace("-"+version,"") for result in resps}
-        #LOGGER.info("Existing interferograms: %s" % interferograms)
-        LOGGER.info("Existing: %d interferograms" % len(interferograms))
-        LOGGER.info("Enumerated: %d interferograms" % len(subcfgs[0]))
-        
-        cnt = 0
-        for i in range(len(subcfgs[0])):
-            if subcfgs[3][i] in interferograms:
-                continue
-            cnt = cnt + 1
-            for j in range(len(subcfgs)):
-                ret[j].append(subcfgs[j][i])
-        LOGGER.info("Filtered to %d configs:" % cnt)
-        #print("Filtered to %d configs:" % len(ret[0]))
-        #for i in range(len(ret[0])):
-        #    #Filter out existing interferograms
-        #    print("#" * 80)
-        #    print("project: %s" % ret[0][i])
-        #    print("stitched: %s" % ret[1][i])
-        #    print("auto_bbox: %s" % ret[2][i])
-        #    print("ifg_id: %s" % ret[3][i])
-        #    print("master_zip_url: %s" % ret[4][i])
-        #    print("master_orbit_url: %s" % ret[5][i])
-        #    print("slave_zip_url: %s" % ret[6][i])
-        #    print("slave_orbit_url: %s" % ret[7][i])
-        #    print("swath_nums: %s" % ret[8][i])
-        #    print("bbox: %s" % ret[9][i])
-    return ret
+        found = {result.get("_id", "no-id").replace("-"+version,"") for result in resps}
+        LOGGER.info("Existing: %d interferograms" % len(found))
+        existing.update(found)
+    existing.save()
+
+    #Filter all config lists in a single pass
+    keep = [i for i, ifg in enumerate(configs[3]) if ifg not in existing]
+    LOGGER.info("Filtered to %d configs:" % len(keep))
+    return tuple([items[i] for i in keep] for items in configs)
 def get_audit_input_query(starttime, endtime, coordinates):
     '''
     Get the query for the audit inteferograms
@@ -1,10 +1,10 @@
 #!/usr/bin/env python
 from __future__ import print_function
 
-import os, sys, requests, json
-from pprint import pprint
+import os, sys, json
 
 from utils.UrlUtils import UrlUtils
+from utils.catalog_client import get_resolver
 
 
 def get_version():
@@ -22,34 +22,18 @@ def get_version():
 def check_rsp(es_url, es_index, id):
     """Query for slc_pair products with specified input ID."""
 
-    query = {
-        "query":{
-            "bool":{
-                "must":[
-                    {"term":{"_id":id}},
-                ]
-            }
-        },
-        "fields": [],
-    }
-
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
-    if r.status_code == 200:
-        result = r.json()
-        pprint(result)
-        total = result['hits']['total']
-        id = 'NONE' if total == 0 else result['hits']['hits'][0]['_id']
-    else:
-        print("Failed to query %s:\n%s" % (es_url, r.text), file=sys.stderr)
-        print("query: %s" % json.dumps(query, indent=2), file=sys.stderr)
-        print("returned: %s" % r.text, file=sys.stderr)
-        if r.status_code == 404: total, id = 0, 'NONE'
-        else: r.raise_for_status()
-    return total, id
+    if get_resolver(es_url, es_index).exists(id): return 1, id
+    return 0, 'NONE'
+
+
+def check_rsps(es_url, es_index, ids):
+    """Return the set of the input IDs for which slc_pair products exist.
+
+    IDs are resolved in bulk over the pooled catalog session. IDs found are
+    kept for the life of the process, so a product purged meanwhile still
+    counts as existing; missing IDs are always queried again."""
+
+    return get_resolver(es_url, es_index).resolve(ids)
 
 
 if __name__ == "__main__":
@@ -2,13 +2,13 @@
 from builtins import str
 import os, sys, re, requests, json, shutil, traceback, logging, hashlib, math
 from itertools import chain
-from zipfile import ZipFile
 from subprocess import check_call, CalledProcessError
 from glob import glob
 from lxml.etree import parse
 import numpy as np
 from datetime import datetime
 
+from utils.safe_archive import extract_safe
 from utils.UrlUtils import UrlUtils
 from check_interferogram import check_int
 from create_input_xml import create_input_xml
@@ -168,14 +168,14 @@ def main():
     ctx['filter_strength'] = ctx.get("context", {}).get("filter_strength", 0.5)
     logger.info("Using filter_strength of %f" % ctx['filter_strength'])
 
-    # unzip SAFE dirs
+    # extract the SAFE members of the processed swaths and polarization only
+    swaths = [1, 2, 3] if ctx['stitch_subswaths_xt'] else [ctx['swathnum']]
     master_safe_dirs = []
     for i in ctx['master_zip_file']:
         master_safe_dir = i.replace(".zip", ".SAFE")
         if not os.path.exists(master_safe_dir):
-            logger.info("Unzipping {}.".format(i))
-            with ZipFile(i, 'r') as zf:
-                zf.extractall()
+            logger.info("Extracting swaths {} of {}.".format(swaths, i))
+            extract_safe(i, swaths, [get_polarization(i)])
             logger.info("Removing {}.".format(i))
             try: os.unlink(i)
             except: pass
@@ -184,9 +184,8 @@ def main():
     for i in ctx['slave_zip_file']:
         slave_safe_dir = i.replace(".zip", ".SAFE")
         if not os.path.exists(slave_safe_dir):
-            logger.info("Unzipping {}.".format(i))
-            with ZipFile(i, 'r') as zf:
-                zf.extractall()
+            logger.info("Extracting swaths {} of {}.".format(swaths, i))
+            extract_safe(i, swaths, [get_polarization(i)])
             logger.info("Removing {}.".format(i))
             try: os.unlink(i)
             except: pass
@@ -5,7 +5,6 @@ from builtins import range
 from past.utils import old_div
 import os, sys, re, requests, json, shutil, traceback, logging, hashlib, math
 from itertools import chain
-from zipfile import ZipFile
 from subprocess import check_call, CalledProcessError
 from glob import glob
 from lxml.etree import parse
@@ -14,6 +13,7 @@ from datetime import datetime
 from osgeo import ogr, gdal
 
 from isceobj.Image.Image import Image
+from utils.safe_archive import extract_safe
 from utils.UrlUtils_standard_product import UrlUtils
 from utils.imutils import get_image, get_size, crop_mask
 from utils.time_utils import getTemporalSpanInDays
@@ -998,14 +998,14 @@ def main():
     
     logger.info("\nS1-GUNW IFG NOT Found : %s.\nSo Proceeding ....\n" %temp_ifg_id)
   
-    # unzip SAFE dirs
+    # extract the SAFE members of the processed swaths and polarization only
+    swaths = ctx['swathnum'] if ctx['stitch_subswaths_xt'] else [ctx['swathnum']]
     master_safe_dirs = []
     for i in ctx['master_zip_file']:
         master_safe_dir = i.replace(".zip", ".SAFE")
         if not os.path.exists(master_safe_dir):
-            logger.info("Unzipping {}.".format(i))
-            with ZipFile(i, 'r') as zf:
-                zf.extractall()
+            logger.info("Extracting swaths {} of {}.".format(swaths, i))
+            extract_safe(i, swaths, [get_polarization(i)])
             logger.info("Removing {}.".format(i))
             try: os.unlink(i)
             except: pass
@@ -1014,9 +1014,8 @@ def main():
     for i in ctx['slave_zip_file']:
         slave_safe_dir = i.replace(".zip", ".SAFE")
         if not os.path.exists(slave_safe_dir):
-            logger.info("Unzipping {}.".format(i))
-            with ZipFile(i, 'r') as zf:
-                zf.extractall()
+            logger.info("Extracting swaths {} of {}.".format(swaths, i))
+            extract_safe(i, swaths, [get_polarization(i)])
             logger.info("Removing {}.".format(i))
             try: os.unlink(i)
             except: pass
@@ -19,6 +19,7 @@ from pprint import pformat
 
 import isce
 from utils.UrlUtils import UrlUtils as UU
+from utils.catalog_client import scroll_hits
 
 #from fetchOrbit import fetch
 from fetchOrbitES import fetch
@@ -261,9 +262,6 @@ def get_pair_hits(rest_url, ref_scene, direction, temporal_baseline=72, min_matc
     if direction not in ('pre', 'post'):
         raise RuntimeError("Unknown direction to search: %s" % direction)
 
-    # get query url
-    url = "{}/grq_*_s1-iw_slc/_search?search_type=scan&scroll=60&size=100".format(rest_url)
-
     # check SLC id format
     for i in ref_scene['id']:
         match = SLC_RE.search(i)
@@ -296,18 +294,8 @@ def get_pair_hits(rest_url, ref_scene, direction, temporal_baseline=72, min_matc
                                    sort_order, ref_scene['location']['coordinates'])
 
         #logger.info(json.dumps(query, indent=2))
-        r = requests.post(url, data=json.dumps(query))
-        r.raise_for_status()
-        scan_result = r.json()
-        logger.info("total matches for {} direction: {}".format(direction, scan_result['hits']['total']))
-        scroll_id = scan_result['_scroll_id']
-        matches = []
-        while True:
-            r = requests.post('%s/_search/scroll?scroll=60m' % rest_url, data=scroll_id)
-            res = r.json()
-            scroll_id = res['_scroll_id']
-            if len(res['hits']['hits']) == 0: break
-            matches.extend(res['hits']['hits'])
+        matches = list(scroll_hits(rest_url, "grq_*_s1-iw_slc", query, scroll='60m'))
+        logger.info("total matches for {} direction: {}".format(direction, len(matches)))
         logger.info("matches: {}".format([m['_id'] for m in matches]))
 
         # filter matches
@@ -577,10 +565,7 @@ def get_topsapp_cfgs(context_file, temporalBaseline=72, id_tmpl=IFG_ID_TMPL, min
     # get normalized rest url
     rest_url = uu.rest_url[:-1] if uu.rest_url.endswith('/') else uu.rest_url
 
-    # get index name and url
-    url = "{}/{}/_search?search_type=scan&scroll=60&size=100".format(rest_url, uu.grq_index_prefix)
     logger.info("idx: {}".format(uu.grq_index_prefix))
-    logger.info("url: {}".format(url))
 
     # query hits
     query.update({
@@ -591,18 +576,7 @@ def get_topsapp_cfgs(context_file, temporalBaseline=72, id_tmpl=IFG_ID_TMPL, min
         }
     })
     #logger.info("query: {}".format(json.dumps(query, indent=2)))
-    r = requests.post(url, data=json.dumps(query))
-    r.raise_for_status()
-    scan_result = r.json()
-    count = scan_result['hits']['total']
-    scroll_id = scan_result['_scroll_id']
-    ref_hits = []
-    while True:
-        r = requests.post('%s/_search/scroll?scroll=60m' % rest_url, data=scroll_id)
-        res = r.json()
-        scroll_id = res['_scroll_id']
-        if len(res['hits']['hits']) == 0: break
-        ref_hits.extend(res['hits']['hits'])
+    ref_hits = list(scroll_hits(rest_url, uu.grq_index_prefix, query, scroll='60m'))
 
     # extract reference ids
     ref_ids = { h['_id']: True for h in ref_hits }
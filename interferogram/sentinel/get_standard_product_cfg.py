@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 #from hysds.celery import app
 from utils.UrlUtils import UrlUtils as UU
 from fetchOrbitES import fetch
+import orbit_lookup
 from datetime import datetime
 
 # set logger and custom filter to handle being run from sciflo
@@ -128,14 +129,14 @@ def print_list(l):
     for f in l:
 	print("\n%s"%f)
 
-def get_metadata(id, rest_url, url):
-    """Get SLC metadata."""
+def get_metadata_batch(ids, rest_url, url):
+    """Get metadata of a set of SLCs with a single query, keyed by id."""
 
     # query hits
     query = {
         "query": {
-            "term": {
-                "_id": id
+            "terms": {
+                "_id": list(ids)
             }
         }
     }
@@ -145,16 +146,23 @@ def get_metadata(id, rest_url, url):
     scan_result = r.json()
     count = scan_result['hits']['total']
     scroll_id = scan_result['_scroll_id']
-    hits = []
+    hits = {}
     while True:
         r = requests.post('%s/_search/scroll?scroll=60m' % rest_url, data=scroll_id)
         res = r.json()
         scroll_id = res['_scroll_id']
         if len(res['hits']['hits']) == 0: break
-        hits.extend(res['hits']['hits'])
-    if len(hits) == 0:
-        raise RuntimeError("Failed to find {}.".format(id))
-    return hits[0]
+        for h in res['hits']['hits']:
+            hits.setdefault(h['_id'], h)
+    missing = [i for i in ids if i not in hits]
+    if len(missing) > 0:
+        raise RuntimeError("Failed to find {}.".format(", ".join(missing)))
+    return hits
+
+def get_metadata(id, rest_url, url):
+    """Get SLC metadata."""
+
+    return get_metadata_batch([id], rest_url, url)[id]
 
 def get_dates_mission(id):
     """Return day date, slc start date and slc end date."""
@@ -263,8 +271,7 @@ def get_orbit(ids):
         raise RuntimeError("Found SLCs for more than 1 day.")
     all_dts = day_dts[day_dt]
     all_dts.sort()
-    return fetch("%s.0" % all_dts[0].isoformat(), "%s.0" % all_dts[-1].isoformat(),
-                 mission=mission, dry_run=True)
+    return orbit_lookup.lookup(all_dts[0], all_dts[-1], mission)
 
 def get_urls(info):
     """Return list of SLC URLs with preference for S3 URLs."""
@@ -302,35 +309,27 @@ def get_track(info):
         raise RuntimeError("Failed to find SLCs for only 1 track.")
     return track
 
-def initiate_standard_product_job(context_file):
-    # get context
-    with open(context_file) as f:
-        context = json.load(f)
-
-
-    input_metadata = context['input_metadata']
-    if type(input_metadata) is list:
-        input_metadata = input_metadata[0]
+def get_job_cfg(input_metadata, md):
+    """
+    Assemble the config of one standard product job from its input metadata.
+    md holds the acquisition documents of the SLCs, keyed by id.
+    """
 
     # get args
     project = input_metadata['project']
     if type(project) is list:
         project = project[0]
 
-    #master_ids = [i.strip() for i in input_metadata['master_ids'].split()]
-    #slave_ids = [i.strip() for i in input_metadata['slave_ids'].split()]
-    master_scenes = input_metadata["master_scenes"]
-    slave_scenes = input_metadata["slave_scenes"]
     master_ids = input_metadata["master_slcs"]
     slave_ids = input_metadata["slave_slcs"]
     union_geojson = input_metadata["union_geojson"]
     direction = input_metadata["direction"]
     platform = input_metadata["platform"]
-    subswaths = [1, 2, 3] #context['subswaths']
-    
+    subswaths = [1, 2, 3]
+
     azimuth_looks = 7
     if 'azimuth_looks' in input_metadata:
-	azimuth_looks = int(input_metadata['azimuth_looks'])
+        azimuth_looks = int(input_metadata['azimuth_looks'])
 
     range_looks = 19
     if 'range_looks' in input_metadata:
@@ -342,17 +341,14 @@ def initiate_standard_product_job(context_file):
 
     precise_orbit_only = True
     if 'precise_orbit_only' in input_metadata:
-	precise_orbit_only = get_bool_param(input_metadata, 'precise_orbit_only')
+        precise_orbit_only = get_bool_param(input_metadata, 'precise_orbit_only')
 
     job_priority = int(input_metadata['priority'])
 
-    subswaths = [1, 2, 3]
-
-
     # log inputs
     logger.info("project: {}".format(project))
-    logger.info("master_scenes: {}".format(master_scenes))
-    logger.info("slave_scenes: {}".format(slave_scenes))
+    logger.info("master_scenes: {}".format(input_metadata["master_scenes"]))
+    logger.info("slave_scenes: {}".format(input_metadata["slave_scenes"]))
     logger.info("master_ids: {}".format(master_ids))
     logger.info("slave_ids: {}".format(slave_ids))
     logger.info("subswaths: {}".format(subswaths))
@@ -363,26 +359,9 @@ def initiate_standard_product_job(context_file):
     logger.info("direction : {}".format(direction))
     logger.info("platform : {}".format(platform))
 
-    # query docs
-    uu = UU()
-    logger.info("rest_url: {}".format(uu.rest_url))
-    logger.info("dav_url: {}".format(uu.dav_url))
-    logger.info("version: {}".format(uu.version))
-    logger.info("grq_index_prefix: {}".format(uu.grq_index_prefix))
-
-    # get normalized rest url
-    rest_url = uu.rest_url[:-1] if uu.rest_url.endswith('/') else uu.rest_url
-
-    # get index name and url
-    url = "{}/{}/_search?search_type=scan&scroll=60&size=100".format(rest_url, uu.grq_index_prefix)
-    logger.info("idx: {}".format(uu.grq_index_prefix))
-    logger.info("url: {}".format(url))
-
     # get metadata
-    master_md = { i:get_metadata(i, rest_url, url) for i in master_ids }
-    #logger.info("master_md: {}".format(json.dumps(master_md, indent=2)))
-    slave_md = { i:get_metadata(i, rest_url, url) for i in slave_ids }
-    #logger.info("slave_md: {}".format(json.dumps(slave_md, indent=2)))
+    master_md = { i:md[i] for i in master_ids }
+    slave_md = { i:md[i] for i in slave_ids }
 
     # get tracks
     track = get_track(master_md)
@@ -392,30 +371,22 @@ def initiate_standard_product_job(context_file):
     if track != slave_track:
         raise RuntimeError("Slave track {} doesn't match master track {}.".format(slave_track, track))
 
-    ref_scence = master_md
-    if len(master_ids)==1:
-	ref_scence = master_md
-    elif len(slave_ids)==1:
-	ref_scence = slave_md
-    elif len(master_ids) > 1 and  len(slave_ids)>1:
-	raise RuntimeError("Single Scene Reference Required.")
- 
+    if len(master_ids) > 1 and len(slave_ids) > 1:
+        raise RuntimeError("Single Scene Reference Required.")
+
     # get urls (prefer s3)
-    master_urls = get_urls(master_md) 
+    master_urls = get_urls(master_md)
     logger.info("master_urls: {}".format(master_urls))
-    slave_urls = get_urls(slave_md) 
+    slave_urls = get_urls(slave_md)
     logger.info("slave_ids: {}".format(slave_urls))
 
-    dem_type = get_dem_type(master_md)
-
     # get dem_type
     dem_type = get_dem_type(master_md)
     logger.info("master_dem_type: {}".format(dem_type))
     slave_dem_type = get_dem_type(slave_md)
     logger.info("slave_dem_type: {}".format(slave_dem_type))
     if dem_type != slave_dem_type:
-	dem_type = "SRTM+v3"
-
+        dem_type = "SRTM+v3"
 
     # get orbits
     master_orbit_url = get_orbit(master_ids)
@@ -430,18 +401,6 @@ def initiate_standard_product_job(context_file):
             orbit_type = 'resorb'
             break
 
-    # fail if we expect only precise orbits
-    #if precise_orbit_only and orbit_type == 'resorb':
-        #raise RuntimeError("Precise orbit required.")
-
-
-    '''
-    cord = union_geojson["coordinates"][0]
-    polygon = Polygon(cord)
-    x = polygon.bounds
-    west_lat1 = convert_number(x[1])
-    west_lat2 = convert_number(x[3])
-    '''
     minlat, maxlat = get_minmax(union_geojson)
     west_lat= "{}_{}".format(convert_number(minlat), convert_number(maxlat))
     logger.info("west_latitude : {}".format(west_lat))
@@ -449,93 +408,90 @@ def initiate_standard_product_job(context_file):
     # get ifg start and end dates
     ifg_master_dt, ifg_slave_dt = get_ifg_dates(master_ids, slave_ids)
 
-    #submit jobs
-    projects = []
-    stitched_args = []
-    ifg_ids = []
-    master_zip_urls = []
-    master_orbit_urls = []
-    slave_zip_urls = []
-    slave_orbit_urls = []
-    swathnums = []
-    bboxes = []
-    auto_bboxes = []
-    dem_types = []
-    job_priorities =[]
-    orbit_dict = {}
-    master_scenes = []
-    slave_scenes = []
-    union_geojsons = []
-    union_geojsons.append(union_geojson)
-    west_lats = []
-    west_lats.append(west_lat)   
-    ifg_hashes = [] 
-    directions = []
-    directions.append(direction)
-    platforms = []
-    platforms.append(platform)
-    tracks = []
-    tracks.append(track)
-    orbit_types = []
-    orbit_types.append(orbit_type)
-
-    # generate job configs
+    # generate job config
     bbox = [-90., 90., -180., 180.]
     auto_bbox = True
     id_tmpl = IFG_ID_TMPL
-
-    stitched_args.append(False if len(master_ids) == 1 or len(slave_ids) == 1 else True)
-    master_zip_urls.append(master_urls)
-    master_orbit_urls.append(master_orbit_url)
-    slave_zip_urls.append(slave_urls)
-    slave_orbit_urls.append(slave_orbit_url)
-    swathnums.append(subswaths)
-    bboxes.append(bbox)
-    auto_bboxes.append(auto_bbox)
-    projects.append(project)
-    dem_types.append(dem_type)
-    job_priorities.append(job_priority)
-    master_scenes.append(master_ids)
-    slave_scenes.append(slave_ids)
-    ifg_master_dts = []
-    ifg_master_dts.append(ifg_master_dt.strftime("%Y%m%d"))
-    ifg_slave_dts = []
-    ifg_slave_dts.append(ifg_slave_dt.strftime("%Y%m%d"))
-
-    satelite_orientation = "D"
-    if direction.lower()=="asc":
-        satelite_orientation = "A"
-    satelite_look_direction = "R"
-        
+    stitched = False if len(master_ids) == 1 or len(slave_ids) == 1 else True
 
     ifg_hash = hashlib.md5(json.dumps([
         id_tmpl,
-        stitched_args[-1],
-        master_zip_urls[-1],
-        master_orbit_urls[-1],
-        slave_zip_urls[-1],
-        slave_orbit_urls[-1],
-        #swathnums[-1],
-        #bboxes[-1],
-        #auto_bboxes[-1],
-        projects[-1],
-        #azimuth_looks,
+        stitched,
+        master_urls,
+        master_orbit_url,
+        slave_urls,
+        slave_orbit_url,
+        project,
         track,
         filter_strength,
-	dem_type
+        dem_type
     ])).hexdigest()
-    ifg_hashes.append(ifg_hash[0:4])
 
-    ifg_ids.append(id_tmpl.format('M', len(master_ids), len(slave_ids),
-                                      track, ifg_master_dt,
-                                      ifg_slave_dt, orbit_type, ifg_hash[0:4]))
-                            
+    ifg_id = id_tmpl.format('M', len(master_ids), len(slave_ids),
+                            track, ifg_master_dt,
+                            ifg_slave_dt, orbit_type, ifg_hash[0:4])
+
+    return ( project, stitched, auto_bbox, ifg_id, master_urls,
+             master_orbit_url, slave_urls, slave_orbit_url, subswaths,
+             bbox, dem_type, job_priority, master_ids, slave_ids, union_geojson,
+             ifg_hash[0:4], platform, direction, west_lat, track, orbit_type,
+             ifg_master_dt.strftime("%Y%m%d"), ifg_slave_dt.strftime("%Y%m%d") )
+
+
+def initiate_standard_product_jobs(input_metadata_list):
+    """
+    Assemble the configs of several standard product jobs. The acquisition
+    documents of all jobs are fetched with a single query and orbits are
+    resolved through the shared orbit lookup cache. Returns one list per
+    config field, with one entry per job.
+    """
+
+    # query docs
+    uu = UU()
+    logger.info("rest_url: {}".format(uu.rest_url))
+    logger.info("dav_url: {}".format(uu.dav_url))
+    logger.info("version: {}".format(uu.version))
+    logger.info("grq_index_prefix: {}".format(uu.grq_index_prefix))
+
+    # get normalized rest url
+    rest_url = uu.rest_url[:-1] if uu.rest_url.endswith('/') else uu.rest_url
+
+    # get index name and url
+    url = "{}/{}/_search?search_type=scan&scroll=60&size=100".format(rest_url, uu.grq_index_prefix)
+    logger.info("idx: {}".format(uu.grq_index_prefix))
+    logger.info("url: {}".format(url))
+
+    # get metadata of the SLCs of all jobs
+    ids = []
+    for input_metadata in input_metadata_list:
+        for i in chain(input_metadata["master_slcs"], input_metadata["slave_slcs"]):
+            if i not in ids: ids.append(i)
+    md = get_metadata_batch(ids, rest_url, url)
+
+    cfgs = [ get_job_cfg(i, md) for i in input_metadata_list ]
+    ( projects, stitched_args, auto_bboxes, ifg_ids, master_zip_urls,
+      master_orbit_urls, slave_zip_urls, slave_orbit_urls, swathnums,
+      bboxes, dem_types, job_priorities, master_scenes, slave_scenes,
+      union_geojsons, ifg_hashes, platforms, directions, west_lats, tracks,
+      orbit_types, ifg_master_dts, ifg_slave_dts ) = [ list(i) for i in zip(*cfgs) ]
 
     logger.info("\n\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s\n" %(projects, stitched_args, auto_bboxes, ifg_ids, master_zip_urls, master_orbit_urls, slave_zip_urls, slave_orbit_urls, swathnums, bboxes, dem_types, union_geojsons, ifg_hashes, platforms, directions, west_lats, tracks, orbit_types, ifg_master_dts, ifg_slave_dts))
     return ( projects, stitched_args, auto_bboxes, ifg_ids, master_zip_urls,
              master_orbit_urls, slave_zip_urls, slave_orbit_urls, swathnums,
              bboxes, dem_types, job_priorities, master_scenes,slave_scenes, union_geojsons, ifg_hashes, platforms, directions, west_lats, tracks, orbit_types, ifg_master_dts, ifg_slave_dts)
 
+
+def initiate_standard_product_job(context_file):
+    # get context
+    with open(context_file) as f:
+        context = json.load(f)
+
+    input_metadata = context['input_metadata']
+    if type(input_metadata) is list:
+        input_metadata = input_metadata[0]
+
+    return initiate_standard_product_jobs([input_metadata])
+
 '''
 def initiate_sp2(context_file):
 
@@ -3,6 +3,8 @@ import os, sys, json, argparse
 import numpy as np
 from osgeo import ogr, osr
 
+from utils.geom_union import FootprintUnion
+
 from Sentinel1_TOPS import Sentinel1_TOPS
 from FrameInfoExtractor import FrameInfoExtractor as FIE
 from extractMetadata_s1 import objectify, S1toFrame
@@ -47,16 +49,13 @@ def get_loc(xml_file):
     }
 
 
+def get_union(xml_files):
+    """Union of the swath footprints with its envelope, area and orientation."""
+    return FootprintUnion([get_loc(xml_file)["coordinates"][0] for xml_file in xml_files])
+
+
 def get_union_geom(xml_files):
-    geom_union = None
-    for xml_file in xml_files:
-        loc = get_loc(xml_file)
-        geom = ogr.CreateGeometryFromJson(json.dumps(loc))
-        if geom_union is None:
-            geom_union = geom
-        else:
-            geom_union = geom_union.Union(geom)
-    return geom_union
+    return get_union(xml_files).geometry
 
 
 def get_bbox(xml_files):
@@ -64,7 +63,7 @@ def get_bbox(xml_files):
 
 
 def get_envelope(xml_files):
-    env = get_union_geom(xml_files).GetEnvelope()
+    env = get_union(xml_files).envelope
     # reorder for topsApp/ISCE
     return (env[2], env[3], env[0], env[1])
 
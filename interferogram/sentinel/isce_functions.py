@@ -532,20 +532,11 @@ def get_env_box(env):
 
 
 def get_union_geom(bbox_list):
-    from osgeo import gdal, ogr, osr
-    import json
+    from utils.geom_union import FootprintUnion
 
-    geom_union = None
-    for bbox in bbox_list:
-        loc = get_loc(bbox)
-        geom = ogr.CreateGeometryFromJson(json.dumps(loc))
-        print("get_union_geom : geom : %s" %get_union_geom)
-        if geom_union is None:
-            geom_union = geom
-        else:
-            geom_union = geom_union.Union(geom)
-    print("geom_union_type : %s" %type(geom_union)) 
-    return geom_union
+    union = FootprintUnion([get_loc(bbox)["coordinates"][0] for bbox in bbox_list])
+    print("get_union_geom : %d footprints, area : %s, orientation : %s" %(len(bbox_list), union.area, union.orientation))
+    return union.geometry
 
 def get_area(coords):
     '''get area of enclosed coordinates- determines clockwise or counterclockwise order'''
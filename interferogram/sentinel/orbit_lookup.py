@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+'''
+Shared lookup cache of Sentinel-1 orbit file urls.
+
+Resolving the orbit of an SLC with fetchOrbitES.fetch(..., dry_run=True)
+costs one catalog query per orbit type. Job configuration resolves the
+orbits of many SLCs of the same missions and days, so lookups go through
+two levels of caching:
+
+- every (mission, start, end) window resolved by this process is memoized,
+- the validity windows of precise orbit files are kept in a json file
+  shared by the processes of a node. An SLC window is resolved from it when
+  a cached precise orbit covers the window and is centered within half a day
+  of it, i.e. it is the file fetch would pick among the daily precise orbits.
+  Among cached files of the same window the newest creation time wins, as in
+  fetch. A precise orbit can be reprocessed and republished under a newer
+  creation time, which only fetch can see, so entries expire CACHE_TTL after
+  they were cached and the window is then resolved by fetch again.
+
+Restituted orbits are only memoized in-process since they are superseded by
+precise orbits as those get published.
+
+Set ARIA_ORBIT_CACHE to relocate the json file or to "none" to disable it,
+and ARIA_ORBIT_CACHE_TTL to change the lifetime of its entries in seconds.
+'''
+from __future__ import division
+import os
+import re
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+
+from fetchOrbitES import fetch
+from utils.cache_utils import cache_dir, write_json_atomic
+
+logger = logging.getLogger('orbit_lookup')
+
+CACHE_VERSION = 2
+
+#seconds a cached precise orbit is trusted
+CACHE_TTL = 24 * 3600
+
+ORBIT_RE = re.compile(r'(?P<mission>S1\w)_OPER_AUX_(?P<type>\w{6})_OPOD_(?P<created>\d{8}T\d{6})' +
+                      r'_V(?P<start>\d{8}T\d{6})_(?P<end>\d{8}T\d{6})')
+
+ORBIT_TIME_FMT = "%Y%m%dT%H%M%S"
+
+#spacing of consecutive precise orbit files
+PRECISE_SPACING = timedelta(days=1)
+
+#in-process memo of resolved windows
+_memo = {}
+
+
+def get_cache_file():
+    """Return the path of the shared cache file, None if disabled."""
+
+    orbit_dir = cache_dir('orbits', 'ARIA_ORBIT_CACHE')
+    if orbit_dir is None: return None
+    return os.path.join(orbit_dir, 'precise_orbits.json')
+
+
+def load_entries():
+    """Return the unexpired cached precise orbits: {url: {'mission', 'created', 'start', 'end', 'cached'}}."""
+
+    cache_file = get_cache_file()
+    if cache_file is None: return {}
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if cache.get('version') != CACHE_VERSION: return {}
+    ttl = float(os.environ.get('ARIA_ORBIT_CACHE_TTL', CACHE_TTL))
+    now = time.time()
+    return { url: entry for url, entry in cache.get('orbits', {}).items()
+             if now - entry['cached'] <= ttl }
+
+
+def save_entry(url, entry):
+    """Add a precise orbit to the shared cache. Failures are never fatal."""
+
+    cache_file = get_cache_file()
+    if cache_file is None: return
+    entries = load_entries()
+    entries[url] = entry
+    try:
+        write_json_atomic(cache_file, {'version': CACHE_VERSION, 'orbits': entries}, indent=2, sort_keys=True)
+    except (IOError, OSError, ValueError) as e:
+        logger.warning("Cannot update orbit cache {}: {}".format(cache_file, e))
+
+
+def parse_orbit_url(url):
+    """Return (mission, orbit type, creation, validity start, validity end) of an orbit url or None."""
+
+    match = ORBIT_RE.search(os.path.basename(url))
+    if not match: return None
+    return (match.group('mission'), match.group('type'),
+            datetime.strptime(match.group('created'), ORBIT_TIME_FMT),
+            datetime.strptime(match.group('start'), ORBIT_TIME_FMT),
+            datetime.strptime(match.group('end'), ORBIT_TIME_FMT))
+
+
+def find_cached(start_dt, end_dt, mission):
+    """Return the cached precise orbit url fetch would pick for the window or None."""
+
+    mid_dt = start_dt + (end_dt - start_dt) // 2
+    best = None
+    for url, entry in load_entries().items():
+        if entry['mission'] != mission: continue
+        v_start = datetime.strptime(entry['start'], ORBIT_TIME_FMT)
+        v_end = datetime.strptime(entry['end'], ORBIT_TIME_FMT)
+        if v_start > start_dt or v_end < end_dt: continue
+        v_mid = v_start + (v_end - v_start) // 2
+        if abs(mid_dt - v_mid) >= PRECISE_SPACING // 2: continue
+        # closest center first, then the newest reprocessing of the window
+        rank = (abs(mid_dt - v_mid), -int(entry['created'].replace('T', '')), url)
+        if best is None or rank < best: best = rank
+    return None if best is None else best[2]
+
+
+def lookup(start_dt, end_dt, mission):
+    """Return the orbit url for an acquisition window of a mission."""
+
+    key = (mission, start_dt.isoformat(), end_dt.isoformat())
+    if key in _memo: return _memo[key]
+
+    url = find_cached(start_dt, end_dt, mission)
+    if url is not None:
+        logger.info("Found cached precise orbit {} for {} {} {}".format(url, mission, start_dt, end_dt))
+    else:
+        url = fetch("%s.0" % start_dt.isoformat(), "%s.0" % end_dt.isoformat(),
+                    mission=mission, dry_run=True)
+        parsed = parse_orbit_url(url) if url else None
+        if parsed is not None and parsed[1] == 'POEORB':
+            save_entry(url, {'mission': parsed[0],
+                             'created': parsed[2].strftime(ORBIT_TIME_FMT),
+                             'start': parsed[3].strftime(ORBIT_TIME_FMT),
+                             'end': parsed[4].strftime(ORBIT_TIME_FMT),
+                             'cached': time.time()})
+    _memo[key] = url
+    return url
@@ -8,9 +8,10 @@ from osgeo import gdal, ogr, osr
 import numpy as np
 import isce
 from iscesys.Component.ProductManager import ProductManager as PM
-from isceobj.Orbit.Orbit import Orbit
 
 from utils.time_utils import getTemporalSpanInDays
+from utils.geom_union import FootprintUnion
+from frameMetadata.RadarGeometry import RadarGeometry
 
 
 gdal.UseExceptions() # make GDAL raise python exceptions
@@ -27,13 +28,9 @@ MISSION_RE = re.compile(r'^S1(\w)$')
 def get_raster_corner_coords(vrt_file):
     """Return raster corner coordinates."""
 
-    # go to directory where vrt exists to extract from image
-    cwd =os.getcwd()
-    data_dir = os.path.dirname(os.path.abspath(vrt_file))
-    os.chdir(data_dir)
-
-    # extract geo-coded corner coordinates
-    ds = gdal.Open(os.path.basename(vrt_file))
+    # extract geo-coded corner coordinates; relative paths in the vrt
+    # are resolved by GDAL against the vrt location
+    ds = gdal.Open(os.path.abspath(vrt_file))
     gt = ds.GetGeoTransform()
     cols = ds.RasterXSize
     rows = ds.RasterYSize
@@ -46,7 +43,6 @@ def get_raster_corner_coords(vrt_file):
             lat = gt[3] + (px * gt[4]) + (py * gt[5])
             ext.append([lat, lon])
         lat_arr.reverse()
-    os.chdir(cwd)
     return ext
 
 
@@ -59,43 +55,19 @@ def load_product(int_file):
     return prod
 
 
-def get_orbit():
-    """Return orbit object."""
-
-    orb = Orbit()
-    orb.configure()
-    return orb
-
-
-def get_aligned_bbox(prod, orb):
-    """Return estimate of 4 corner coordinates of the
-       track-aligned bbox of the product."""
+def get_aligned_bbox(prod, nazimuth=2, nrange=2):
+    """Return estimate of the corner coordinates of the
+       track-aligned bbox of the product.
 
-    # create merged orbit
-    burst = prod.bursts[0]
+       The burst orbits are merged once and all corners are located in a
+       single call; nazimuth/nrange > 2 densify the edges of the footprint."""
 
-    #Add first burst orbit to begin with
-    for sv in burst.orbit:
-         orb.addStateVector(sv)
-
-    ##Add all state vectors
-    for bb in prod.bursts:
-        for sv in bb.orbit:
-            if (sv.time< orb.minTime) or (sv.time > orb.maxTime):
-                orb.addStateVector(sv)
-        bb.orbit = orb
-
-    # extract bbox
-    ts = [prod.sensingStart, prod.sensingStop]
-    rngs = [prod.startingRange, prod.farRange]
-    pos = []
-    for tim in ts:
-        for rng in rngs:
-            llh = prod.orbit.rdr2geo(tim, rng, height=0.)
-            pos.append(llh)
-    pos = np.array(pos)
-    bbox = pos[[0, 1, 3, 2], 0:2]
-    return bbox.tolist()
+    geom = RadarGeometry.fromBursts(prod.bursts)
+    ring = geom.footprint(prod.sensingStart, prod.sensingStop,
+                          prod.startingRange, prod.farRange,
+                          nazimuth=nazimuth, nrange=nrange, height=0.)
+    # drop the closing point
+    return ring[:-1]
 
 def get_area(coords):
     '''get area of enclosed coordinates- determines clockwise or counterclockwise order'''
@@ -144,18 +116,14 @@ def get_env_box(env):
     return bbox
 
 
+def get_union(bbox_list):
+    """Union of the swath footprints with its envelope, area and orientation."""
+    union = FootprintUnion([get_loc(bbox)["coordinates"][0] for bbox in bbox_list])
+    print("get_union : %d footprints, area : %s, orientation : %s" %(len(bbox_list), union.area, union.orientation))
+    return union
+
 def get_union_geom(bbox_list):
-    geom_union = None
-    for bbox in bbox_list:
-        loc = get_loc(bbox)
-        geom = ogr.CreateGeometryFromJson(json.dumps(loc))
-        print("get_union_geom : geom : %s" %get_union_geom)
-        if geom_union is None:
-            geom_union = geom
-        else:
-            geom_union = geom_union.Union(geom)
-    print("geom_union_type : %s" %type(geom_union)) 
-    return geom_union
+    return get_union(bbox_list).geometry
 
 def update_met_json(orbit_type, scene_count, swath_num, master_mission,
                     slave_mission, pickle_dir, int_files, vrt_file, 
@@ -212,8 +180,7 @@ def update_met_json(orbit_type, scene_count, swath_num, master_mission,
     for int_file in int_files:
         try:
             prod = load_product(int_file)
-            orb = get_orbit()
-            bbox_swath = get_aligned_bbox(prod, orb)
+            bbox_swath = get_aligned_bbox(prod)
         except Exception as e:
             logger.warn("Failed to get aligned bbox: %s" % traceback.format_exc())
             logger.warn("Getting raster corner coords instead.")
@@ -221,10 +188,10 @@ def update_met_json(orbit_type, scene_count, swath_num, master_mission,
         print("bbox_swath : %s" %bbox_swath)
         bboxes.append(bbox_swath)
 
-    geom_union = get_union_geom(bboxes)
-    bbox = json.loads(geom_union.ExportToJson())["coordinates"][0]
+    union = get_union(bboxes)
+    bbox = json.loads(union.geometry.ExportToJson())["coordinates"][0]
     print("First Union Bbox : %s " %bbox)
-    bbox = get_env_box(geom_union.GetEnvelope())
+    bbox = get_env_box(union.envelope)
     print("Get Envelop :Final bbox : %s" %bbox)    
     
     bbox=change_direction(bbox)
@@ -7,6 +7,7 @@ import os
 import sys
 import re
 from utils.UrlUtils import UrlUtils
+from utils.download_manager import DownloadManager, MANIFEST_NAME
 from interferogram.ifg_stitcher import main as main_st
 import json
 import numpy as np
@@ -455,45 +456,40 @@ def get_ts_urls(urls,min_repeat=12,max_repeat=72,only_best=True):
             
     return urls[indx[seldates]]
             
-def donwload(unw_name,frames,dirname,products):
+def donwload(unw_name,frames,dirname,products,workers=4):
     try:
         os.mkdir(dirname)
     except:
         pass
-    cwd = os.getcwd()
-    os.chdir(dirname)
     fnames = []
-    failed = False
+    jobs = []
     for i,urls in list(frames.items()):
         fname = []
         for j,v in enumerate(urls):
             rundir = 'run_' + str(j+1) + '_' + str(i)
             fname.append(os.path.join(rundir,unw_name))
             try:
-                os.mkdir(rundir)
+                os.mkdir(os.path.join(dirname,rundir))
             except:
                 pass
-            ccwd = os.getcwd()
-            os.chdir(rundir)
             for pr in products:
-                failed = get_data_from_url(v + '/merged/' + pr)
-                failed1  = get_data_from_url(v + '/merged/' + pr + '.xml')
-                if failed is True or failed1 is True:
-                    print('Stitching Failed')
-                    failed = True
-                    break
-            os.chdir(ccwd)
-            if failed:
-                break
-        if failed:
-            break
+                for url in [v + '/merged/' + pr, v + '/merged/' + pr + '.xml']:
+                    jobs.append((url,os.path.join(dirname,rundir,url.split('/')[-1])))
         fnames.append(fname)
     fnames = np.array(fnames).T.tolist()
-    if not failed:
-        ret = fnames
-    else:
+    #fetch everything concurrently. progress is kept in the manifest so a rerun only gets what is missing
+    uu = UrlUtils()
+    manager = DownloadManager(os.path.join(dirname,MANIFEST_NAME),auth=(uu.dav_u,uu.dav_p),workers=workers)
+    failed = manager.fetch_all(jobs)
+    stats = manager.summary()
+    print('Downloaded %d files, %d bytes in %.1f s at %.1f MB/s' % (stats['files'],stats['bytes'],stats['seconds'],stats['throughput']/2.**20))
+    if failed:
+        print('Stitching Failed')
+        for url in failed:
+            print('Failed to download',url)
         ret = []
-    os.chdir(cwd)
+    else:
+        ret = fnames
     return ret
 #input is a json with the direction (along,across), the output filename (filt_topophase.geo) and the 
 #the list of the input files.
@@ -14,6 +14,7 @@ from osgeo import ogr, osr
 
 from utils.UrlUtils import UrlUtils
 from utils.createImage import createImage
+from utils.catalog_client import scroll_hits
 from .sentinel.check_interferogram import check_int
 from interferogram.stitcher_utils import main as main_st, get_mets, get_dates
 
@@ -118,17 +119,24 @@ class SetEncoder(json.JSONEncoder):
       return json.JSONEncoder.default(self, obj)
 
 
+#fields of each interferogram kept in the grouped mets
+MET_FIELDS = ('swath', 'imageCorners')
+
+
 def group_ifgs(hits):
-    """Group interferograms by track, direction, swath and platform."""
+    """Group interferograms by track, direction, swath and platform.
+
+    Hits are consumed as they stream in and only the fields needed downstream
+    (id, version, times, url, swath and corners) are kept per interferogram.
+    """
 
     # filter on v1.1.2 or later (S1-IFG name scheme change)
     version_re = re.compile(r'v1\.(?:1\.[2-9]|[2-9](?:\.\d+)?)$')
 
     grouped = {}
     for h in hits:
-        #logger.info(json.dumps(h, indent=2))
-
-        id = h['fields']['partial'][0]['id']
+        src = h['fields']['partial'][0]
+        id = src['id']
 
         # filter S1-IFGs only
         if h['_type'] != "S1-IFG":
@@ -136,43 +144,47 @@ def group_ifgs(hits):
             continue 
 
         # filter out old versions
-        v = h['fields']['partial'][0]['system_version']
+        v = src['system_version']
         if version_re.search(v) is None:
             logger.info("Skipping {}: Invalid version ({}).".format(id, v))
             continue 
 
         # filter out missing track numbers
-        track = h['fields']['partial'][0]['metadata']['trackNumber']
-        if h['fields']['partial'][0]['metadata']['trackNumber'] is None:
+        md = src['metadata']
+        track = md['trackNumber']
+        if track is None:
             logger.info("Skipping {}: Invalid trackNumber ({}).".format(id, track))
             continue
 
-        # get metadata
-        md = h['fields']['partial'][0]['metadata']
-
-        #id, version, start/end time and url are not part of the metadata, so add it
-        md['id'] = id
-        md['version'] = v
-        md['starttime'] = h['fields']['partial'][0]['starttime']
-        md['endtime'] = h['fields']['partial'][0]['endtime']
-        md['url'] = h['fields']['partial'][0]['urls'][0]
+        # compact met: id, version, start/end time and url are not part of the metadata
+        met = { k: md.get(k) for k in MET_FIELDS }
+        met['id'] = id
+        met['version'] = v
+        met['starttime'] = src['starttime']
+        met['endtime'] = src['endtime']
+        met['url'] = src['urls'][0]
 
         # cleanup direction
         if md['direction'] == "asc": direction = "ascending"
         elif md['direction'] == "dsc": direction = "descending"
         else: direction = md['direction']
 
-        gp = grouped.setdefault(track, {}).setdefault(direction, {})
+        gp = grouped.setdefault(str(track), {}).setdefault(direction, {})
         gp.setdefault('swath', set()).add(md['swath'])
         gp.setdefault('platform', set()).update(md['platform'])
-        gp.setdefault('mets', []).append(md)
-    grouped = json.loads(json.dumps(grouped, cls=SetEncoder))
+        gp.setdefault('mets', []).append(met)
+
+    # sets to sorted lists so the input hashes are reproducible
+    for track in grouped:
+        for gp in grouped[track].values():
+            gp['swath'] = sorted(gp['swath'])
+            gp['platform'] = sorted(gp['platform'])
     #logger.info(json.dumps(grouped, indent=2))
     return grouped
 
 
 def query_hits(uu, query):
-    """Query hits."""
+    """Stream query hits."""
 
     # query docs
     logger.info("rest_url: {}".format(uu.rest_url))
@@ -180,36 +192,19 @@ def query_hits(uu, query):
     logger.info("version: {}".format(uu.version))
     logger.info("grq_index_prefix: {}".format(uu.grq_index_prefix))
 
-    # get normalized rest url
-    rest_url = uu.rest_url[:-1] if uu.rest_url.endswith('/') else uu.rest_url
-
-    # get index name and url
-    url = "{}/{}/_search?search_type=scan&scroll=60&size=100".format(rest_url, uu.grq_index_prefix)
-    logger.info("idx: {}".format(uu.grq_index_prefix))
-    logger.info("url: {}".format(url))
-
-    # query hits
+    # query hits; only transfer the fields used by group_ifgs()
     query.update({
         "partial_fields" : {
             "partial" : {
-                "exclude" : "city"
+                "include" : [ "id", "system_version", "starttime", "endtime", "urls",
+                              "metadata.trackNumber", "metadata.direction",
+                              "metadata.platform" ] +
+                            [ "metadata.{}".format(k) for k in MET_FIELDS ]
             }
         }
     })
     #logger.info("query: {}".format(json.dumps(query, indent=2)))
-    r = requests.post(url, data=json.dumps(query))
-    r.raise_for_status()
-    scan_result = r.json()
-    count = scan_result['hits']['total']
-    scroll_id = scan_result['_scroll_id']
-    hits = []
-    while True:
-        r = requests.post('%s/_search/scroll?scroll=60m' % rest_url, data=scroll_id)
-        res = r.json()
-        scroll_id = res['_scroll_id']
-        if len(res['hits']['hits']) == 0: break
-        hits.extend(res['hits']['hits'])
-    return hits
+    return scroll_hits(uu.rest_url, uu.grq_index_prefix, query, scroll='60m')
 
 
 def main():
@@ -9,13 +9,15 @@ from glob import glob
 from lxml.etree import parse
 import numpy as np
 from datetime import datetime
+from multiprocessing import Pool, cpu_count
 
 from utils.UrlUtils import UrlUtils
 from utils.createImage import createImage
+from utils.catalog_client import get_resolver
 from .sentinel.check_interferogram import check_int
 from interferogram.stitcher_utils import main as main_st, get_mets, get_dates
 from interferogram.validate_ifg import (get_lat_index, get_times, create_dataset_json,
-ifg_exists, SetEncoder, group_ifgs, query_hits)
+SetEncoder, group_ifgs, query_hits)
 
 
 
@@ -61,11 +63,44 @@ def create_met_json(id, version, inps, met_json_file):
         json.dump(met, f, indent=2)
 
 
-def main():
-    """HySDS PGE wrapper for Sentinel-1 interferogram validation."""
+def create_product(job):
+    """Create the validated time-series stack product of one group.
+
+    Runs in a worker process, in the product directory. Returns (job, error)."""
 
-    # save cwd (working directory)
     cwd = os.getcwd()
+    inps, id = job['inps'], job['id']
+    try:
+        # create product directory
+        dataset_dir = os.path.abspath(id)
+        os.makedirs(dataset_dir, 0o755)
+
+        # chdir
+        os.chdir(dataset_dir)
+
+        # run validate_ts
+        json.dump(inps['mets'],open(inps['meta_file'],'w'), indent=2, sort_keys=True)
+        json.dump(inps,open('valid_ts_in.json','w'), indent=2, sort_keys=True)
+        main_st(('-a validate_ts_met -i ' + 'valid_ts_in.json').split())
+
+        # create dataset json
+        ds_json_file = os.path.join("{}.dataset.json".format(id))
+        create_dataset_json(id, job['version'], job['location'], job['starttime'], job['endtime'], ds_json_file)
+
+        # create met json
+        met_json_file = os.path.join("{}.met.json".format(id))
+        create_met_json(id, job['version'], inps, met_json_file)
+        return job, None
+    except Exception as e:
+        logger.error("Failed to create {}: {}".format(id, traceback.format_exc()))
+        return job, str(e)
+    finally:
+        # chdir back up to work directory
+        os.chdir(cwd)
+
+
+def main():
+    """HySDS PGE wrapper for Sentinel-1 interferogram validation."""
 
     # get context
     ctx_file = os.path.abspath('_context.json')
@@ -85,19 +120,29 @@ def main():
     query = ctx['query']
     conf = ctx.get('conf', 'settings.conf')
     sys_ver = ctx.get('sys_ver', "v1*")
+    workers = int(ctx.get('workers', cpu_count()))
     output_file = 'valid_ts_out.json'
     meta_file = 'valid_meta_ts_out.json'
 
     # get lat index min/max
     lat_idx_min, lat_idx_max = get_lat_index(location)
 
-    # query hits
+    # get dataset version, tag and endpoint configurations
+    version = get_version()
+    tag = re.sub("[^a-zA-Z0-9_]", "_", ctx.get("context", {}).get("dataset_tag", "standard"))
     uu = UrlUtils() # url utils obj
-    hits = query_hits(uu, query)
+    es_url = uu.rest_url
+    es_index = "{}_{}_s1-validated_ts_stack".format(uu.grq_index_prefix, version)
+    logger.info("GRQ url: {}".format(es_url))
+    logger.info("GRQ index: {}".format(es_index))
 
-    # enumeration of inps
-    inps_list = []
+    # query hits, grouped as they stream in
+    hits = query_hits(uu, query)
     grouped = group_ifgs(hits)
+
+    # enumeration of products; the input hash is part of the product id, so
+    # groups whose inputs did not change map to products that already exist
+    jobs = []
     for track in grouped:
         for direction in grouped[track]:
             gp = grouped[track][direction]
@@ -117,77 +162,52 @@ def main():
                 "output_file": output_file,
                 "meta_file": meta_file,
             }
-            inps_list.append(inps)
 
-    #logger.info("inps_list: {}".format(json.dumps(inps_list, indent=2)))
+            # md5 hash
+            md5 = hashlib.md5(json.dumps(inps, sort_keys=True, ensure_ascii=True).encode('utf-8')).hexdigest()
+
+            # get times
+            starttimes, endtimes = get_times(inps['mets'])
+            starttime = datetime.strptime(starttimes[0], "%Y-%m-%dT%H:%M:%S%f")
+            endtime = datetime.strptime(endtimes[-1], "%Y-%m-%dT%H:%M:%S%f")
+
+            # get id base
+            id_base = "S1-VALIDATED_TS_STACK-TN{}_{}-{}_{}-{}_{}_s{}-{}".format(inps['track'],
+                                                                                inps['latitudeIndexMin'],
+                                                                                inps['latitudeIndexMax'],
+                                                                                starttime.strftime("%Y%m%dT%H%M%S"),
+                                                                                endtime.strftime("%Y%m%dT%H%M%S"),
+                                                                                inps['direction'],
+                                                                                "".join(map(str, sorted(inps['swaths']))),
+                                                                                md5[0:4])
+            id = "{}-{}-{}".format(id_base, version, tag)
+            logger.info("Product ID for version {}: {}".format(version, id))
+            jobs.append({ 'id': id, 'inps': inps, 'version': version,
+                          'location': location, 'starttime': starttime, 'endtime': endtime })
+
+    # check which products already exist, all at once
+    existing = get_resolver(es_url, es_index).resolve([job['id'] for job in jobs])
+    for job in jobs:
+        if job['id'] in existing:
+            logger.info("{} was previously generated and exists in GRQ database.".format(job['id']))
+    jobs = [job for job in jobs if job['id'] not in existing]
+    logger.info("{} validated time-series stacks to create.".format(len(jobs)))
 
     # create validate_ts output for each input list
-    for inps in inps_list:
-
-        # get times
-        starttimes, endtimes = get_times(inps['mets'])
-        starttime = datetime.strptime(starttimes[0], "%Y-%m-%dT%H:%M:%S%f")
-        endtime = datetime.strptime(endtimes[-1], "%Y-%m-%dT%H:%M:%S%f")
-
-        # md5 hash
-        md5 = hashlib.md5(json.dumps(inps, sort_keys=True, ensure_ascii=True).encode('utf-8')).hexdigest()
-
-        # get id base
-        id_base = "S1-VALIDATED_TS_STACK-TN{}_{}-{}_{}-{}_{}_s{}-{}".format(inps['track'],
-                                                                            inps['latitudeIndexMin'],
-                                                                            inps['latitudeIndexMax'],
-                                                                            starttime.strftime("%Y%m%dT%H%M%S"),
-                                                                            endtime.strftime("%Y%m%dT%H%M%S"),
-                                                                            inps['direction'],
-                                                                            "".join(map(str, sorted(inps['swaths']))),
-                                                                            md5[0:4])
-        
-        # get dataset version and set dataset ID
-        version = get_version()
-        id = "{}-{}-{}".format(id_base, version, re.sub("[^a-zA-Z0-9_]", "_", ctx.get("context", {})
-                                                   .get("dataset_tag", "standard")))
-
-        logger.info("Product ID: {}".format(id))
-
-        # get endpoint configurations
-        uu = UrlUtils()
-        es_url = uu.rest_url
-        es_index = "{}_{}_s1-validated_ts_stack".format(uu.grq_index_prefix, version)
-
-        # check if interferogram already exists
-        logger.info("GRQ url: {}".format(es_url))
-        logger.info("GRQ index: {}".format(es_index))
-        logger.info("Product ID for version {}: {}".format(version, id))
-        if ifg_exists(es_url, es_index, id):
-            logger.info("{} interferogram for {}".format(version, id_base) +
-                        " was previously generated and exists in GRQ database.")
-            return 0
-
-        # create product directory
-        dataset_dir = os.path.abspath(id)
-        os.makedirs(dataset_dir, 0o755)
-
-        # chdir
-        os.chdir(dataset_dir)
-
-        # run validate_ts
+    failed = []
+    if len(jobs) > 0:
+        pool = Pool(max(1, min(workers, len(jobs))))
         try:
-            mets = inps['mets']
-            json.dump(mets,open(inps['meta_file'],'w'), indent=2, sort_keys=True)
-            json.dump(inps,open('valid_ts_in.json','w'), indent=2, sort_keys=True)
-            main_st(('-a validate_ts_met -i ' + 'valid_ts_in.json').split())
-
-            # create dataset json
-            ds_json_file = os.path.join("{}.dataset.json".format(id))
-            create_dataset_json(id, version, location, starttime, endtime, ds_json_file)
-
-            # create met json
-            met_json_file = os.path.join("{}.met.json".format(id))
-            create_met_json(id, version, inps, met_json_file)
-
+            for job, error in pool.imap_unordered(create_product, jobs):
+                if error is not None: failed.append(job['id'])
         finally:
-            # chdir back up to work directory
-            os.chdir(cwd)
+            pool.close()
+            pool.join()
+
+    if len(failed) > 0:
+        raise RuntimeError("Failed to create {} of {} products: {}".format(len(failed), len(jobs),
+                                                                          ", ".join(sorted(failed))))
+    return 0
 
 
 if __name__ == '__main__':
@@ -19,7 +19,7 @@ from os import path
 from frameMetadata.FrameMetadata import FrameMetadata
 from peg_region_check.PegReader import PegReader, PegInfoFactory
 from peg_region_check.PegRegionChecker import PegRegionChecker
-from frameMetadata.OrbitInfo import OrbitInfo
+from frameMetadata.OrbitInfo import CoherenceEngine
 import argparse
 from iscesys.Compatibility import Compatibility
 Compatibility.checkPythonVersion()
@@ -52,16 +52,17 @@ def checkPegRegion(fm,project):
     return prc.runNominalMode()
 
 def checkCoherence(tbp,peg,project):
-    isCoherent = []
     bCrit,tau,doppler,thr = getParameters(project)
+    #screen all the frame pairs of all the candidates in one batch
+    framePairs = []
+    bounds = []
     for pairs in tbp:
-        isCoh = True
-        for fm1,fm2 in zip(pairs[0],pairs[1]):
-            oi = OrbitInfo(fm1)
-            if not (oi.isCoherent(fm2,bCrit,tau,doppler,thr)):
-                isCoh = False
-                break
-        isCoherent.append(isCoh)
+        start = len(framePairs)
+        framePairs.extend(zip(pairs[0],pairs[1]))
+        bounds.append((start,len(framePairs)))
+    engine = CoherenceEngine(bCrit,tau,doppler)
+    coherent = engine.isCoherent(framePairs,thr)
+    isCoherent = [bool(coherent[start:stop].all()) for start,stop in bounds]
     tbpNew = []
     pegNew = []
     for pairs,pg,coh in zip(tbp,peg,isCoherent):
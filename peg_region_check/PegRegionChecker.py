@@ -17,6 +17,8 @@ import pdb
 import os
 import math
 import json
+import numpy as np
+from bisect import bisect_right
 from httplib2 import Http
 from urllib.parse import urlencode
 from utils.UrlUtils import UrlUtils
@@ -43,6 +45,7 @@ class PegRegionChecker(object):
             self._pegFilename = filename
         PR = PegReader()
         self._pegList = PR.createPegList(self._pegFilename)
+        self._pegIndex = None
 
     def getPegFile(self,sensor,project):
         #factory for the pegfile based on sensor and project.
@@ -57,42 +60,61 @@ class PegRegionChecker(object):
             raise Exception
         return filename
     
+    def getPegIndex(self):
+        #per track latitude interval index over self._pegList. for each track keep the
+        #peg indices sorted by min latitude, the sorted min latitudes and the running
+        #max of the max latitudes so that the candidates overlapping a latitude range
+        #are found with a bisection instead of a scan of the whole list. the index is
+        #rebuilt when the list is replaced or grown
+        if self._pegIndex is None or self._pegIndexList is not self._pegList or self._pegIndexSize != len(self._pegList):
+            byTrack = {}
+            for i,peg in enumerate(self._pegList):
+                byTrack.setdefault(peg.track,[]).append((min(peg.latStart,peg.latEnd),max(peg.latStart,peg.latEnd),i))
+            self._pegIndex = {}
+            for track,intervals in byTrack.items():
+                intervals.sort()
+                runMax = []
+                for interval in intervals:
+                    runMax.append(max(interval[1],runMax[-1]) if runMax else interval[1])
+                self._pegIndex[track] = ([interval[0] for interval in intervals],runMax,intervals)
+            self._pegIndexList = self._pegList
+            self._pegIndexSize = len(self._pegList)
+        return self._pegIndex
+
+    def findPegCandidates(self,minLat,maxLat,track):
+        #indices in file order of the pegs of track whose latitude band overlaps [minLat,maxLat]
+        index = self.getPegIndex()
+        if track not in index:
+            return []
+        mins,runMax,intervals = index[track]
+        candidates = []
+        k = bisect_right(mins,maxLat) - 1
+        while k >= 0 and runMax[k] >= minLat:
+            if intervals[k][1] >= minLat:
+                candidates.append(intervals[k][2])
+            k -= 1
+        return sorted(candidates)
+
     def findPegRegion(self,bbox,track):
-        maxLat = -1000
-        minLat = 1000
-        maxLon = -1000
-        minLon = 1000
-        for bb in bbox:
-            if(bb[0] > maxLat):
-                maxLat = bb[0]
-            if(bb[0] < minLat):
-                minLat = bb[0]
-            if(bb[1] > maxLon):
-                maxLon = bb[1]
-            if(bb[1] < minLon):
-                minLon = bb[1]
+        lats = [bb[0] for bb in bbox]
+        lons = [bb[1] for bb in bbox]
+        maxLat = max(lats)
+        minLat = min(lats)
+        maxLon = max(lons)
+        minLon = min(lons)
         pegIndx = [] # a frame can cross 2 peg regions
-        #print (maxLat,minLat)
-        for i in range(len(self._pegList)):
-            #import pdb
-            #pdb.set_trace()            
-            if (track == self._pegList[i].track) :
-                pegLon = self._pegList[i].peg.getLongitude()
-                #this is  a way to make sure that we are looking at the right track, since for each track # there is a descending and an ascending
-                if (math.fabs(pegLon - (maxLon + minLon)/2.0) < 90) or (math.fabs(pegLon - (maxLon + minLon)/2.0) > 270):
-                    maxPegLat = self._pegList[i].latStart
-                    minPegLat = self._pegList[i].latEnd
-                    #print (minPegLat,maxPegLat)
-                    if(self._pegList[i].latStart < self._pegList[i].latEnd):
-                        minPegLat = self._pegList[i].latStart
-                        maxPegLat = self._pegList[i].latEnd
-                    if (maxLat < maxPegLat) and (minLat > minPegLat):# is fully contained
-                        pegIndx.append(i)
-                        break
-                    elif (maxLat < minPegLat) or (minLat > maxPegLat):# fully out go to next
-                        continue
-                    else:# the frame crosses the peg extremes. append but do not break since probably it will cross another region
-                        pegIndx.append(i)
+        #only pegs overlapping the frame latitudes are visited, in the same order as in the peg file
+        for i in self.findPegCandidates(minLat,maxLat,track):
+            pegLon = self._pegList[i].peg.getLongitude()
+            #this is  a way to make sure that we are looking at the right track, since for each track # there is a descending and an ascending
+            if (math.fabs(pegLon - (maxLon + minLon)/2.0) < 90) or (math.fabs(pegLon - (maxLon + minLon)/2.0) > 270):
+                minPegLat = min(self._pegList[i].latStart,self._pegList[i].latEnd)
+                maxPegLat = max(self._pegList[i].latStart,self._pegList[i].latEnd)
+                if (maxLat < maxPegLat) and (minLat > minPegLat):# is fully contained
+                    pegIndx.append(i)
+                    break
+                else:# the frame crosses the peg extremes. append but do not break since probably it will cross another region
+                    pegIndx.append(i)
 
 
         if len(pegIndx) == 0:
@@ -110,33 +132,29 @@ class PegRegionChecker(object):
         numDiv = int(math.fabs((max(old_div(pegLen,frameLen),1))*10))
         delta = old_div(pegLen,numDiv)
         start = pegStart
-        pointList = [start + i*delta for i in range(numDiv+1)] # this should have enough sampling of the region including the edges of the peg region
-        # now check that all the point are covered
-        pointIn = [0]*(numDiv+1)
-        for i in range(len(pointList)):
-            for j in range(len(bboxes)):
-                maxLon = -1000
-                minLon = 1000
-                for bb in bboxes[j]:
-                    if(bb[1] > maxLon):
-                        maxLon = bb[1]
-                    if(bb[1] < minLon):
-                        minLon = bb[1]
-                #this is  a way to make sure that we are looking at the right track, since for each track # there is a descending and an ascending
-                if not (math.fabs(pegLon - (maxLon + minLon)/2.0) < 90) or (math.fabs(pegLon - (maxLon + minLon)/2.0) > 270):
-                    continue
-                maxLat = -1000
-                minLat = 1000
-                for bb in bboxes[j]:
-                    if(bb[0] > maxLat):
-                        maxLat = bb[0]
-                    if(bb[0] < minLat):
-                        minLat = bb[0]
-
-                if(pointList[i] <= maxLat and pointList[i] >= minLat):
-                    pointIn[i] = 1
-
-        if(sum(pointIn) != len(pointIn)):
+        points = start + np.arange(numDiv+1)*delta # this should have enough sampling of the region including the edges of the peg region
+        #latitude interval of each frame on the right side of the track
+        starts = []
+        ends = []
+        for bbox in bboxes:
+            lons = [bb[1] for bb in bbox]
+            #this is  a way to make sure that we are looking at the right track, since for each track # there is a descending and an ascending
+            if not (math.fabs(pegLon - (max(lons) + min(lons))/2.0) < 90):
+                continue
+            lats = [bb[0] for bb in bbox]
+            starts.append(min(lats))
+            ends.append(max(lats))
+        # now check that all the point are covered. sweep the intervals sorted by start:
+        # a point is covered iff the largest end among the intervals starting before it reaches it
+        covered = False
+        if starts:
+            order = np.argsort(starts,kind='mergesort')
+            starts = np.array(starts)[order]
+            ends = np.maximum.accumulate(np.array(ends)[order])
+            k = np.searchsorted(starts,points,side='right') - 1
+            covered = bool(np.all((k >= 0) & (ends[np.maximum(k,0)] >= points)))
+
+        if not covered:
             retVal = []
         else:
             bboxes = sorted(bboxes,reverse = True) #it will sort by the first lat of each bbox.
@@ -607,6 +625,9 @@ class PegRegionChecker(object):
         self.requester = Http()
         self._referenceFrame = ""
         self._pegList = []
+        self._pegIndex = None
+        self._pegIndexList = None
+        self._pegIndexSize = 0
         self._pegFilename = ""
         self._breakAfterFirst = False #when searching for multiple passes stop as soon as on orbit
                                     #covers the peg region. useful for trigger mode
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
+from __future__ import print_function
 import numpy as np
 from datetime import datetime as DT
 import requests
 import ast
+import json
 import sys
 import pyproj
 from collections import OrderedDict
@@ -18,6 +20,54 @@ gpsSources = ['measures_comb', 'jpl_ats']
 WGS84llh = pyproj.Proj(proj='latlong', ellps='WGS84', datum='WGS84')
 WGS84xyz = pyproj.Proj(proj='geocent', ellps='WGS84', datum='WGS84')
 
+try:
+    _xyz2llh = pyproj.Transformer.from_proj(WGS84xyz, WGS84llh)
+except AttributeError:
+    ###Older pyproj without Transformer
+    _xyz2llh = None
+
+
+def ecef2llh(x, y, z):
+    '''
+    Convert ECEF coordinates (scalars or arrays) to WGS84 lon, lat, height.
+    '''
+    if _xyz2llh is not None:
+        return _xyz2llh.transform(x, y, z)
+    return pyproj.transform(WGS84xyz, WGS84llh, x, y, z)
+
+
+def enuRotation(lat, lon):
+    '''
+    Rotation matrices from ECEF to local East-North-Up for arrays of
+    geodetic latitudes and longitudes in degrees. Returns an array of
+    shape (N,3,3) with rows east, north and up.
+    '''
+    lat = np.radians(np.atleast_1d(np.asarray(lat, dtype=np.float64)))
+    lon = np.radians(np.atleast_1d(np.asarray(lon, dtype=np.float64)))
+    slat, clat = np.sin(lat), np.cos(lat)
+    slon, clon = np.sin(lon), np.cos(lon)
+
+    Tmat = np.zeros((lat.size, 3, 3))
+    Tmat[:,0,0] = -slon
+    Tmat[:,0,1] = clon
+    Tmat[:,1,0] = -slat * clon
+    Tmat[:,1,1] = -slat * slon
+    Tmat[:,1,2] = clat
+    Tmat[:,2,0] = clat * clon
+    Tmat[:,2,1] = clat * slon
+    Tmat[:,2,2] = slat
+    return Tmat
+
+
+def rotateErrors(Tmat, var):
+    '''
+    Propagate diagonal ECEF variances var (...,3) through the rotations
+    Tmat (N,3,3) assuming a diagonal output covariance.
+    '''
+    if var.ndim == 2:
+        return np.sqrt(np.einsum('nij,nj->ni', Tmat**2, var))
+    return np.sqrt(np.einsum('nij,ntj->nti', Tmat**2, var))
+
 
 class GPS(object):
     '''
@@ -36,8 +86,8 @@ class GPS(object):
 
         for (key, value) in zip(fields, values):
             if key:
-                key1 = key.encode('ascii', 'ignore')
-                val1 = value.encode('ascii', 'ignore')
+                key1 = key.encode('ascii', 'ignore').decode('ascii')
+                val1 = value.encode('ascii', 'ignore').decode('ascii')
                 try:
                     val1 = ast.literal_eval(val1)
                 except:
@@ -54,52 +104,23 @@ class GPS(object):
         Verify if the XYZ to LLH data in the results are consistent.
         '''
 
-        res = pyproj.transform(WGS84xyz, WGS84llh, self.x, self.y, self.z)
+        res = ecef2llh(self.x, self.y, self.z)
 
-        print 'Listed: ', self.wgsLon, self.wgsLat, self.wgsHt
-        print 'Estimated: ', res[0], res[1], res[2]
-        print 'Error: ', self.wgsLon - res[0], self.wgsLat-res[1], self.wgsHt - res[2]
+        print('Listed: ', self.wgsLon, self.wgsLat, self.wgsHt)
+        print('Estimated: ', res[0], res[1], res[2])
+        print('Error: ', self.wgsLon - res[0], self.wgsLat-res[1], self.wgsHt - res[2])
 
     def setupLocalCoordinates(self):
         '''
         Sets up the local coordinate system around given point.
-        Adopted from metpy toolbox.
         '''
 
-        ###Local center in XYZ
-        localCenter = np.array([self.x, self.y, self.z])
-        llh = np.array(pyproj.transform(WGS84xyz, WGS84llh, self.x, self.y, self.z))    
-
-        #XYZ coords of point above center
-        aboveCenter = np.array(pyproj.transform(WGS84llh, WGS84xyz, llh[0], llh[1], llh[2]+1.0))
-
-        n = aboveCenter - localCenter
-        n = n/np.linalg.norm(n)
-        localz = n
-
-        #Unit vector projection
-        d = np.dot(n, aboveCenter)
-        P = np.identity(3) - np.transpose(np.vstack((n,n,n))) *np.vstack((n,n,n))
-
-        ###Pick a point directly to the north of the reference location
-        northCenterECEF = np.array(pyproj.transform(WGS84llh, WGS84xyz, llh[0], llh[1]+0.0001, llh[2]))
-        localy = np.dot(P, northCenterECEF)
-        localy = -localy / np.linalg.norm(localy) # negation gets x and y pointing in the right direction
-        
-        #local x is y (cross) z to get an orthogonal system
-        localx = np.transpose(np.cross(localy, localz))
-        localx = localx / np.linalg.norm(localx)
-        
-        
-        Tmat = np.zeros((3,3))
-        Tmat[0,:] = localx
-        Tmat[1,:] = localy
-        Tmat[2,:] = localz
-        #
-        self.localTransform = Tmat
+        llh = ecef2llh(self.x, self.y, self.z)
+        self.localTransform = enuRotation(llh[1], llh[0])[0]
 
         ####Approximate error in reference position
-        self.refError = np.sqrt(np.diag(np.dot(self.localTransform, np.dot(np.diag([self.x_sig**2, self.y_sig**2, self.z_sig**2]), self.localTransform.T))))
+        self.refError = rotateErrors(self.localTransform[None,:,:],
+                np.array([[self.x_sig**2, self.y_sig**2, self.z_sig**2]]))[0]
 
         return
         
@@ -119,8 +140,7 @@ class GPS(object):
         ####Assuming diag covariance to diag covariance
 
         differr = np.array([inp.x_sig**2 + self.x_sig**2 , inp.y_sig**2 + self.y_sig**2, inp.z_sig**2 + self.z_sig**2])
-        err = np.dot(self.localTransform, np.diag(differr))
-        err = np.sqrt(np.diag(np.dot(err, self.localTransform.T)))
+        err = rotateErrors(self.localTransform[None,:,:], differr[None,:])[0]
         return res,err
 
     def __str__(self):
@@ -163,7 +183,7 @@ def getGPSinBox(yyyymmdd, snwe, source='jpl_ats'):
     fields['source'] = source
 
     final_url=''+base_url
-    for key,val in fields.iteritems():
+    for key,val in fields.items():
         final_url += '&{0}={1}'.format(key,val)
 
     req = requests.get(final_url, verify=False)
@@ -208,7 +228,7 @@ class GPSstn(object):
         try:
             pos = self.dates[date][0]
         except:
-            print 'No GPS data for day %s and station %s'%(date, self.name)
+            print('No GPS data for day %s and station %s'%(date, self.name))
             sys.exit(errorCodes['GPS Data Error'])
 
         return pos
@@ -220,7 +240,7 @@ class GPSstn(object):
         try:
             pos = self.dates[date][1]
         except:
-            print 'No GPS data for day %s and station %s'%(date, self.name)
+            print('No GPS data for day %s and station %s'%(date, self.name))
             sys.exit(errorCodes['GPS Data Error'])
 
         return pos
@@ -242,7 +262,7 @@ class GPSstn(object):
         Create a SOPAC style GPS file without model header.
         '''
         with open(fname, 'w') as fid:
-            dateorder = np.sort(self.dates.keys())
+            dateorder = sorted(self.dates.keys())
             for date in dateorder:
                 dateObj = DT.strptime(date, '%Y%m%d')
                 dayYear = dateObj.timetuple().tm_yday
@@ -270,6 +290,117 @@ class GPSstn(object):
         return ostr
 
 
+class ENUSeries(object):
+    '''
+    Local ENU time series of a set of GPS stations, stored column-wise.
+
+    enu and err have shape (stations, dates, 3) and are in meters relative to
+    the position of each station on the reference (first) date. Missing
+    observations are NaN.
+    '''
+    def __init__(self, sites, lats, lons, ii, jj, dates, enu, err, refError):
+        self.sites = list(sites)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.ii = np.asarray(ii, dtype=np.int64)
+        self.jj = np.asarray(jj, dtype=np.int64)
+        self.dates = list(dates)
+        self.enu = enu
+        self.err = err
+        self.refError = refError
+        #description of how the stations were selected, see save
+        self.meta = {}
+
+    @classmethod
+    def fromGPS(cls, refStns, positions, obsByDate):
+        '''
+        Batch convert the ECEF observations of all stations to local ENU.
+        refStns: OrderedDict site -> GPS on the reference date.
+        positions: dict site -> (ii, jj) image position.
+        obsByDate: OrderedDict date -> dict site -> GPS, reference date first.
+        '''
+        sites = list(refStns.keys())
+        dates = list(obsByDate.keys())
+        nsite = len(sites)
+        ndate = len(dates)
+
+        ref = np.array([[refStns[s].x, refStns[s].y, refStns[s].z] for s in sites], dtype=np.float64).reshape((nsite,3))
+        refVar = np.array([[refStns[s].x_sig**2, refStns[s].y_sig**2, refStns[s].z_sig**2] for s in sites], dtype=np.float64).reshape((nsite,3))
+
+        ###Local frame at every station in one pass
+        llh = ecef2llh(ref[:,0], ref[:,1], ref[:,2])
+        Tmat = enuRotation(llh[1], llh[0])
+        refError = rotateErrors(Tmat, refVar)
+
+        xyz = np.full((nsite, ndate, 3), np.nan)
+        var = np.full((nsite, ndate, 3), np.nan)
+        for kk, date in enumerate(dates):
+            obs = obsByDate[date]
+            for nn, site in enumerate(sites):
+                gps = obs.get(site)
+                if gps is not None:
+                    xyz[nn,kk,:] = [gps.x, gps.y, gps.z]
+                    var[nn,kk,:] = [gps.x_sig**2, gps.y_sig**2, gps.z_sig**2]
+
+        enu = np.einsum('nij,ntj->nti', Tmat, xyz - ref[:,None,:])
+        err = rotateErrors(Tmat, var + refVar[:,None,:])
+
+        return cls(sites,
+                   [refStns[s].wgsLat for s in sites],
+                   [refStns[s].wgsLon for s in sites],
+                   [positions[s][0] for s in sites],
+                   [positions[s][1] for s in sites],
+                   dates, enu, err, refError)
+
+    def complete(self):
+        '''
+        Return a new series restricted to stations observed on every date.
+        '''
+        keep = np.all(np.isfinite(self.enu), axis=(1,2))
+        return ENUSeries([s for s,k in zip(self.sites, keep) if k],
+                         self.lats[keep], self.lons[keep], self.ii[keep], self.jj[keep],
+                         self.dates, self.enu[keep], self.err[keep], self.refError[keep])
+
+    def save(self, fname, meta=None):
+        '''
+        Write the series to a columnar npz store, with an optional json
+        serializable dict describing the station selection.
+        '''
+        if meta is not None:
+            self.meta = dict(meta)
+        np.savez(fname, sites=np.array(self.sites), lats=self.lats, lons=self.lons,
+                 ii=self.ii, jj=self.jj, dates=np.array(self.dates),
+                 enu=self.enu, err=self.err, refError=self.refError,
+                 meta=np.array(json.dumps(self.meta, sort_keys=True)))
+
+    @classmethod
+    def load(cls, fname):
+        '''
+        Read a series written by save.
+        '''
+        data = np.load(fname)
+        series = cls([str(s) for s in data['sites']], data['lats'], data['lons'],
+                     data['ii'], data['jj'], [str(d) for d in data['dates']],
+                     data['enu'], data['err'], data['refError'])
+        if 'meta' in data.files:
+            series.meta = json.loads(str(data['meta']))
+        return series
+
+    def toStations(self):
+        '''
+        Return an OrderedDict of GPSstn objects, in mm except for the
+        reference date error, as expected by the GIAnT repo writer.
+        '''
+        stns = OrderedDict()
+        for nn, site in enumerate(self.sites):
+            stn = GPSstn(site, self.lats[nn], self.lons[nn], int(self.ii[nn]), int(self.jj[nn]))
+            stn.addObservation(self.dates[0], np.zeros(3), self.refError[nn])
+            for kk in range(1, len(self.dates)):
+                stn.addObservation(self.dates[kk], 1000*self.enu[nn,kk], 1000*self.err[nn,kk])
+            stns[site] = stn
+        return stns
+
+
 if __name__ == '__main__':
     '''
     Test driver.
@@ -278,7 +409,7 @@ if __name__ == '__main__':
     stns = getGPSinBox('20110101',[34.0,35.0,242.0,240.0])
     stn = stns['alpp']
 
-    print 'Reference: ', stn
-    print 'Point :', stns['ana1']
+    print('Reference: ', stn)
+    print('Point :', stns['ana1'])
 
-    print stn.toENU(stns['ana1'])
+    print(stn.toENU(stns['ana1']))
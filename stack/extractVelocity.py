@@ -3,6 +3,7 @@
 import isce
 import numpy as np 
 import h5py
+from utils.h5_layout import iter_row_blocks
 import argparse
 import os
 
@@ -21,16 +22,18 @@ def cmdLineParse():
     return parser.parse_args()
 
 
-def getVelocity(h5file, outfile):
+def getVelocity(h5file, outfile, index=1):
     '''
     Extract velocity from h5file.
+    Rows are read in blocks aligned with the dataset chunks so that only the
+    requested parameter is pulled from chunked files and memory stays bounded.
     '''
-
     fid = h5py.File(h5file, 'r')
     parms = fid['parms']
-    vel = parms[:,:,1].astype(np.float32)
-    shape = vel.shape
-    vel.tofile(outfile)
+    shape = parms.shape[0:2]
+    with open(outfile, 'wb') as ofid:
+        for start, stop in iter_row_blocks(parms):
+            parms[start:stop,:,index].astype(np.float32).tofile(ofid)
     fid.close()
     return shape
 
@@ -7,6 +7,7 @@ import veloLib
 import GPSlib
 from collections import OrderedDict
 import json
+import hashlib
 """
 This script 
     - Creates a land water mask
@@ -177,58 +178,80 @@ if __name__ == '__main__':
             sys.exit(errorCodes['Not enough coherence'])
 
     else:
-        ####First get GPS data for the master SAR acquisition
-        try:
-            masterGPS = GPSlib.getGPSinBox(sarList[0], metaData['snwe'])
-        except:
-            print 'Unable to get GPS data for master date'
-            sys.exit(errorCodes['GPS Data Error'])
-
-        gpsData = OrderedDict()
-
-        for site, gps in masterGPS.iteritems():
-            ii = np.int(np.round((gps.wgsLat - metaData['snwe'][1])/metaData['deltaLat']))
-            jj = np.int(np.round((gps.wgsLon - metaData['snwe'][2])/metaData['deltaLon']))
-
-            if (ii > inps['gpswin']) and (ii < (metaData['length'] - inps['gpswin'])):
-                if (jj > inps['gpswin']) and (jj < (metaData['width'] - inps['gpswin'])):
-                    msk = np.nansum(1*np.isfinite(allMask[ii-inps['gpswin']:ii+inps['gpswin'], jj-inps['gpswin']:jj+inps['gpswin']]))
-                    if msk > 0:
-                        gps.setupLocalCoordinates()
-                        gpsData[site] = GPSlib.GPSstn(gps.site, gps.wgsLat, gps.wgsLon, ii, jj)
-                        gpsData[site].addObservation(sarList[0], np.zeros(3), gps.refError)
-
-
-        #####Check if enough GPS stations are available
-        if len(gpsData) < 5:
-            print 'Less than 5 GPS stations over the frame'
-            print 'Try manual processing or without GPS'
-            sys.exit(errorCodes['Not enough GPS points'])
+        ####Converted GPS series are reused only if they were selected for the
+        ####same dates, grid, station window and coherence mask
+        gpsStore = inps.get('gpsStore', 'gps_enu.npz')
+        selection = {'dates': list(sarList),
+                     'snwe': [float(x) for x in metaData['snwe']],
+                     'deltaLat': float(metaData['deltaLat']),
+                     'deltaLon': float(metaData['deltaLon']),
+                     'length': int(metaData['length']),
+                     'width': int(metaData['width']),
+                     'gpswin': int(inps['gpswin']),
+                     'mask': hashlib.md5(allMask.astype(np.float32).tobytes()).hexdigest()}
 
         ####Check if there is sufficient overlap between InSAR and GPS
         if np.sum(np.isfinite(allMask)) == 0:
             print 'Not enough coherence around GPS stations.'
             sys.exit(errorCodes['Not enough GPS points'])
 
-       
-        ####Loop over the SAR dates to create ENU observation array
-        for date in sarList[1:]:
+        series = None
+        if os.path.exists(gpsStore):
+            series = GPSlib.ENUSeries.load(gpsStore)
+            if series.meta.get('selection') != selection:
+                print 'GPS store was built for other inputs. Regenerating: ', gpsStore
+                series = None
+            else:
+                print 'Reusing converted GPS series from: ', gpsStore
+                nStations = series.meta['stations']
+
+        if series is None:
+            ####First get GPS data for the master SAR acquisition
             try:
-                slaveGPS = GPSlib.getGPSinBox(date, metaData['snwe'])
+                masterGPS = GPSlib.getGPSinBox(sarList[0], metaData['snwe'])
             except:
-                print 'Unable to get GPS data for date: '+date
+                print 'Unable to get GPS data for master date'
                 sys.exit(errorCodes['GPS Data Error'])
 
-            for site,gps  in gpsData.iteritems():
-                if site not in slaveGPS.keys():
-                    del masterGPS[site]
-                else:
-                    enu,err = masterGPS[site].toENU(slaveGPS[site])
-                    gps.addObservation(date, 1000*enu, 1000*err)
+            refStns = OrderedDict()
+            positions = {}
+
+            for site, gps in masterGPS.items():
+                ii = np.int(np.round((gps.wgsLat - metaData['snwe'][1])/metaData['deltaLat']))
+                jj = np.int(np.round((gps.wgsLon - metaData['snwe'][2])/metaData['deltaLon']))
 
-            if len(gpsData) < 5:
-                print 'Number of GPS points available < 5'
-                sys.exit(errorCodes['Not enough GPS points'])
+                if (ii > inps['gpswin']) and (ii < (metaData['length'] - inps['gpswin'])):
+                    if (jj > inps['gpswin']) and (jj < (metaData['width'] - inps['gpswin'])):
+                        msk = np.nansum(1*np.isfinite(allMask[ii-inps['gpswin']:ii+inps['gpswin'], jj-inps['gpswin']:jj+inps['gpswin']]))
+                        if msk > 0:
+                            refStns[site] = gps
+                            positions[site] = (ii, jj)
+            nStations = len(refStns)
+
+        #####Check if enough GPS stations are available
+        if nStations < 5:
+            print 'Less than 5 GPS stations over the frame'
+            print 'Try manual processing or without GPS'
+            sys.exit(errorCodes['Not enough GPS points'])
+
+        if series is None:
+            ####Gather the observations for all SAR dates
+            obsByDate = OrderedDict([(sarList[0], masterGPS)])
+            for date in sarList[1:]:
+                try:
+                    obsByDate[date] = GPSlib.getGPSinBox(date, metaData['snwe'])
+                except:
+                    print 'Unable to get GPS data for date: '+date
+                    sys.exit(errorCodes['GPS Data Error'])
+
+            ####Convert all stations and dates to ENU at once. Stations missing any date are dropped
+            series = GPSlib.ENUSeries.fromGPS(refStns, positions, obsByDate).complete()
+            series.save(gpsStore, {'selection': selection, 'stations': nStations})
+
+        gpsData = series.toStations()
+        if len(gpsData) < 5:
+            print 'Number of GPS points available < 5'
+            sys.exit(errorCodes['Not enough GPS points'])
 
         print 'Number of viable GPS stations: ', len(gpsData)
 
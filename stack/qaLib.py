@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+'''
+Block streamed coverage QA of a stack of staged interferograms.
+
+All the unwrapped / coherence rasters are read once, a block of lines at a
+time, by a pool of reader threads. For every block the data and coherence
+masks of all interferograms are combined at once, which gives in one pass
+
+    - the coverage of each interferogram,
+    - the number of interferograms covering each pixel (common coverage)
+      and the overlap of each interferogram with the common region,
+    - the strict QA mask: pixels valid in every interferogram at the
+      stricter coherence threshold.
+
+Only one block of masks is held in memory, its size is set by blockBytes.
+'''
+from __future__ import print_function
+from __future__ import division
+import os
+import json
+import numpy as np
+from multiprocessing.pool import ThreadPool
+import veloLib
+
+#####Default memory budget for the masks of one block of lines
+BLOCK_BYTES = 256*1024*1024
+
+
+class CoverageQA(object):
+    '''
+    Single pass coverage statistics of a list of interferograms.
+    '''
+    def __init__(self, intList, unwFile, corFile, cthresh, chthresh, minifg,
+            blockBytes=BLOCK_BYTES, nthreads=4):
+        self.intList = intList
+        self.unwFile = unwFile
+        self.corFile = corFile
+        self.cthresh = cthresh
+        self.chthresh = chthresh
+        self.minifg = minifg
+        self.blockBytes = blockBytes
+        self.nthreads = nthreads
+
+        nIfg = len(intList)
+        self.exists = np.zeros(nIfg, dtype=bool)
+        self.valid = np.zeros(nIfg, dtype=np.int64)
+        self.overlap = np.zeros(nIfg, dtype=np.int64)
+        self.commonCount = 0
+        self.maxCount = 0
+        self.size = 0
+
+    def openRasters(self):
+        '''
+        Memory map the rasters of the interferograms that have both files.
+        '''
+        rasters = []
+        for ind, intdir in enumerate(self.intList):
+            unwname = os.path.join(intdir, self.unwFile)
+            corname = os.path.join(intdir, self.corFile)
+            if not os.path.exists(unwname) or not os.path.exists(corname):
+                print('Pair %d not useful. skipping ....'%(ind))
+                continue
+
+            self.exists[ind] = True
+            rasters.append((veloLib.createMemmap(unwname).bands[0],
+                            veloLib.createMemmap(corname).bands[0]))
+        return rasters
+
+    def run(self, maskFile):
+        '''
+        Stream over all rasters and write the strict QA mask (float64, 1 for
+        valid pixels) to maskFile. Returns the per interferogram statistics.
+        '''
+        rasters = self.openRasters()
+        nUse = len(rasters)
+        if nUse == 0:
+            raise Exception('No interferogram with both unwrapped and coherence files')
+
+        length, width = rasters[0][0].shape
+        self.size = length*width
+        nlines = int(max(1, min(length, self.blockBytes // (2*nUse*width))))
+
+        mask = np.empty((nUse, nlines, width), dtype=bool)
+        strict = np.empty((nUse, nlines, width), dtype=bool)
+
+        def readBlock(args):
+            kk, first, last = args
+            unw = rasters[kk][0][first:last,:]
+            cor = rasters[kk][1][first:last,:]
+            nl = last - first
+            dmask = (unw != 0)
+            np.logical_and(dmask, cor > self.cthresh, out=mask[kk,:nl,:])
+            np.logical_and(dmask, cor > self.chthresh, out=strict[kk,:nl,:])
+
+        pool = ThreadPool(self.nthreads)
+        try:
+            with open(maskFile, 'wb') as fid:
+                for first in range(0, length, nlines):
+                    last = min(length, first + nlines)
+                    nl = last - first
+                    pool.map(readBlock, [(kk, first, last) for kk in range(nUse)])
+
+                    bmask = mask[:,:nl,:]
+                    count = bmask.sum(axis=0, dtype=np.int32)
+                    common = count > self.minifg
+
+                    self.valid[self.exists] += bmask.reshape(nUse,-1).sum(axis=1)
+                    self.overlap[self.exists] += bmask[:,common].sum(axis=1)
+                    self.commonCount += int(common.sum())
+                    self.maxCount = max(self.maxCount, int(count.max()))
+
+                    np.logical_and.reduce(strict[:,:nl,:], axis=0).astype(np.float64).tofile(fid)
+        finally:
+            pool.close()
+            pool.join()
+
+        return self.stats()
+
+    def coverage(self):
+        '''
+        Fraction of the frame covered by each interferogram.
+        '''
+        return self.valid / (1.0*self.size)
+
+    def commonFraction(self):
+        '''
+        Fraction of the frame covered by more than minifg interferograms.
+        '''
+        return self.commonCount / (1.0*self.size)
+
+    def overlapFraction(self):
+        '''
+        Fraction of the common region covered by each interferogram.
+        '''
+        if self.commonCount == 0:
+            return np.zeros(len(self.intList))
+        return self.overlap / (1.0*self.commonCount)
+
+    def stats(self):
+        '''
+        Per interferogram coverage statistics.
+        '''
+        cover = self.coverage()
+        frac = self.overlapFraction()
+        return [{'pair': os.path.basename(intdir),
+                 'exists': bool(self.exists[ind]),
+                 'valid_pixels': int(self.valid[ind]),
+                 'coverage': float(cover[ind]),
+                 'common_overlap': float(frac[ind])}
+                for ind, intdir in enumerate(self.intList)]
+
+    def writeStats(self, fname, useful=None):
+        '''
+        Dump the statistics to a json file for later reuse.
+        '''
+        stats = self.stats()
+        if useful is not None:
+            for entry, flag in zip(stats, useful):
+                entry['useful'] = bool(flag)
+
+        with open(fname, 'w') as fid:
+            json.dump({'size': self.size,
+                       'common_fraction': self.commonFraction(),
+                       'max_count': self.maxCount,
+                       'pairs': stats}, fid, indent=2)
@@ -4,6 +4,7 @@ import sys
 import os
 import numpy as np
 import veloLib
+import qaLib
 import json
 """
 This script 
@@ -60,39 +61,18 @@ if __name__ == '__main__':
     metaData = veloLib.getGeoData(os.path.join(intList[0], 'insarProc.xml'))
 
     nIfg = len(intList)
-    
-    #####Track two types of coverage
-    cover = np.zeros(nIfg)
-    usefulPair = np.ones(nIfg, dtype=np.bool)
-    commonMask = np.zeros((metaData['length'], metaData['width']))
-
-    size = metaData['width']*metaData['length']
-
-    ######First Pass over interferograms
-    for ind, intdir in enumerate(intList):
-
-        print 'Processing IFG  %d out of  %d'%(ind+1, nIfg)
-        
-        unwname = os.path.join(intdir,inps['unwFile'])
-        corname = os.path.join(intdir,inps['corFile'])
-        if not os.path.exists(unwname) or not os.path.exists(corname):
-            usefulPair[ind] = False
-            print 'Pair %d not useful. skipping ....'%(ind)
-            continue
-
-        unw = veloLib.createMemmap(unwname)
-        cor = veloLib.createMemmap(corname)
-
-        dmask = (unw.bands[0] != 0)
-        cmask = (cor.bands[0] > inps['cthresh_qa'])
 
-        mask = dmask*cmask
-        commonMask += mask 
-
-        cover[ind] = np.sum(mask) / (1.0*size)
-        unw = None
-        cor = None
+    ######Single pass over all interferograms
+    print 'Computing coverage of %d IFGs'%(nIfg)
+    qa = qaLib.CoverageQA(intList, inps['unwFile'], inps['corFile'],
+            inps['cthresh_qa'], inps['chthresh'], inps['minifg'],
+            nthreads=inps.get('qaThreads', 4))
+    maskTmp = inps['qamaskName'] + '.tmp'
+    qa.run(maskTmp)
 
+    #####Track two types of coverage
+    cover = qa.coverage()
+    usefulPair = qa.exists.copy()
 
     #######Apply coverage filter
     for kk in xrange(nIfg):
@@ -134,45 +114,21 @@ if __name__ == '__main__':
         print '%d Interferograms have coverage that satisfies all conditions'%(useful)
 
 
-    if np.max(commonMask) != nIfg:
+    if qa.maxCount != nIfg:
         print 'WARNING !!!!!!!!!!'
         print 'There may be no common region'
 
 
-    commonMask = (commonMask > inps['minifg'])
-    csum = np.sum(commonMask)/(1.0*size)
+    csum = qa.commonFraction()
 
     print('Common sum: ', csum)
     if (csum < inps['mincov']):
         raise Exception('Not enough common regions between IFGS.')
 
-    commonMask1 = np.ones((metaData['length'], metaData['width']))
-
-    ######Second Pass over interferograms
-    for ind, intdir in enumerate(intList):
-
-        print 'Processing IFG  %d out of  %d'%(ind+1, nIfg)
-        
-        unwname = os.path.join(intdir, inps['unwFile'])
-        corname = os.path.join(intdir, inps['corFile'])
-        if not os.path.exists(unwname) or not os.path.exists(corname):
-            usefulPair[ind] = False
-            print 'Pair %d not useful. skipping ....'%(ind)
-            continue
-
-        unw = veloLib.createMemmap(unwname)
-        cor = veloLib.createMemmap(unwname)
-
-        size = cor.bands[0].size
-        dmask = (unw.bands[0] != 0)
-        cmask = (cor.bands[0] > inps['cthresh_qa'])
-        mask = dmask*cmask
-                
-        cmask1 = (cor.bands[0] > inps['chthresh'])
-        commonMask1 *= dmask*cmask1
-
-        frac = np.sum(mask * commonMask) / (csum * size)
-        if (frac < inps['common']):
+    ######Overlap with the common region
+    frac = qa.overlapFraction()
+    for kk in xrange(nIfg):
+        if (frac[kk] < inps['common']):
             usefulPair[kk] = False
 
 
@@ -186,7 +142,9 @@ if __name__ == '__main__':
     else:
         print '%d Interferograms have coverage that satisfies all conditions'%(useful)
 
-    commonMask1.tofile(inps['qamaskName'])
+    os.rename(maskTmp, inps['qamaskName'])
+    qa.writeStats(inps.get('qaStats', 'qa_stats.json'), usefulPair)
+
     ######Print out the valid list
     fid = open(inps['list'], 'w')
     for ind, intdir in enumerate(intList):
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+from __future__ import absolute_import
+from __future__ import division
+import os
+import json
+import hashlib
+import numpy as np
+import lxml.objectify as OB
+from multiprocessing import Pool
+
+#####Rows copied per block when staging rasters
+BLOCK_LINES = 1024
+
+#####Name of the metadata cache written to the GIAnT directory
+CACHE_NAME = '.insarProc_cache.json'
+CACHE_VERSION = 2
+
+
+def copyRaster(src, dst, shape, srcType=np.int16, dstType=np.float32,
+        block=BLOCK_LINES):
+    '''
+    Convert a flat binary raster to another data type in blocks of lines.
+    '''
+    length, width = shape
+    indata = np.memmap(src, dtype=srcType, shape=(length,width), mode='r')
+    with open(dst, 'wb') as fid:
+        for kk in range(0, length, block):
+            indata[kk:kk+block,:].astype(dstType).tofile(fid)
+
+    del indata
+
+
+def writeLatLon(latFile, lonFile, snwe, shape, block=BLOCK_LINES):
+    '''
+    Write the lat / lon grids of a geocoded image in blocks of lines.
+    snwe is (maxLat, minLat, minLon, maxLon), first line is maxLat.
+    '''
+    length, width = shape
+    lat = np.linspace(snwe[0], snwe[1], num=length).astype(np.float32)
+    lon = np.linspace(snwe[2], snwe[3], num=width).astype(np.float32)
+
+    with open(latFile, 'wb') as latfid, open(lonFile, 'wb') as lonfid:
+        lonblock = np.tile(lon, (min(block,length),1))
+        for kk in range(0, length, block):
+            nlines = min(block, length-kk)
+            np.repeat(lat[kk:kk+nlines,None], width, axis=1).tofile(latfid)
+            lonblock[:nlines,:].tofile(lonfid)
+
+
+def fileHash(fname):
+    '''
+    MD5 of the file contents.
+    '''
+    md5 = hashlib.md5()
+    with open(fname, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(1 << 20), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def parseInsarProc(xmlFile):
+    '''
+    Extract the fields needed for GIAnT preparation from an insarProc.xml.
+    Only the baseline is optional; a missing geocoding or radar field raises
+    a ValueError naming the file.
+    '''
+    with open(xmlFile, 'rb') as fid:
+        xObj = OB.fromstring(fid.read())
+
+    meta = {}
+    try:
+        bTop = float(xObj.baseline.perp_baseline_top)
+        bBot = float(xObj.baseline.perp_baseline_bottom)
+        meta['bperp'] = 0.5*(bTop + bBot)
+    except AttributeError:
+        meta['bperp'] = None
+
+    try:
+        meta['width'] = int(xObj.runGeocode.outputs.GEO_WIDTH)
+        meta['length'] = int(xObj.runGeocode.outputs.GEO_LENGTH)
+        meta['range'] = float(xObj.runFormSLC.master.outputs.STARTING_RANGE)
+        meta['height'] = float(xObj.runFormSLC.master.inputs.SPACECRAFT_HEIGHT)
+        meta['radius'] = float(xObj.runFormSLC.master.inputs.PLANET_LOCAL_RADIUS)
+        meta['heading'] = float(xObj.runGeocode.inputs.PEG_HEADING)
+        meta['wvl'] = float(xObj.runGeocode.inputs.RADAR_WAVELENGTH)
+        meta['sensingMid'] = str(xObj.master.frame.SENSING_MID)
+        meta['maxLat'] = float(xObj.runGeocode.outputs.MINIMUM_GEO_LATITUDE) #Bug in ISCE
+        meta['minLat'] = float(xObj.runGeocode.outputs.MAXIMUM_GEO_LATITUDE)
+        meta['minLon'] = float(xObj.runGeocode.outputs.MINIMUM_GEO_LONGITUDE)
+        meta['maxLon'] = float(xObj.runGeocode.outputs.MAXIMUM_GEO_LONGITUDE)
+    except AttributeError as err:
+        raise ValueError('Incomplete insarProc.xml {0}: {1}'.format(xmlFile, err))
+
+    return meta
+
+
+def _parseEntry(args):
+    '''
+    Pool worker: (xmlFile, hash) -> (hash, metadata)
+    '''
+    xmlFile, digest = args
+    return digest, parseInsarProc(xmlFile)
+
+
+def loadCache(cacheFile):
+    '''
+    Load the metadata cache. Returns empty dict if missing or stale.
+    '''
+    try:
+        with open(cacheFile, 'r') as fid:
+            cache = json.load(fid)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+
+    return cache.get('entries', {})
+
+
+def saveCache(cacheFile, entries):
+    '''
+    Write the metadata cache atomically.
+    '''
+    tmpFile = cacheFile + '.tmp'
+    with open(tmpFile, 'w') as fid:
+        json.dump({'version': CACHE_VERSION, 'entries': entries}, fid)
+    os.rename(tmpFile, cacheFile)
+
+
+def getPairMetadata(pairs, cacheDir, nproc=4):
+    '''
+    Return list of insarProc.xml metadata for every pair directory.
+    Files are parsed concurrently and results cached by file hash in cacheDir.
+    The cache is only written once every file parsed successfully.
+    '''
+    cacheFile = os.path.join(cacheDir, CACHE_NAME)
+    entries = loadCache(cacheFile)
+
+    xmlFiles = [os.path.join(pair, 'insarProc.xml') for pair in pairs]
+    digests = [fileHash(xmlFile) for xmlFile in xmlFiles]
+
+    todo = []
+    for xmlFile, digest in zip(xmlFiles, digests):
+        if (digest not in entries) and ((xmlFile, digest) not in todo):
+            todo.append((xmlFile, digest))
+
+    if len(todo) > 0:
+        print('Parsing {0} of {1} insarProc.xml files'.format(len(todo), len(xmlFiles)))
+        if (nproc > 1) and (len(todo) > 1):
+            pool = Pool(processes=min(nproc, len(todo)))
+            try:
+                results = pool.map(_parseEntry, todo)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_parseEntry(x) for x in todo]
+
+        entries.update(dict(results))
+        try:
+            saveCache(cacheFile, entries)
+        except (IOError, OSError) as err:
+            print('Could not write metadata cache {0}: {1}'.format(cacheFile, err))
+
+    return [entries[digest] for digest in digests]
@@ -3,9 +3,9 @@
 import os 
 import sys
 import numpy as np
-import lxml.objectify as OB
 import stackSetup as SS
 import templateSetup as temp
+import giantStaging as GS
 import shutil
 import argparse
 
@@ -65,59 +65,43 @@ if __name__ == '__main__':
 
     #Create ifg.list
     ifglist = os.path.join(inps.prepDir, 'ifg.list')
-    xObj = None
     if (not os.path.exists(ifglist)) or inps.force:
+        metas = GS.getPairMetadata(pairs, inps.prepDir)
         fid = open(ifglist, 'w')
-        for pair in pairs:
+        for pair, meta in zip(pairs, metas):
             dates=os.path.basename(pair).split('_')
-            print pair
-            xmlFile = os.path.join(pair, 'insarProc.xml')
-            xObj = OB.fromstring(open(xmlFile,'r').read())
-            
-            try:
-                bTop = xObj.baseline.perp_baseline_top
-                bBot = xObj.baseline.perp_baseline_bottom
-                bPerp = 0.5*(bTop + bBot)
-            except:
-                print "Pair %s processed with old version of ISCE"
+            bPerp = meta['bperp']
+            if bPerp is None:
+                print "Pair %s processed with old version of ISCE" % pair
                 print "Baseline not available in insarProc.xml"
                 bPerp = 0.0
 
             fid.write('{0}   {1}   {2:5.4f}  CSK\n'.format(dates[0], dates[1], bPerp))
 
-
-
-        fid.close()
-
-    #####Create example.rsc
-    if xObj is None:
-        exampleXML = os.path.join(pairs[0],'insarProc.xml')
-
-        fid = open(exampleXML,'r')
-        xObj = OB.fromstring(fid.read())
         fid.close()
+        meta = metas[-1]
+    else:
+        #####Only the first pair is needed for example.rsc
+        meta = GS.getPairMetadata(pairs[:1], inps.prepDir)[0]
 
-    width = int(xObj.runGeocode.outputs.GEO_WIDTH)
-    length = int(xObj.runGeocode.outputs.GEO_LENGTH)
-    rng = float(xObj.runFormSLC.master.outputs.STARTING_RANGE)
-    ht = float(xObj.runFormSLC.master.inputs.SPACECRAFT_HEIGHT) 
-    re = float(xObj.runFormSLC.master.inputs.PLANET_LOCAL_RADIUS)
-    inc = getIncAngle(rng, ht, re)
+    width = meta['width']
+    length = meta['length']
+    inc = getIncAngle(meta['range'], meta['height'], meta['radius'])
 
     rdict = {}
     rdict['width'] = width
     rdict['length'] = length
-    rdict['heading'] = float(xObj.runGeocode.inputs.PEG_HEADING) * 180.0 / np.pi        
-    rdict['wvl'] = float(xObj.runGeocode.inputs.RADAR_WAVELENGTH)
+    rdict['heading'] = meta['heading'] * 180.0 / np.pi        
+    rdict['wvl'] = meta['wvl']
     rdict['deltarg'] = 30.
     rdict['deltaaz'] = 30.
-    rdict['utc'] = Seconds(str(xObj.master.frame.SENSING_MID).split( ' ')[-1])
+    rdict['utc'] = Seconds(meta['sensingMid'].split( ' ')[-1])
 
     #####Get Lat / Lon information
-    maxLat = float(xObj.runGeocode.outputs.MINIMUM_GEO_LATITUDE) #Bug in ISCE
-    minLat = float(xObj.runGeocode.outputs.MAXIMUM_GEO_LATITUDE)
-    minLon = float(xObj.runGeocode.outputs.MINIMUM_GEO_LONGITUDE)
-    maxLon = float(xObj.runGeocode.outputs.MAXIMUM_GEO_LONGITUDE)
+    maxLat = meta['maxLat']
+    minLat = meta['minLat']
+    minLon = meta['minLon']
+    maxLon = meta['maxLon']
 
     rscfile = os.path.join(inps.prepDir, 'example.rsc')
     if (not os.path.exists(rscfile)) or inps.force:
@@ -131,33 +115,16 @@ if __name__ == '__main__':
     Dfile = os.path.join(inps.prepDir, 'hgt.flt')
 
     if (not os.path.exists(Dfile)) or inps.force:
-        hdata = np.memmap(DEMfile, dtype=np.int16,
-            shape=(length, width), mode='r')
-
-        fdata = np.memmap(Dfile, dtype=np.float32,
-                shape=(length,width), mode='w+')
-
-        for kk in xrange(length):
-            fdata[kk,:] = hdata[kk,:]
-
-        del hdata
-        del fdata
+        GS.copyRaster(DEMfile, Dfile, (length,width),
+            srcType=np.int16, dstType=np.float32)
 
 
 
 #    shutil.copyfile(DEMfile, os.path.join(inps.prepDir, 'hgt.flt'))
 
-    lat = np.linspace(maxLat, minLat, num=rdict['length']).astype(np.float32)
-    lats = np.lib.stride_tricks.as_strided(lat, 
-            shape=(rdict['length'], rdict['width']), strides=(4,0))
-    lats.tofile(os.path.join(inps.prepDir, 'lat.flt'))
-    del lat, lats
-
-    lon = np.linspace(minLon, maxLon, num=rdict['width']).astype(np.float32)
-    lons = np.lib.stride_tricks.as_strided(lon, 
-            shape=(rdict['length'],rdict['width']), strides = (0,4))
-    lons.tofile(os.path.join(inps.prepDir, 'lon.flt'))
-    del lon,lons
+    GS.writeLatLon(os.path.join(inps.prepDir, 'lat.flt'),
+            os.path.join(inps.prepDir, 'lon.flt'),
+            (maxLat, minLat, minLon, maxLon), (length, width))
 
     hgtrsc = os.path.join(inps.prepDir, 'hgt.flt.rsc')
     rdict = {}
@@ -191,8 +158,8 @@ if __name__ == '__main__':
 
     ##########Create prepxml.py
     rdict = {}
-    rdict['width'] = int(xObj.runGeocode.outputs.GEO_WIDTH)
-    rdict['length'] = int(xObj.runGeocode.outputs.GEO_LENGTH)
+    rdict['width'] = width
+    rdict['length'] = length
     rdict['cohth'] = 0.2
     rdict['nvalid'] = int(0.5 * len(pairs))
     latlon = np.loadtxt(inps.ref)
@@ -0,0 +1,82 @@
+import sys
+import json
+import types
+sys.path.append('.')
+sys.path.append('interferogram/sentinel')
+
+import pytest
+
+# the enumerator and hysds_commons are only needed at run time
+sys.modules.setdefault('enumerate_topsapp_cfgs', types.ModuleType('enumerate_topsapp_cfgs'))
+if 'hysds_commons.request_utils' not in sys.modules:
+    request_utils = types.ModuleType('hysds_commons.request_utils')
+    request_utils.post_scrolled_json_responses = None
+    sys.modules['hysds_commons'] = types.ModuleType('hysds_commons')
+    sys.modules['hysds_commons.request_utils'] = request_utils
+
+import audit_interferogram as ai
+
+
+class FakeCatalog(object):
+    def __init__(self, ids, version):
+        self.ids = set(ids)
+        self.version = version
+        self.queries = []
+
+    def __call__(self, start_url, scroll_url, generator, data=None, logger=None):
+        wanted = json.loads(data)['query']['terms']['id.raw']
+        self.queries.append(wanted)
+        return [{'_id': i} for i in wanted if i[:-len(self.version) - 1] in self.ids]
+
+
+def configs_of(ids):
+    return tuple([list(ids)] * 10)
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    def make(ids):
+        fake = FakeCatalog(ids, 'v2.0.0')
+        monkeypatch.setattr(ai, 'post_scrolled_json_responses', fake)
+        return fake
+    return make
+
+
+def test_existence_queries_stay_under_clause_limit(catalog, tmp_path):
+    ids = ['ifg%05d' % i for i in range(2500)]
+    fake = catalog(ids[::2])
+    kept = ai.audit(configs_of(ids), 'http://es', 'grq', 'v2.0.0', str(tmp_path / 'index.txt'))
+    assert kept[3] == ids[1::2]
+    assert max(len(q) for q in fake.queries) <= 1024
+    assert len(fake.queries) == 3
+
+
+def test_known_ids_are_not_queried_again(catalog, tmp_path):
+    index_file = str(tmp_path / 'index.txt')
+    catalog(['a', 'b'])
+    ai.audit(configs_of(['a', 'b', 'c']), 'http://es', 'grq', 'v2.0.0', index_file)
+    fake = catalog(['a', 'b'])
+    kept = ai.audit(configs_of(['a', 'b', 'c']), 'http://es', 'grq', 'v2.0.0', index_file)
+    assert kept[3] == ['c']
+    assert fake.queries == [['c-v2.0.0']]
+
+
+def test_expired_ids_are_verified_again(catalog, tmp_path):
+    index_file = str(tmp_path / 'index.txt')
+    index = ai.ExistingIdIndex(index_file, ttl=3600, now=1000.0)
+    index.update(['a', 'b'])
+    index.save()
+
+    # b was purged for reprocessing after the ttl
+    fake = catalog(['a'])
+    later = ai.ExistingIdIndex(index_file, ttl=3600, now=1000.0 + 7200)
+    assert len(later) == 0
+    kept = ai.audit(configs_of(['a', 'b']), 'http://es', 'grq', 'v2.0.0', index_file, ttl=0)
+    assert kept[3] == ['b']
+    assert sorted(fake.queries[0]) == ['a-v2.0.0', 'b-v2.0.0']
+
+
+def test_index_without_times_is_verified_again(tmp_path):
+    index_file = tmp_path / 'index.txt'
+    index_file.write_text('a\nb\n')
+    assert len(ai.ExistingIdIndex(str(index_file))) == 0
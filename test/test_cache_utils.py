@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+sys.path.append('.')
+
+import pytest
+
+from utils import cache_utils
+
+
+def test_cache_dir_default_relocated_and_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.delenv('ARIA_TEST_CACHE', raising=False)
+    default = cache_utils.cache_dir('test', 'ARIA_TEST_CACHE')
+    assert default == os.path.join(str(tmp_path), '.ariamh_cache', 'test')
+    assert os.path.isdir(default)
+
+    monkeypatch.setenv('ARIA_TEST_CACHE', str(tmp_path / 'elsewhere'))
+    assert cache_utils.cache_dir('test', 'ARIA_TEST_CACHE') == str(tmp_path / 'elsewhere')
+
+    monkeypatch.setenv('ARIA_TEST_CACHE', 'None')
+    assert cache_utils.cache_dir('test', 'ARIA_TEST_CACHE') is None
+
+
+def test_write_json_atomic_replaces_file(tmp_path):
+    fname = str(tmp_path / 'entry.json')
+    cache_utils.write_json_atomic(fname, {'a': 1})
+    cache_utils.write_json_atomic(fname, {'a': 2})
+    with open(fname) as fp:
+        assert json.load(fp) == {'a': 2}
+    assert os.listdir(str(tmp_path)) == ['entry.json']
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    fname = str(tmp_path / 'entry.json')
+    cache_utils.write_json_atomic(fname, {'a': 1})
+    with pytest.raises(TypeError):
+        cache_utils.write_json_atomic(fname, {'a': object()})
+    with open(fname) as fp:
+        assert json.load(fp) == {'a': 1}
+    assert os.listdir(str(tmp_path)) == ['entry.json']
@@ -0,0 +1,69 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import requests
+
+from utils.catalog_client import IdResolver, LocalIndex
+
+
+def resolver_for(ids, chunk=1000):
+    index = LocalIndex(ids)
+    return index, IdResolver('http://localhost:9200', 'grq', search_fn=index.search, chunk=chunk)
+
+
+def test_resolve_in_chunks():
+    index, resolver = resolver_for(['id%d' % i for i in range(0, 25, 2)], chunk=10)
+    found = resolver.resolve(['id%d' % i for i in range(25)])
+    assert found == set('id%d' % i for i in range(0, 25, 2))
+    assert index.requests == 3
+
+
+def test_found_ids_are_memoized():
+    index, resolver = resolver_for(['a', 'b'])
+    assert resolver.resolve(['a', 'b', 'c']) == {'a', 'b'}
+    assert index.requests == 1
+    assert resolver.exists('a')
+    assert resolver.resolve(['b', 'a']) == {'a', 'b'}
+    assert index.requests == 1
+
+
+def test_missing_ids_are_queried_again():
+    index, resolver = resolver_for(['a'])
+    assert not resolver.exists('c')
+    index.ids.add('c')
+    assert resolver.exists('c')
+    assert index.requests == 2
+
+
+def test_forget():
+    index, resolver = resolver_for(['a', 'b'])
+    resolver.resolve(['a', 'b'])
+    index.ids.discard('a')
+    resolver.forget(['a'])
+    assert resolver.resolve(['a', 'b']) == {'b'}
+    assert index.requests == 2
+    resolver.forget()
+    assert resolver.resolve(['b']) == {'b'}
+    assert index.requests == 3
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_missing_index_means_missing_ids():
+    def search(es_url, index, query):
+        raise http_error(404)
+    resolver = IdResolver('http://localhost:9200', 'grq', search_fn=search)
+    assert resolver.resolve(['a', 'b']) == set()
+
+
+def test_other_errors_propagate():
+    def search(es_url, index, query):
+        raise http_error(500)
+    resolver = IdResolver('http://localhost:9200', 'grq', search_fn=search)
+    with pytest.raises(requests.HTTPError):
+        resolver.resolve(['a'])
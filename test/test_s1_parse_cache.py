@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.append('.')
+
+import pytest
+
+from utils import s1_parse_cache
+
+
+AUX_CAL = '''<?xml version="1.0"?>
+<auxiliaryCalibration>
+  <calibrationParamsList>
+    <calibrationParams>
+      <swath>IW1</swath>
+      <polarisation>VV</polarisation>
+      <elevationAntennaPattern>
+        <elevationAngleIncrement>%s</elevationAngleIncrement>
+        <values>%s</values>
+      </elevationAntennaPattern>
+    </calibrationParams>
+  </calibrationParamsList>
+</auxiliaryCalibration>
+'''
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache = tmp_path / 'cache'
+    monkeypatch.setenv('ARIA_S1_PARSE_CACHE', str(cache))
+    monkeypatch.setattr(s1_parse_cache, '_memo', {})
+    monkeypatch.setattr(s1_parse_cache, '_signatures', {})
+    return cache
+
+
+def write_aux(dirname, increment, values):
+    os.makedirs(str(dirname))
+    fname = os.path.join(str(dirname), 's1a-aux-cal.xml')
+    with open(fname, 'w') as fp:
+        fp.write(AUX_CAL % (increment, values))
+    return fname
+
+
+def test_aux_cal_versions_of_same_name_and_size(cache_dir, tmp_path):
+    old = write_aux(tmp_path / 'S1A_AUX_CAL_V20140908T000000', '0.05', '1.0 2.0')
+    new = write_aux(tmp_path / 'S1A_AUX_CAL_V20190228T092500', '0.06', '3.0 4.0')
+    assert os.path.getsize(old) == os.path.getsize(new)
+
+    assert s1_parse_cache.readElevationAntennaPattern(old, 'IW1', 'VV') == (0.05, [1.0, 2.0])
+    assert s1_parse_cache.readElevationAntennaPattern(new, 'IW1', 'VV') == (0.06, [3.0, 4.0])
+
+
+def test_same_content_shares_entry(cache_dir, tmp_path):
+    first = write_aux(tmp_path / 'work1', '0.05', '1.0 2.0')
+    second = write_aux(tmp_path / 'work2', '0.05', '1.0 2.0')
+    assert s1_parse_cache.fileSignature(first) == s1_parse_cache.fileSignature(second)
+
+
+def test_annotation_parsers_do_not_share_entries(cache_dir, tmp_path):
+    xml = tmp_path / 's1a-iw1-slc-vv.xml'
+    xml.write_text('<product/>')
+    sig = s1_parse_cache.fileSignature(str(xml))
+    ifg_key = s1_parse_cache.makeKey('annotation', sig, namespace='interferogram.sentinel.Sentinel1_TOPS:1')
+    frame_key = s1_parse_cache.makeKey('annotation', sig, namespace='frameMetadata.sentinel.Sentinel1_TOPS:1')
+    assert ifg_key != frame_key
+
+    s1_parse_cache.dump(frame_key, {'trackNumber': 1})
+    s1_parse_cache._memo.clear()
+    assert s1_parse_cache.load(ifg_key) is None
+    assert s1_parse_cache.load(frame_key) == {'trackNumber': 1}
+    # a new parser version does not reuse the entries of the previous one
+    assert s1_parse_cache.load(s1_parse_cache.makeKey(
+        'annotation', sig, namespace='frameMetadata.sentinel.Sentinel1_TOPS:2')) is None
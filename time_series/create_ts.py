@@ -23,6 +23,7 @@ import isce
 from iscesys.Component.ProductManager import ProductManager as PM
 
 from utils.UrlUtils import UrlUtils
+from utils.catalog_client import search
 
 import ts_common
 
@@ -74,17 +75,7 @@ def check_ts(es_url, es_index, id):
         "fields": [],
     }
 
-    if es_url.endswith('/'):
-        search_url = '%s%s/_search' % (es_url, es_index)
-    else:
-        search_url = '%s/%s/_search' % (es_url, es_index)
-    r = requests.post(search_url, data=json.dumps(query))
-    if r.status_code != 200:
-        logger.info("Failed to query {}:\n{}".format(es_url, r.text))
-        logger.info("query: {}".format(json.dumps(query, indent=2)))
-        logger.info("returned: {}".format(r.text))
-    r.raise_for_status()
-    result = r.json()
+    result = search(es_url, es_index, query)
     logger.info('dedup check: {}'.format(json.dumps(result, indent=2)))
     total = result['hits']['total']
     if total == 0: id = 'NONE'
@@ -26,6 +26,7 @@ inputs in json file
 "dataset_id":pname #name to be used to create the product dir
                and the json.met
 "ts_type":ts_type # if it's generated from LS or NSBAS or other
+"compression":None|"gzip"|"lzf" #optional lossless compression of the output. optional
 "track_number":track_number# to display the metadata
 }
 The code expects the files to be already localized 
@@ -35,7 +36,7 @@ def main(fname):
     process = 'driver_swath_stitcher'
     try:
         inps = json.load(open(fname))
-        ss = SS()
+        ss = SS(compression=inps.get('compression'))
         if(len(inps['files']) < 2):
             print('Expecting at least two input files')
             raise Exception
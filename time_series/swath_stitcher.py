@@ -7,9 +7,10 @@ import h5py
 import numpy as np
 from scipy.ndimage.morphology import binary_dilation
 from scipy.ndimage import generate_binary_structure
+from utils.h5_layout import create_stack, create_image, SlabWriter
 
 class SwathStitcher(object):
-    def __init__(self):
+    def __init__(self, compression=None):
         #list of file pointers to h5. when loading in load_ts the names need to be in order 
         #west to east
         self._fps = []
@@ -25,6 +26,8 @@ class SwathStitcher(object):
         #the subswath 1,2,3 might go right to left or letf to right depending
         #on the orbit direction, ascending or discending
         self._order = ''#'inc' or 'dec'. automatically computed
+        #optional lossless compression of the output stacks, None, 'gzip' or 'lzf'
+        self._compression = compression
     
     def set_order(self):
         valid0 = np.nonzero(self.get_mask(self._fps[0]['recons'][0,:,:],np.nan))[1] 
@@ -120,7 +123,7 @@ class SwathStitcher(object):
             sel = (sel[0] + offsets[i][0], sel[1] + offsets[i][1])
             #we are doing or so it's ok if some get overwritten
             cmask[sel] = 1
-        self._fpo.create_dataset('cmask',data = cmask)    
+        create_image(self._fpo,'cmask',data = cmask,compression = self._compression)    
     
     def set_ifgcnt(self):
         ifgcnt = np.zeros(self.size,np.int32)
@@ -147,7 +150,7 @@ class SwathStitcher(object):
             #note that when indexing with overlap it becomes 2-d instead of 3-d
             ifgcnt[overlap] = np.min(both[overlap,:],1)
             
-        self._fpo.create_dataset('ifgcnt',data = ifgcnt)
+        create_image(self._fpo,'ifgcnt',data = ifgcnt,compression = self._compression)
     
     def set_recons(self):
         self.adjust_stack('recons')
@@ -164,7 +167,9 @@ class SwathStitcher(object):
         shape.insert(0,nifgs)
         #create data on disk since it's too big to be kept in memory
         dtype = self._fps[0][dname].dtype
-        dsetout = self._fpo.create_dataset(dname,shape,dtype=dtype)
+        #chunked so that both single epochs and pixel time series are cheap to read
+        dsetout = create_stack(self._fpo,dname,shape,dtype,compression=self._compression)
+        writer = SlabWriter(dsetout)
         for j in range(nifgs):
             offsets = self.offsets
             ifgs = np.nan*np.ones(self.size,dtype)
@@ -202,7 +207,8 @@ class SwathStitcher(object):
                 #next round the second ifg is used as reference
                 ifg1 = ifg2
                 msk1 = msk2  
-            dsetout[j,:,:] = ifgs
+            writer.write(j,ifgs)
+        writer.flush()
         return
     
     def adjust_stack(self,dname):
@@ -214,7 +220,9 @@ class SwathStitcher(object):
         shape.insert(0,nifgs)
         #create data on disk since it's too big to be kept in memory
         dtype = self._fps[0][dname].dtype
-        dsetout = self._fpo.create_dataset(dname,shape,dtype=dtype)
+        #chunked so that both single epochs and pixel time series are cheap to read
+        dsetout = create_stack(self._fpo,dname,shape,dtype,compression=self._compression)
+        writer = SlabWriter(dsetout)
         for j in range(nifgs):
             offsets = self.offsets
             ifgs = np.nan*np.ones(self.size,dtype)
@@ -238,7 +246,8 @@ class SwathStitcher(object):
                 ifgs[overlap] = (ifg1[overlap] + ifg2[overlap])/2.  
                 #next round the second ifg is used as reference
                 ifg1 = ifg2  
-            dsetout[j,:,:] = ifgs
+            writer.write(j,ifgs)
+        writer.flush()
         return
     
     def set_parms(self):
@@ -248,7 +257,8 @@ class SwathStitcher(object):
         shape.append(ndim)
         #create data on disk since it's too big to be kept in memory
         dtype = self._fps[0]['parms'].dtype
-        dsetout = self._fpo.create_dataset('parms',shape,dtype=dtype)
+        #one parameter per chunk so that a single parameter can be read on its own
+        dsetout = create_stack(self._fpo,'parms',shape,dtype,axis=2,depth=1,compression=self._compression)
         for j in range(ndim):
             offsets = self.offsets
             ifgs = np.nan*np.ones(self.size,dtype)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+'''
+Memoized reference lookup and baseline computation for frame metadata extraction.
+
+Every ingested frame looks up the reference frame of its track and latitude
+band and computes its baseline with respect to it. The same orbit and
+reference combinations recur across extractions, so this module keeps
+
+- the reference frame query results, keyed by the query parameters. Only
+  non empty results are kept and only for ARIA_REFERENCE_QUERY_TTL seconds,
+  so a newly elected reference is picked up by later extractions,
+- the computed baselines, keyed by (orbit id, reference frame id),
+- the OrbitInfo objects (interpolated orbit and peg) of the process.
+
+Entries are small json files in a directory shared by all the processes of a
+node. Set ARIA_BASELINE_CACHE to relocate it or to "none" to disable the disk
+store.
+'''
+import os
+import json
+import time
+import hashlib
+from frameMetadata.OrbitInfo import OrbitInfo
+from utils.cache_utils import cache_dir, write_json_atomic
+from utils.queryBuilder import postQuery
+
+CACHE_VERSION = 1
+
+#seconds a cached reference query stays valid
+QUERY_TTL = float(os.environ.get('ARIA_REFERENCE_QUERY_TTL', 3600))
+
+#in-process memos
+_orbits = {}
+_memo = {}
+
+def getCacheDir():
+    '''
+    Return the cache directory, creating it if needed. None if disabled.
+    '''
+    return cache_dir('baselines', 'ARIA_BASELINE_CACHE')
+
+def makeKey(kind, obj):
+    '''
+    Cache key of a json serializable object.
+    '''
+    data = json.dumps([kind, CACHE_VERSION, obj], sort_keys=True, default=str)
+    return kind + '_' + hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def load(key, ttl=None):
+    '''
+    Return the cached value for key or None if missing or older than ttl seconds.
+    '''
+    entry = _memo.get(key)
+    if entry is None:
+        cacheDir = getCacheDir()
+        if cacheDir is None:
+            return None
+        try:
+            with open(os.path.join(cacheDir, key + '.json')) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION:
+            return None
+        _memo[key] = entry
+    if ttl is not None and time.time() - entry['time'] > ttl:
+        return None
+    return entry['data']
+
+def dump(key, data):
+    '''
+    Store data under key. Failures are reported but never fatal.
+    '''
+    entry = {'version': CACHE_VERSION, 'time': time.time(), 'data': data}
+    _memo[key] = entry
+    cacheDir = getCacheDir()
+    if cacheDir is None:
+        return
+    try:
+        write_json_atomic(os.path.join(cacheDir, key + '.json'), entry, default=str)
+    except (OSError, TypeError, ValueError) as err:
+        print('Cannot write baseline cache entry %s: %s' % (key, err))
+
+def orbitId(fm):
+    '''
+    Identity of the orbit segment of a frame: everything OrbitInfo uses.
+    '''
+    return makeKey('orbit', [fm.orbit, fm.sensingStart, fm.sensingStop, fm.prf,
+                             fm.startingRange, fm.lookDirection, fm.doppler])
+
+def getOrbitInfo(fm):
+    '''
+    OrbitInfo of the frame, built once per orbit segment and process.
+    '''
+    key = orbitId(fm)
+    if key not in _orbits:
+        _orbits[key] = OrbitInfo(fm)
+    return _orbits[key]
+
+def queryReferences(params, query):
+    '''
+    Return (metList, status) of the reference frame query, reusing a recent
+    non empty result for the same parameters.
+    '''
+    key = makeKey('reference', params)
+    metList = load(key, ttl=QUERY_TTL)
+    if metList is not None:
+        return metList, True
+    metList, status = postQuery(query)
+    if status and metList:
+        dump(key, metList)
+    return metList, status
+
+def getBaseline(fm, fmRef, refId):
+    '''
+    Return [horizontal, vertical, total] baseline of fm w.r.t. the reference frame.
+    '''
+    key = makeKey('baseline', [orbitId(fm), refId])
+    baseline = load(key)
+    if baseline is not None:
+        return baseline
+    oi = getOrbitInfo(fm)
+    oi.computeBaseline(getOrbitInfo(fmRef))
+    bl = oi.getBaseline()
+    baseline = [float(bl['horz']), float(bl['vert']), float(bl['total'])]
+    dump(key, baseline)
+    return baseline
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+'''
+Helpers shared by the on-disk caches.
+
+Each cache is a directory under ~/.ariamh_cache shared by the processes of a
+node, relocated or disabled (value "none") through its own environment
+variable. Entries are replaced atomically so that concurrent readers never
+see a partial file.
+'''
+import os
+import json
+import tempfile
+
+def cache_dir(name, env_var):
+    '''
+    Return the cache directory, creating it if needed. None if disabled.
+    @param name: directory name under ~/.ariamh_cache
+    @param env_var: environment variable relocating the directory, or
+                    disabling the cache when set to "none"
+    '''
+    path = os.environ.get(env_var, os.path.join(os.environ.get('HOME', '.'), '.ariamh_cache', name))
+    if path.lower() == 'none':
+        return None
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError as err:
+            #another process may have created it in the meantime
+            if not os.path.isdir(path):
+                print('Cannot create cache directory %s: %s' % (path, err))
+                return None
+    return path
+
+def atomic_write(filename, write, mode='w'):
+    '''
+    Write filename by calling write(fp) on a temporary file of the same
+    directory that is then renamed over filename. The temporary file is
+    removed and the error re-raised on failure.
+    '''
+    dirname, basename = os.path.split(filename)
+    fd, tmpname = tempfile.mkstemp(dir=dirname or '.', prefix='.' + basename)
+    try:
+        with os.fdopen(fd, mode) as fp:
+            write(fp)
+        os.rename(tmpname, filename)
+    except Exception:
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+        raise
+
+def write_json_atomic(filename, obj, **kwargs):
+    '''
+    Atomically write obj as json to filename. kwargs go to json.dump.
+    '''
+    atomic_write(filename, lambda fp: json.dump(obj, fp, **kwargs))
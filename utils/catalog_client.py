@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+'''
+Shared client for the GRQ elastic search catalog.
+
+Keeps one keep-alive requests session per process so that the scan request
+and every scroll page reuse pooled connections, streams hits page by page
+instead of materializing the full result set and always releases the
+server-side scroll context when the caller is done. IdResolver answers
+existence checks of many ids with a few terms queries and remembers the ids
+found.
+'''
+import json
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('catalog_client')
+
+_session = None
+
+def get_session(pool_size=10):
+    '''
+    Return the process wide keep-alive session.
+    '''
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+def normalize_url(es_url):
+    '''
+    Strip the trailing slash of an elastic search url.
+    '''
+    return es_url[:-1] if es_url.endswith('/') else es_url
+
+def clear_scroll(es_url, scroll_id):
+    '''
+    Release a scroll context. Failures are only logged since the context
+    expires on its own.
+    '''
+    try:
+        get_session().delete('%s/_search/scroll' % normalize_url(es_url), data=scroll_id)
+    except requests.RequestException as e:
+        logger.warning("Failed to clear scroll: {}".format(e))
+
+def scroll_hits(es_url, index, query, source_fields=None, size=100, scroll='10m'):
+    '''
+    Generator over all hits of a scan/scroll query.
+    @param es_url: elastic search url
+    @param index: index (or pattern) to search
+    @param query: query dict, left unmodified
+    @param source_fields: if given, only these _source fields are transferred
+    @param size: hits per shard per page
+    @param scroll: scroll context keep alive
+    '''
+    es_url = normalize_url(es_url)
+    if source_fields is not None:
+        query = dict(query)
+        query['_source'] = list(source_fields)
+    session = get_session()
+    r = session.post('%s/%s/_search?search_type=scan&scroll=%s&size=%d' % (es_url, index, scroll, size),
+                     data=json.dumps(query))
+    r.raise_for_status()
+    scroll_id = r.json().get('_scroll_id')
+    if scroll_id is None:
+        return
+    try:
+        while True:
+            r = session.post('%s/_search/scroll?scroll=%s' % (es_url, scroll), data=scroll_id)
+            r.raise_for_status()
+            res = r.json()
+            scroll_id = res.get('_scroll_id', scroll_id)
+            hits = res['hits']['hits']
+            if len(hits) == 0: break
+            for hit in hits:
+                yield hit
+    finally:
+        clear_scroll(es_url, scroll_id)
+
+def search(es_url, index, query):
+    '''
+    Run a single (non scrolled) search and return the decoded response.
+    '''
+    r = get_session().post('%s/%s/_search' % (normalize_url(es_url), index), data=json.dumps(query))
+    if r.status_code != 200:
+        logger.info("Failed to query {}:\n{}".format(es_url, r.text))
+        logger.info("query: {}".format(json.dumps(query, indent=2)))
+    r.raise_for_status()
+    return r.json()
+
+def unique(items, key):
+    '''
+    Yield items whose key was not seen before. Only the keys are retained,
+    so memory is bounded by the number of distinct keys, not documents.
+    '''
+    seen = set()
+    for item in items:
+        k = key(item)
+        if k in seen: continue
+        seen.add(k)
+        yield item
+
+class IdResolver(object):
+    '''
+    Batch existence checks of document ids in an index. Ids not known to
+    exist are resolved with terms queries on _id, chunk ids at a time. Ids
+    found are memoized for the life of the resolver; missing ids are queried
+    again on every call, since they may be published at any time.
+    '''
+    def __init__(self, es_url, index, search_fn=None, chunk=1000):
+        '''
+        @param es_url: elastic search url
+        @param index: index (or pattern) to search
+        @param search_fn: search(es_url, index, query) callable, search() by default
+        @param chunk: ids per request
+        '''
+        self.es_url = es_url
+        self.index = index
+        self.search_fn = search if search_fn is None else search_fn
+        self.chunk = chunk
+        self.known = set()
+
+    def resolve(self, ids):
+        '''
+        Return the set of the given ids that exist in the index.
+        '''
+        ids = list(ids)
+        todo = sorted(set(ids) - self.known)
+        for k in range(0, len(todo), self.chunk):
+            part = todo[k:k + self.chunk]
+            query = {
+                "query": { "terms": { "_id": part } },
+                "fields": [],
+                "size": len(part),
+            }
+            try:
+                hits = self.search_fn(self.es_url, self.index, query)['hits']['hits']
+            except requests.HTTPError as e:
+                # the index does not exist before its first product
+                if e.response is None or e.response.status_code != 404: raise
+                hits = []
+            self.known.update(h['_id'] for h in hits)
+        return self.known.intersection(ids)
+
+    def exists(self, id):
+        '''
+        Return True if id exists in the index.
+        '''
+        return id in self.resolve([id])
+
+    def forget(self, ids=None):
+        '''
+        Drop the memoized ids (all of them by default), e.g. after purging
+        them.
+        '''
+        if ids is None: self.known.clear()
+        else: self.known.difference_update(ids)
+
+_resolvers = {}
+
+def get_resolver(es_url, index):
+    '''
+    Return the process wide IdResolver of an index.
+    '''
+    key = (normalize_url(es_url), index)
+    if key not in _resolvers:
+        _resolvers[key] = IdResolver(key[0], index)
+    return _resolvers[key]
+
+class LocalIndex(object):
+    '''
+    In-memory stand-in of an index for IdResolver: answers terms queries on
+    _id from a set of ids and counts the requests it receives.
+
+        index = LocalIndex(['id1', 'id2'])
+        resolver = IdResolver('http://localhost:9200', 'grq', search_fn=index.search)
+    '''
+    def __init__(self, ids=()):
+        self.ids = set(ids)
+        self.requests = 0
+
+    def search(self, es_url, index, query):
+        self.requests += 1
+        wanted = query['query']['terms']['_id']
+        hits = [{'_index': index, '_id': i} for i in wanted if i in self.ids]
+        return {'hits': {'total': len(hits), 'hits': hits}}
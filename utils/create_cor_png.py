@@ -1,24 +1,133 @@
 from __future__ import absolute_import
-from utils import queryBuilder as qb 
+from utils import queryBuilder as qb
 from .UrlUtils import UrlUtils as UU
 import sys
 import os
 import json
-from lxml.etree import parse
-from utils.createImage import createImage
+import time
+import requests
+import numpy as np
+import matplotlib.image as mpimg
+from multiprocessing import Pool
+from lxml.etree import fromstring
 
 uu = UU()
 
+#same sizes as createImage
+MAX_WIDTH = 800
+MAX_WIDTH_SMALL = 300
+#color cycle length of the coherence browse (mdx -wrap)
+WRAP = 1.2
+MANIFEST = 'cor_browse_manifest.json'
+#rendered products between manifest updates
+SAVE_EVERY = 50
+BROWSE_NAME = 'topophase_ph_only.cor.geo'
+
 def get_list(version,sensor):
     meta = {'system_version':version,'dataset':'interferogram','sensor':sensor}
     query = qb.buildQuery(meta,[])
     return qb.postQuery(query,version)
 
-def localize_data(url,files):
-    for f in files:
-        if uu.download(url,f):
-            print("Error in downloading",f)
-            raise Exception
+def get_session():
+    session = requests.Session()
+    session.auth = (uu.dav_u, uu.dav_p)
+    session.verify = False
+    return session
+
+def get_shape(session, xml_url):
+    '''
+    Width and length of the geocoded coherence from its xml.
+    '''
+    r = session.get(xml_url)
+    r.raise_for_status()
+    rt = fromstring(r.content)
+    size = lambda coord: int(float(rt.xpath('.//component[@name="{}"]/property[@name="size"]/value/text()'.format(coord))[0]))
+    return size('coordinate1'), size('coordinate2')
+
+def decimation(width, max_width):
+    '''
+    Subsampling step used by createImage for a given maximum width.
+    '''
+    return 1 if width < max_width else width // max_width
+
+def read_decimated(session, url, width, length, steps):
+    '''
+    Stream the 2 band (amplitude, coherence) line interleaved float32 file and
+    keep only the coherence of every step-th line and column, for each step.
+    Nothing but the decimated arrays is held in memory or written to disk.
+    '''
+    line_bytes = 2 * width * 4
+    out = dict((s, np.zeros(((length + s - 1)//s, (width + s - 1)//s), dtype=np.float32)) for s in steps)
+    r = session.get(url, stream=True)
+    r.raise_for_status()
+    buf = b''
+    row = 0
+    for chunk in r.iter_content(1 << 20):
+        buf += chunk
+        nlines = len(buf) // line_bytes
+        for kk in range(nlines):
+            keep = [s for s in steps if (row + kk) % s == 0]
+            if keep:
+                line = np.frombuffer(buf, dtype=np.float32, count=width, offset=kk*line_bytes + width*4)
+                for s in keep:
+                    out[s][(row + kk)//s, :] = line[::s]
+        buf = buf[nlines*line_bytes:]
+        row += nlines
+        if row >= length:
+            break
+    r.close()
+    if row < length:
+        raise IOError('Truncated coherence file {}: {} of {} lines'.format(url, row, length))
+    return out
+
+def cmy(data, wrap=WRAP):
+    '''
+    RGBA image of data with the cyclic cyan-magenta-yellow colormap of mdx,
+    one cycle every wrap. Zero (no data) pixels are black.
+    '''
+    phase = np.mod(data, wrap) / wrap * 3.0
+    seg = np.floor(phase).astype(int) % 3
+    frac = phase - np.floor(phase)
+    #cyan -> magenta -> yellow -> cyan
+    nodes = np.array([[0., 1., 1.], [1., 0., 1.], [1., 1., 0.]])
+    rgb = (nodes[seg] * (1.0 - frac)[...,None] + nodes[(seg + 1) % 3] * frac[...,None])
+    img = np.ones(data.shape + (4,), dtype=np.float32)
+    img[...,:3] = rgb
+    img[data == 0, :3] = 0.
+    return img
+
+def render(job):
+    '''
+    Render the browse images of one interferogram. Returns (ndir, error).
+    '''
+    url, ndir, to_app = job
+    try:
+        session = get_session()
+        cor_url = os.path.join(url, to_app, 'topophase.cor.geo')
+        width, length = get_shape(session, cor_url + '.xml')
+        big = decimation(width, MAX_WIDTH)
+        small = decimation(width, MAX_WIDTH_SMALL)
+        data = read_decimated(session, cor_url, width, length, sorted(set([big, small])))
+        if not os.path.exists(ndir):
+            os.mkdir(ndir)
+        for step, suffix in ((big, '.browse.png'), (small, '.browse_small.png')):
+            mpimg.imsave(os.path.join(ndir, BROWSE_NAME + suffix), cmy(data[step]))
+        return ndir, None
+    except Exception as e:
+        return ndir, str(e)
+
+def load_manifest(fname):
+    try:
+        with open(fname) as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def save_manifest(fname, manifest):
+    tmp = fname + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.rename(tmp, fname)
 
 def main():
     #ret = json.load(open('sent_list.json'))
@@ -28,42 +137,40 @@ def main():
     elif sys.argv[2].lower() == 'csk':
         sensor = sys.argv[2]
         to_app = ''
-    
-    ret,status = get_list(sys.argv[1],sensor)
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
 
-    cor_file = "topophase.cor.geo"
-    cor_xml = "topophase.cor.geo.xml"
-    flist = [cor_file,cor_xml]
-    for i,f in enumerate(flist):
-        flist[i] = os.path.join(to_app,f)
-    
-    mdx_path = "{}/bin/mdx".format(os.environ['ISCE_HOME'])
+    ret,status = get_list(sys.argv[1],sensor)
 
+    #resume from the products rendered by previous runs
+    manifest = load_manifest(MANIFEST)
+    jobs = []
     for l in ret:
-        cwd = os.getcwd()
         ls = l['url'].split('/')
         ndir = ls[-2] + '_' + ls[-1]
-        if not os.path.exists(ndir):
-            os.mkdir(ndir)
-        try: 
-            os.chdir(ndir)
-            #some failed to download
-            if not os.path.exists('topophase_ph_only.cor.geo.browse.png'):
-                localize_data(l['url'],flist)
-                rt = parse(cor_xml)
-                size = eval(rt.xpath('.//component[@name="coordinate1"]/property[@name="size"]/value/text()')[0])
-                rhdr = size * 4
-                createImage("{} -P {} -s {} -r4 -rhdr {} -cmap cmy -wrap 1.2".format(mdx_path, cor_file,size,rhdr),"topophase_ph_only.cor.geo")  
-                os.remove(cor_file)
-                os.remove(cor_xml)
-        except Exception:
-            print(l['url'],'failed')
-            pass
-        os.chdir(cwd)
-          
-        '''
-        ADD CODE TO PUSH BACK THE PRODUCT
-        '''
+        if manifest.get(ndir, {}).get('done') or os.path.exists(os.path.join(ndir, BROWSE_NAME + '.browse.png')):
+            continue
+        jobs.append((l['url'], ndir, to_app))
+    print('{} of {} interferograms to render'.format(len(jobs), len(ret)))
+
+    urls = dict((j[1], j[0]) for j in jobs)
+    pool = Pool(workers)
+    try:
+        for count, (ndir, error) in enumerate(pool.imap_unordered(render, jobs)):
+            manifest[ndir] = {'url': urls[ndir], 'done': error is None, 'time': time.time()}
+            if error is not None:
+                manifest[ndir]['error'] = error
+                print(urls[ndir], 'failed', error)
+            if count % SAVE_EVERY == 0:
+                save_manifest(MANIFEST, manifest)
+    finally:
+        pool.close()
+        pool.join()
+        save_manifest(MANIFEST, manifest)
+
+    '''
+    ADD CODE TO PUSH BACK THE PRODUCT
+    '''
+
 if __name__ == '__main__':
-    #usage python3 create_cor_png.py v1.0 sentinel or python3 create_cor_png.py v0.6 csk
+    #usage python3 create_cor_png.py v1.0 sentinel [workers] or python3 create_cor_png.py v0.6 csk [workers]
     sys.exit(main())
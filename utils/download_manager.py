@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+'''
+Parallel, resumable downloads of product files.
+
+Files are fetched by a bounded pool of threads, each with its own keep-alive
+session. Data goes to <dest>.part and is resumed with an HTTP range request
+after a failure, so a retry or a restarted job only transfers the missing
+bytes. A file is renamed into place only once its size matches the one
+announced by the server (and its md5 if one is given). Progress is persisted
+in a json manifest next to the downloads together with per file throughput,
+and files already completed by an earlier run are skipped. summary() reports
+the files and bytes fetched by the last fetch_all() over its wall-clock time.
+'''
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('download_manager')
+
+MANIFEST_NAME = '.download_manifest.json'
+CHUNK_SIZE = 1 << 20
+
+
+class DownloadManager(object):
+    '''
+    Download (url, dest) pairs with bounded concurrency, retries and resume.
+    '''
+    def __init__(self, manifest, auth=None, verify=False, workers=4, retries=4, timeout=60):
+        '''
+        @param manifest: path of the json progress manifest
+        @param auth: (user, password) for basic auth
+        @param verify: verify server certificates
+        @param workers: maximum number of concurrent downloads
+        @param retries: attempts per file
+        @param timeout: connect/read timeout in seconds
+        '''
+        self.manifest = manifest
+        self.auth = auth
+        self.verify = verify
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.entries = self.load()
+        #files, bytes and wall-clock seconds of the last fetch_all
+        self.run = {'files': 0, 'bytes': 0, 'seconds': 0.}
+
+    def session(self):
+        '''
+        Keep-alive session of the calling thread.
+        '''
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.session.auth = self.auth
+            self._local.session.verify = self.verify
+        return self._local.session
+
+    def load(self):
+        try:
+            with open(self.manifest) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            tmp = self.manifest + '.tmp'
+            with open(tmp, 'w') as fp:
+                json.dump(self.entries, fp, indent=2, sort_keys=True)
+            os.rename(tmp, self.manifest)
+
+    def update(self, dest, **kwargs):
+        '''
+        Update the manifest entry of dest. Keys set to None are removed.
+        '''
+        with self._lock:
+            entry = self.entries.setdefault(dest, {})
+            entry.update(kwargs)
+            for k in [k for k,v in entry.items() if v is None]:
+                del entry[k]
+        self.save()
+
+    def is_done(self, url, dest):
+        entry = self.entries.get(dest, {})
+        return (entry.get('done') and entry.get('url') == url and os.path.exists(dest)
+                and os.path.getsize(dest) == entry.get('size'))
+
+    def fetch(self, url, dest, md5=None):
+        '''
+        Download url to dest. Returns True on success.
+        '''
+        if self.is_done(url, dest):
+            logger.info('Already downloaded {}'.format(dest))
+            return True
+
+        part = dest + '.part'
+        self.update(dest, url=url, done=False)
+        for attempt in range(self.retries):
+            start = time.time()
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+            try:
+                r = self.session().get(url, headers=headers, stream=True, timeout=self.timeout)
+                if r.status_code == 416:
+                    #nothing left to fetch, the part file is complete or invalid
+                    r.close()
+                    size = self.remote_size(url)
+                    if size == offset:
+                        return self.finish(url, dest, part, size, md5, 0, time.time() - start)
+                    os.remove(part)
+                    continue
+                r.raise_for_status()
+                if r.status_code == 206:
+                    total = int(r.headers['Content-Range'].split('/')[-1])
+                    mode = 'ab'
+                else:
+                    #server ignored the range, start over
+                    offset = 0
+                    total = int(r.headers['Content-Length']) if 'Content-Length' in r.headers else None
+                    mode = 'wb'
+                received = 0
+                with open(part, mode) as fp:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        fp.write(chunk)
+                        received += len(chunk)
+                if total is not None and os.path.getsize(part) != total:
+                    raise IOError('Size mismatch for {}: {} of {} bytes'.format(url, os.path.getsize(part), total))
+                return self.finish(url, dest, part, total, md5, received, time.time() - start)
+            except (requests.RequestException, IOError, ValueError, KeyError) as e:
+                logger.warning('Attempt {} for {} failed: {}'.format(attempt + 1, url, e))
+                time.sleep(min(30, 2 ** attempt))
+        self.update(dest, done=False, error='failed after {} attempts'.format(self.retries))
+        return False
+
+    def finish(self, url, dest, part, total, md5, received, elapsed):
+        '''
+        Verify the part file and move it into place.
+        '''
+        size = os.path.getsize(part)
+        if md5 is not None and file_md5(part) != md5:
+            os.remove(part)
+            raise IOError('Checksum mismatch for {}'.format(url))
+        os.rename(part, dest)
+        rate = received / elapsed if elapsed > 0 else 0.
+        logger.info('Downloaded {} ({} bytes, {:.1f} MB/s)'.format(dest, size, rate / 2.**20))
+        self.update(dest, url=url, done=True, size=size, seconds=elapsed,
+                    bytes_transferred=received, throughput=rate, error=None)
+        with self._lock:
+            self.run['files'] += 1
+            self.run['bytes'] += received
+        return True
+
+    def remote_size(self, url):
+        r = self.session().head(url, timeout=self.timeout, allow_redirects=True)
+        r.raise_for_status()
+        return int(r.headers['Content-Length'])
+
+    def fetch_all(self, jobs):
+        '''
+        Download a list of (url, dest) or (url, dest, md5) tuples concurrently.
+        Returns the list of urls that failed.
+        '''
+        def run(job):
+            try:
+                return self.fetch(*job)
+            except Exception as e:
+                logger.error('Failed to download {}: {}'.format(job[0], e))
+                return False
+
+        self.run = {'files': 0, 'bytes': 0, 'seconds': 0.}
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(run, jobs))
+        self.run['seconds'] = time.time() - start
+        return [job[0] for job, ok in zip(jobs, results) if not ok]
+
+    def summary(self):
+        '''
+        Files downloaded, bytes transferred, wall-clock seconds and aggregate
+        throughput of the last fetch_all. Files skipped because an earlier run
+        completed them are not counted.
+        '''
+        seconds = self.run['seconds']
+        return {'files': self.run['files'], 'bytes': self.run['bytes'], 'seconds': seconds,
+                'throughput': self.run['bytes'] / seconds if seconds > 0 else 0.}
+
+
+def file_md5(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
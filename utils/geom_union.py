@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+'''
+Union of the footprints of stitched products.
+
+The footprints (one per frame, swath or burst) are built directly as OGR
+polygons from their corner coordinates, without a GeoJSON round trip, and
+merged with a cascaded union. Growing a single union polygon pair by pair
+costs a full union with an ever larger polygon for every footprint; the
+cascaded union merges them as a balanced tree instead. The envelope, area and
+ring orientation of the union are computed in the same call:
+
+    fu = FootprintUnion([[[lon, lat], ...], ...])
+    fu.geometry, fu.envelope, fu.area, fu.orientation
+'''
+from osgeo import ogr
+
+CLOCKWISE = 'clockwise'
+COUNTERCLOCKWISE = 'counterclockwise'
+
+
+def make_polygon(coords):
+    '''
+    OGR polygon of a ring of (x, y) coordinates. The ring is closed if needed.
+    '''
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for x, y in coords:
+        ring.AddPoint_2D(float(x), float(y))
+    if list(coords[0]) != list(coords[-1]):
+        ring.AddPoint_2D(float(coords[0][0]), float(coords[0][1]))
+    poly = ogr.Geometry(ogr.wkbPolygon)
+    poly.AddGeometry(ring)
+    return poly
+
+
+def signed_area(coords):
+    '''
+    Shoelace area of a ring of (x, y) coordinates, positive if counterclockwise.
+    '''
+    n = len(coords)
+    area = 0.0
+    for i in range(n):
+        j = (i + 1) % n
+        area += coords[i][0] * coords[j][1] - coords[j][0] * coords[i][1]
+    return area / 2.0
+
+
+def tree_union(geoms):
+    '''
+    Union of geometries merged pairwise as a balanced tree.
+    '''
+    geoms = list(geoms)
+    while len(geoms) > 1:
+        geoms = [geoms[i].Union(geoms[i + 1]) if i + 1 < len(geoms) else geoms[i]
+                 for i in range(0, len(geoms), 2)]
+    return geoms[0]
+
+
+def cascaded_union(geoms):
+    '''
+    Union of polygons or multipolygons, cascaded by GEOS when available.
+    '''
+    multi = ogr.Geometry(ogr.wkbMultiPolygon)
+    for geom in geoms:
+        if geom.GetGeometryType() == ogr.wkbMultiPolygon:
+            for i in range(geom.GetGeometryCount()):
+                multi.AddGeometry(geom.GetGeometryRef(i))
+        else:
+            multi.AddGeometry(geom)
+    try:
+        union = multi.UnionCascaded()
+    except Exception:
+        union = None
+    if union is None:
+        union = tree_union(geoms)
+    return union
+
+
+class FootprintUnion(object):
+    '''
+    Union of footprint rings with its envelope, area and orientation.
+    '''
+    def __init__(self, footprints):
+        '''
+        @param footprints: list of rings of (x, y), i.e. (lon, lat), coordinates
+        '''
+        if len(footprints) == 0:
+            raise ValueError('No footprints to union')
+        self.footprints = [make_polygon(coords) for coords in footprints]
+        self.geometry = cascaded_union(self.footprints)
+        #(minX, maxX, minY, maxY) as OGR
+        self.envelope = self.geometry.GetEnvelope()
+        self.area = self.geometry.GetArea()
+        ring = self.exterior()
+        self.orientation = COUNTERCLOCKWISE if signed_area(ring) > 0 else CLOCKWISE
+
+    def exterior(self):
+        '''
+        Exterior ring of the union (of its largest part if it is not connected).
+        '''
+        geom = self.geometry
+        if geom.GetGeometryType() == ogr.wkbMultiPolygon:
+            parts = [geom.GetGeometryRef(i) for i in range(geom.GetGeometryCount())]
+            geom = max(parts, key=lambda g: g.GetArea())
+        ring = geom.GetGeometryRef(0)
+        return [ring.GetPoint_2D(i) for i in range(ring.GetPointCount())]
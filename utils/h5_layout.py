@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+'''
+Storage layout for time series stacks in HDF5.
+
+Stacks are read both one epoch at a time (browse images, stitching) and one
+pixel at a time (time series extraction). A contiguous dataset serves the first
+pattern but forces the second to touch the whole file. The helpers here pick
+chunk shapes that keep both patterns bounded, optionally with lossless
+compression, and buffer epoch-by-epoch writes into whole chunk slabs so that
+compressed chunks are written once.
+
+Running this module benchmarks both access patterns on a synthetic stack:
+
+    python h5_layout.py --shape 100 2000 2000 --compression gzip
+'''
+from __future__ import division
+from __future__ import print_function
+import os
+import time
+import argparse
+import tempfile
+import h5py
+import numpy as np
+
+#target size of a chunk in bytes
+CHUNK_BYTES = 1 << 20
+
+#epochs per chunk along the stack axis
+STACK_DEPTH = 16
+
+def dataset_options(compression=None, level=4):
+    '''
+    Keyword arguments for create_dataset for the given lossless compression.
+    @param compression: None, 'gzip' or 'lzf'
+    @param level: gzip level
+    '''
+    if compression is None:
+        return {}
+    if compression == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': level, 'shuffle': True}
+    if compression == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    raise ValueError('Unsupported compression: {}'.format(compression))
+
+def even_split(n, size):
+    '''
+    Largest block length <= size that splits n into the same number of blocks
+    as size does, which keeps the padding of the last chunk small.
+    '''
+    nblocks = -(-n // max(1, size))
+    return -(-n // nblocks)
+
+def image_chunks(shape, dtype, depth=1, chunk_bytes=CHUNK_BYTES):
+    '''
+    Square spatial tile (rows, cols) such that depth tiles fit in chunk_bytes.
+    '''
+    nelem = max(1, chunk_bytes // (np.dtype(dtype).itemsize * depth))
+    side = max(1, int(np.sqrt(nelem)))
+    rows = even_split(shape[0], side)
+    cols = even_split(shape[1], max(side, nelem // rows))
+    return (rows, cols)
+
+def stack_chunks(shape, dtype, axis=0, depth=STACK_DEPTH, chunk_bytes=CHUNK_BYTES):
+    '''
+    Chunk shape for a 3D stack with the epoch (or parameter) dimension on axis.
+    A chunk holds depth epochs of a spatial tile, so that reading one epoch
+    reads depth times the image and reading one pixel reads nepochs/depth chunks.
+    '''
+    depth = even_split(shape[axis], max(1, depth))
+    image = [n for i,n in enumerate(shape) if i != axis]
+    tile = list(image_chunks(image, dtype, depth=depth, chunk_bytes=chunk_bytes))
+    tile.insert(axis, depth)
+    return tuple(tile)
+
+def create_stack(group, name, shape, dtype, axis=0, compression=None,
+                 depth=STACK_DEPTH, **kwargs):
+    '''
+    Create a chunked 3D stack dataset with the epoch dimension on axis.
+    '''
+    chunks = stack_chunks(shape, dtype, axis=axis, depth=depth)
+    opts = dataset_options(compression)
+    opts.update(kwargs)
+    return group.create_dataset(name, shape, dtype=dtype, chunks=chunks, **opts)
+
+def create_image(group, name, data=None, shape=None, dtype=None, compression=None, **kwargs):
+    '''
+    Create a chunked 2D dataset. Small or 1D arrays are stored contiguous.
+    '''
+    if data is not None:
+        data = np.asarray(data)
+        shape = data.shape
+        dtype = data.dtype
+    opts = {}
+    if len(shape) == 2 and np.prod(shape) * np.dtype(dtype).itemsize > CHUNK_BYTES:
+        opts = dataset_options(compression)
+        opts['chunks'] = image_chunks(shape, dtype)
+    opts.update(kwargs)
+    return group.create_dataset(name, shape=shape, dtype=dtype, data=data, **opts)
+
+class SlabWriter(object):
+    '''
+    Buffers single epoch writes to a stack and flushes them one chunk deep
+    along the stack axis, so every chunk is written (and compressed) once.
+    '''
+    def __init__(self, dset, axis=0):
+        self._dset = dset
+        self._axis = axis
+        chunks = dset.chunks
+        self._depth = chunks[axis] if chunks else 1
+        shape = list(dset.shape)
+        shape[axis] = self._depth
+        self._buf = np.empty(shape, dset.dtype)
+        self._start = 0
+        self._count = 0
+
+    def _index(self, start, stop):
+        index = [slice(None)] * self._dset.ndim
+        index[self._axis] = slice(start, stop)
+        return tuple(index)
+
+    def write(self, j, image):
+        '''
+        Store image as epoch j. Consecutive epochs are buffered up to the next
+        chunk boundary, any other order just flushes more often.
+        '''
+        if self._count > 0 and (j != self._start + self._count or j % self._depth == 0):
+            self.flush()
+        if self._count == 0:
+            self._start = j
+        self._buf[self._index(self._count, self._count + 1)] = np.expand_dims(image, self._axis)
+        self._count += 1
+
+    def flush(self):
+        if self._count == 0:
+            return
+        self._dset[self._index(self._start, self._start + self._count)] = self._buf[self._index(0, self._count)]
+        self._count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+def iter_row_blocks(dset, axis_rows=0, rows=None):
+    '''
+    Yield (start, stop) row ranges aligned with the dataset chunks.
+    '''
+    nrows = dset.shape[axis_rows]
+    if rows is None:
+        rows = dset.chunks[axis_rows] if dset.chunks else 256
+        #read a few chunk rows at a time
+        rows = rows * max(1, 256 // rows)
+    for start in range(0, nrows, rows):
+        yield start, min(nrows, start + rows)
+
+def benchmark(shape, dtype='float32', compression=None, depth=STACK_DEPTH, npix=20, workdir=None):
+    '''
+    Time per epoch image reads and per pixel time series reads on a synthetic
+    stack stored contiguous and chunked. Returns a dict of timings in seconds.
+    '''
+    nepoch, length, width = shape
+    rng = np.random.RandomState(0)
+    layouts = [('contiguous', None), ('chunked', compression)]
+    results = {}
+    for label, comp in layouts:
+        fd, fname = tempfile.mkstemp(suffix='.h5', dir=workdir)
+        os.close(fd)
+        try:
+            t0 = time.time()
+            with h5py.File(fname, 'w') as fid:
+                if label == 'contiguous':
+                    dset = fid.create_dataset('recons', shape, dtype=dtype)
+                else:
+                    dset = create_stack(fid, 'recons', shape, dtype, compression=comp, depth=depth)
+                with SlabWriter(dset) as writer:
+                    for j in range(nepoch):
+                        #smooth field so that compression sees realistic data
+                        image = np.cumsum(rng.standard_normal((length, width)).astype(dtype), axis=1)
+                        writer.write(j, image)
+            write_time = time.time() - t0
+            size = os.path.getsize(fname)
+
+            with h5py.File(fname, 'r') as fid:
+                dset = fid['recons']
+                t0 = time.time()
+                for j in range(0, nepoch, max(1, nepoch // 5)):
+                    dset[j, :, :]
+                epoch_time = time.time() - t0
+
+                t0 = time.time()
+                for ii, jj in zip(rng.randint(0, length, npix), rng.randint(0, width, npix)):
+                    dset[:, ii, jj]
+                pixel_time = time.time() - t0
+
+            results[label] = {'write': write_time, 'epoch': epoch_time,
+                              'pixel': pixel_time, 'bytes': size}
+        finally:
+            os.remove(fname)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HDF5 stack layouts')
+    parser.add_argument('--shape', type=int, nargs=3, default=[64, 1024, 1024],
+                        help='nepochs length width of the synthetic stack')
+    parser.add_argument('--compression', default=None, choices=[None, 'gzip', 'lzf'])
+    parser.add_argument('--depth', type=int, default=STACK_DEPTH, help='epochs per chunk')
+    parser.add_argument('--npix', type=int, default=20, help='number of pixel time series to read')
+    parser.add_argument('--dir', dest='workdir', default=None, help='directory for the test files')
+    inps = parser.parse_args()
+
+    results = benchmark(tuple(inps.shape), compression=inps.compression,
+                        depth=inps.depth, npix=inps.npix, workdir=inps.workdir)
+    print('{:12s} {:>10s} {:>10s} {:>10s} {:>12s}'.format('layout', 'write(s)', 'epoch(s)', 'pixel(s)', 'size(MB)'))
+    for label, res in results.items():
+        print('{:12s} {:10.3f} {:10.3f} {:10.3f} {:12.1f}'.format(label, res['write'], res['epoch'],
+                                                                res['pixel'], res['bytes'] / 2.**20))
+
+if __name__ == '__main__':
+    main()
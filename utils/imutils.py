@@ -4,13 +4,19 @@ from builtins import range
 from past.utils import old_div
 import sys
 import os
+import shutil
+import hashlib
 import isce
 from isceobj.Image.Image import Image
 import numpy as np
 from utils.UrlUtils import UrlUtils
+from utils.cache_utils import cache_dir, atomic_write
 
 __all__ = ['download_data','get_image','get_size','fix_xml','compute_residues',
-           'get_water_mask','crop_mask']
+           'get_water_mask','stitch_water_mask','crop_mask','read_window']
+
+#memory ceiling of the temporaries of one residue tile
+TILE_BYTES = 64*1024*1024
 
 def download_data(url):
     uu = UrlUtils()
@@ -43,27 +49,96 @@ def fix_xml(fname):
         fp.write(l.replace('merged/',''))
     fp.close()
 
-def compute_residues(phase):
-    a = old_div(phase[:,:],(2*np.pi))
-    resid = np.zeros(a[1:,1:].shape,dtype = np.int8)
-    mats = [a[:-1,:-1],a[:-1,1:],a[1:,1:],a[1:,:-1]]
-    nmats = len(mats)
-    for i in range(nmats):
-        resid  =  resid + np.round(mats[(i+1)%nmats] - mats[i]).astype(np.int8)
+def compute_residues(phase,tile_bytes=TILE_BYTES):
+    '''
+    Residues of the 2x2 phase loops, computed in tiles of rows so that the
+    temporaries stay under tile_bytes. Each rounded difference between
+    neighbors is computed once and shared by the two loops it borders.
+    '''
+    length,width = phase.shape
+    resid = np.zeros((length - 1,width - 1),dtype = np.int8)
+    rows = max(1,tile_bytes//(width*8*4))
+    for i0 in range(0,length - 1,rows):
+        i1 = min(length - 1,i0 + rows)
+        a = old_div(phase[i0:i1 + 1,:],(2*np.pi))
+        #differences along the rows and along the columns
+        h = np.round(a[:,1:] - a[:,:-1]).astype(np.int8)
+        v = np.round(a[1:,:] - a[:-1,:]).astype(np.int8)
+        resid[i0:i1,:] = h[:-1,:] + v[:,1:] - h[1:,:] - v[:,:-1]
     return resid
 
+def get_wbd_cache_dir():
+    '''
+    Return the water mask cache directory, creating it if needed. None if disabled.
+    Set ARIA_WBD_CACHE to relocate it or to "none" to disable caching.
+    '''
+    return cache_dir('wbd','ARIA_WBD_CACHE')
+
+def stitch_water_mask(oname,bbox,url=None):
+    '''
+    Stitch the water mask of bbox (as passed to wbdStitcher.py) into oname,
+    reusing the mask stitched earlier for the same bbox and url.
+    Expects wbdStitcher.xml in the working directory. Returns True on success.
+    '''
+    cache_dir = get_wbd_cache_dir()
+    if cache_dir is not None:
+        key = hashlib.md5((bbox + '|' + str(url)).encode('utf-8')).hexdigest()
+        cached = os.path.join(cache_dir,key + '.wbd')
+        if os.path.exists(cached) and os.path.exists(cached + '.xml'):
+            print('using cached water mask',cached)
+            shutil.copyfile(cached,oname)
+            im = get_image(cached + '.xml')
+            im.filename = oname
+            im.renderHdr()
+            return True
+
+    command = 'wbdStitcher.py wbdStitcher.xml wbdstitcher.wbdstitcher.bbox=' + bbox \
+                + ' wbdstitcher.wbdstitcher.outputfile=' + oname
+    if url is not None:
+        command += ' wbdstitcher.wbdstitcher.url=' + url
+    print('running',command)
+    if os.system(command) != 0:
+        return False
+
+    if cache_dir is not None:
+        try:
+            #header first, the data file marks the entry complete
+            im = get_image(oname + '.xml')
+            im.filename = cached
+            im.renderHdr()
+            with open(oname,'rb') as fp:
+                atomic_write(cached,lambda out: shutil.copyfileobj(fp,out),'wb')
+        except Exception as e:
+            print('Cannot cache water mask',oname,e)
+    return True
+
 def get_water_mask(oname,image):
     latmax = np.ceil(image.coord2.coordStart)
     latmin = np.floor(image.coord2.coordStart + image.coord2.coordSize * image.coord2.coordDelta)
     lonmin = np.floor(image.coord1.coordStart)
     lonmax = np.ceil(image.coord1.coordStart + image.coord1.coordSize * image.coord1.coordDelta)
     bbox = ''.join(str([latmin, latmax, lonmin, lonmax]).split())
-    command = 'wbdStitcher.py wbdStitcher.xml wbdstitcher.wbdstitcher.bbox=' + bbox \
-                + ' wbdstitcher.wbdstitcher.outputfile=' + oname
-    print('running',command)
-    if os.system(command) != 0:
+    if not stitch_water_mask(oname,bbox):
         print("Error")
 
+def read_window(im,row,nrows,col,ncols,step=1):
+    '''
+    Return rows row:row+nrows:step and columns col:col+ncols:step of band 0 of im.
+    Single band images are mapped from the first needed line on, so only the
+    lines of the window are read. Raises ValueError if the window is not
+    inside the image.
+    '''
+    length = im.coord2.coordSize
+    width = im.coord1.coordSize
+    if row < 0 or col < 0 or row + nrows > length or col + ncols > width:
+        raise ValueError('Window of {0}x{1} at ({2},{3}) is outside of {4} ({5}x{6})'.format(
+                         nrows,ncols,row,col,im.filename,length,width))
+    if im.bands != 1:
+        return np.array(im.memMap(band=0)[row:row + nrows:step,col:col + ncols:step])
+    dtype = np.dtype(im.toNumpyDataType())
+    lines = np.memmap(im.filename,dtype,'r',offset=row*width*dtype.itemsize,shape=(nrows,width))
+    return np.array(lines[::step,col:col + ncols:step])
+
 def crop_mask(im1,im2,outname):
     latstart1 = im1.coord2.coordStart
     latsize1 = im1.coord2.coordSize
@@ -78,23 +153,18 @@ def crop_mask(im1,im2,outname):
     lonsize2 = im2.coord1.coordSize
     londelta2 = im2.coord1.coordDelta
     ilatstart = abs(int(round(old_div((latstart2-latstart1),latdelta2))))
-    ilatend = ilatstart + latsize1
     ilonstart = abs(int(round(old_div((lonstart2-lonstart1),londelta2))))
-    ilonend = ilonstart + lonsize1
-    imIn = im2.memMap(band=0)
-    imCrop = np.memmap(outname,im2.toNumpyDataType(),'w+',shape=(latsize1,lonsize1))    
-    imCrop[:,:] =  imIn[ilatstart:ilatend,ilonstart:ilonend]
+    imCrop = read_window(im2,ilatstart,latsize1,ilonstart,lonsize1)
+    imCrop.tofile(outname)
     im3 = im2.clone()
     im3.filename = outname
-    im3.coord2.coordStart = latstart1 
-    im3.coord2.coordSize = latsize1 
-    im3.coord2.coordDelta = latdelta1 
+    im3.coord2.coordStart = latstart1
+    im3.coord2.coordSize = latsize1
+    im3.coord2.coordDelta = latdelta1
     im3.coord2.coordEnd = latstart1 + latsize1*latdelta1
-    im3.coord1.coordStart = lonstart1 
-    im3.coord1.coordSize = lonsize1 
-    im3.coord1.coordDelta = londelta1 
+    im3.coord1.coordStart = lonstart1
+    im3.coord1.coordSize = lonsize1
+    im3.coord1.coordDelta = londelta1
     im3.coord1.coordEnd = lonstart1 + lonsize1*londelta1
     im3.renderHdr()
-    return np.copy(imCrop)
-
-
+    return imCrop
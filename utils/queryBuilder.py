@@ -6,6 +6,7 @@ import json
 import requests
 from pprint import pprint
 from utils.UrlUtils import UrlUtils
+from utils.catalog_client import scroll_hits, unique
 from datetime import datetime, timedelta
 try:
     from frameMetadata.FrameMetadata import FrameMetadata
@@ -164,32 +165,33 @@ def removeDuplicates(qlist):
         
     
       
-def postQuery(query,sv='',conf=''):
-    #r = requests.post('%s/%s/_search?search_type=scan&scroll=10m&size=100' % (es_url, index), data=json.dumps(query))
+#_source fields needed to build the metadata returned by postQuery
+metaFields = ['id','urls','metadata']
+
+def iterQuery(query,sv='',conf='',fields=metaFields):
+    """
+    Stream the metadata of all the hits of query, deduplicated by url.
+    Pages are fetched lazily over a pooled session and only the _source
+    fields listed in fields are transferred.
+    """
     index,es_url = getIndexAndUrl(sv,conf)
-    #r = requests.post('%s/%s/_search?search_type=scan&scroll=10m&size=100' % (es_url, index), data=query)
-    r = requests.post('%s/%s/_search?search_type=scan&scroll=10m&size=100' % (es_url, index), data=json.dumps(query))
-    status = True
-    retList = []
-    if r.status_code != 200:
+    def metas():
+        for hit in scroll_hits(es_url,index,query,source_fields=fields):
+            #url is not part of the metadata, so add it
+            meta = hit['_source']['metadata']
+            meta['url'] = hit['_source']['urls'][0]
+            meta['id'] = hit['_source']['id']
+            yield meta
+    return unique(metas(),key=lambda meta: meta['url'])
+
+def postQuery(query,sv='',conf=''):
+    try:
+        retList = list(iterQuery(query,sv,conf))
+        status = True
+    except requests.HTTPError as e:
+        print('Query failed:',e)
+        retList = []
         status = False
-    else:
-        scan_result = r.json()
-        #print("scan_result: {}".format(json.dumps(scan_result, indent=2)))
-        if '_scroll_id' in scan_result:
-            scroll_id = scan_result['_scroll_id']
-            while True:
-                r = requests.post('%s/_search/scroll?scroll=10m' % es_url, data=scroll_id)
-                res = r.json()
-                scroll_id = res['_scroll_id']
-                if len(res['hits']['hits']) == 0: break
-                for hit in res['hits']['hits']:
-                    #url is not part of the metadata, so add it
-                    hit['_source']['metadata']['url'] = hit['_source']['urls'][0]
-                    retList.append(hit['_source']['metadata'])
-                    hit['_source']['metadata']['id'] = hit['_source']['id']
-    if status:
-        retList = removeDuplicates(retList)
     return retList,status
 def createMetaObjects(metaList):
     retList = []
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+'''
+On-disk cache of parsed Sentinel-1 metadata.
+
+The same SLC is parsed by the enumerator, the metadata extractor and every
+interferogram that reuses it. This module keeps the results of the expensive
+XML parsing steps (annotation bursts, precise orbit state vectors and AUX_CAL
+elevation antenna patterns) in a small versioned pickle store so that later
+steps can reload them instead of walking the XML trees again.
+
+Entries are keyed on a hash of the file content, so the same SLC extracted in
+different work directories maps to the same entry while files that merely share
+a name (every AUX_CAL is s1?-aux-cal.xml) never do. Objects built by a parser
+outside this module are also keyed on that parser's namespace and version, see
+makeKey(). Bump CACHE_VERSION whenever the layout of a cached object changes.
+'''
+import os
+import pickle
+import hashlib
+import datetime
+from xml.etree.ElementTree import ElementTree
+from utils.cache_utils import cache_dir, atomic_write
+
+CACHE_VERSION = 2
+
+#bytes read at a time when hashing a file
+HASH_BLOCK = 1 << 20
+
+#in-process memo so that swaths of the same SLC share one load
+_memo = {}
+
+#in-process memo of file hashes: (realpath, mtime, size) -> sha1
+_signatures = {}
+
+def getCacheDir():
+    '''
+    Return the cache directory, creating it if needed.
+    Set ARIA_S1_PARSE_CACHE to relocate it or to "none" to disable caching.
+    '''
+    return cache_dir('s1_parse', 'ARIA_S1_PARSE_CACHE')
+
+def fileSignature(path):
+    '''
+    Identity of a file for cache purposes: sha1 of its content. Hashes are
+    memoized per real path, modification time and size.
+    '''
+    if not path:
+        return ''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 'missing:' + os.path.basename(path)
+    ident = (os.path.realpath(path), st.st_mtime, st.st_size)
+    if ident not in _signatures:
+        h = hashlib.sha1()
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(HASH_BLOCK), b''):
+                h.update(block)
+        _signatures[ident] = h.hexdigest()
+    return _signatures[ident]
+
+def makeKey(kind, *parts, namespace=None):
+    '''
+    Build a cache key for an entry of the given kind. Objects produced by a
+    parser outside this module must pass a namespace naming that parser and
+    its version, e.g. 'interferogram.sentinel.Sentinel1_TOPS:1', so that
+    parsers building different objects from the same file never share entries.
+    '''
+    h = hashlib.sha1(('%s|%s|%d|' % (kind, namespace, CACHE_VERSION) + '|'.join([str(p) for p in parts])).encode('utf-8'))
+    return kind + '_' + h.hexdigest()
+
+def load(key):
+    '''
+    Return the cached object for key or None if not present or stale.
+    '''
+    if key in _memo:
+        return pickle.loads(_memo[key])
+    cacheDir = getCacheDir()
+    if cacheDir is None:
+        return None
+    filename = os.path.join(cacheDir, key + '.pck')
+    try:
+        with open(filename, 'rb') as fp:
+            entry = pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        return None
+    _memo[key] = entry['data']
+    return pickle.loads(entry['data'])
+
+def dump(key, obj):
+    '''
+    Store obj under key. Failures are reported but never fatal.
+    '''
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    _memo[key] = data
+    cacheDir = getCacheDir()
+    if cacheDir is None:
+        return
+    entry = {'version': CACHE_VERSION, 'data': data}
+    try:
+        atomic_write(os.path.join(cacheDir, key + '.pck'),
+                     lambda fp: pickle.dump(entry, fp, protocol=pickle.HIGHEST_PROTOCOL), 'wb')
+    except OSError as err:
+        print('Cannot write S1 parse cache entry %s: %s' % (key, err))
+
+def readPreciseOrbit(orbitFile):
+    '''
+    Return all state vectors of a precise/restituted orbit file as a list of
+    (time, [x,y,z], [vx,vy,vz]) tuples. The whole file is cached so that every
+    swath and burst window of an acquisition reuses the same entry.
+    '''
+    key = makeKey('orbit', fileSignature(orbitFile))
+    svs = load(key)
+    if svs is not None:
+        return svs
+
+    with open(orbitFile, 'r') as fp:
+        root = ElementTree(file=fp).getroot()
+
+    svs = []
+    for child in root.find('Data_Block/List_of_OSVs'):
+        timestamp = datetime.datetime.strptime(child.find('UTC').text[4:], "%Y-%m-%dT%H:%M:%S.%f")
+        pos = [float(child.find(tag).text) for tag in ['X','Y','Z']]
+        vel = [float(child.find(tag).text) for tag in ['VX','VY','VZ']]
+        svs.append((timestamp, pos, vel))
+
+    dump(key, svs)
+    return svs
+
+def readElevationAntennaPattern(auxFile, swath, polarization):
+    '''
+    Return (elevationAngleIncrement, IQ values) of the 2 way elevation antenna
+    pattern for the given swath and polarization from an AUX_CAL file.
+    '''
+    key = makeKey('eap', fileSignature(auxFile), swath, polarization)
+    eap = load(key)
+    if eap is not None:
+        return eap
+
+    with open(auxFile, 'r') as fp:
+        root = ElementTree(file=fp).getroot()
+
+    eap = None
+    for par in root.find('calibrationParamsList'):
+        if par.find('swath').text == swath and par.find('polarisation').text == polarization:
+            delta_theta = float(par.find('elevationAntennaPattern/elevationAngleIncrement').text)
+            Geap_IQ = [float(val) for val in par.find('elevationAntennaPattern/values').text.split()]
+            eap = (delta_theta, Geap_IQ)
+
+    if eap is None:
+        raise Exception('No elevation antenna pattern for swath %s polarization %s in %s' % (swath, polarization, auxFile))
+
+    dump(key, eap)
+    return eap
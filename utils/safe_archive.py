@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+'''
+Selective access to zipped Sentinel-1 SAFE products.
+
+A zipped SLC is mostly measurement TIFFs (one per swath and polarization),
+while most steps only look at the manifest, the annotation XMLs or the
+quick-look. SafeArchive lists the members of the zip, reads single members
+without unpacking anything and extracts only what a step asks for:
+
+    safe = SafeArchive('S1A_IW_SLC__1SDV_....zip')
+    safe.read('manifest.safe')
+    safe.extract_metadata()                     # everything but measurement/
+    safe.extract_swaths(swaths=[1], pols=['vv']) # metadata + IW1 VV TIFF
+
+Members already extracted with the right size are not extracted again, so
+more swaths or polarizations can be pulled in later on demand.
+'''
+import os
+import re
+import shutil
+import logging
+from zipfile import ZipFile
+
+logger = logging.getLogger('safe_archive')
+
+#s1a-iw1-slc-vv-20150101t000000-...-001.tiff
+MEMBER_RE = re.compile(r'^s1\w-(?P<swath>[a-z]{2}\d?)-\w+?-(?P<pol>[hv]{2})-', re.IGNORECASE)
+
+CHUNK_SIZE = 1 << 20
+
+
+def swath_name(swath):
+    '''
+    Normalize a swath number or name (1, '1', 'IW1') to 'iw1'.
+    '''
+    swath = str(swath).strip().lower()
+    return swath if swath[:1].isalpha() else 'iw' + swath
+
+
+class SafeArchive(object):
+    '''
+    Zipped SAFE product with selective extraction.
+    '''
+    def __init__(self, zip_file, dest='.'):
+        '''
+        @param zip_file: path of the zipped SAFE
+        @param dest: directory the SAFE directory is extracted to
+        '''
+        self.zip_file = zip_file
+        self.dest = dest
+        self.zf = ZipFile(zip_file, 'r')
+        self.infos = dict((i.filename, i) for i in self.zf.infolist() if not i.filename.endswith('/'))
+        tops = set(n.split('/')[0] for n in self.infos if n.split('/')[0].endswith('.SAFE'))
+        if len(tops) != 1:
+            raise RuntimeError('Expected one SAFE directory in {}, found {}'.format(zip_file, sorted(tops)))
+        self.safe_name = tops.pop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    @property
+    def safe_dir(self):
+        '''
+        Path of the (possibly partially) extracted SAFE directory.
+        '''
+        return os.path.join(self.dest, self.safe_name)
+
+    def members(self, subdir=None):
+        '''
+        Member paths relative to the SAFE directory, optionally only those under subdir.
+        '''
+        prefix = self.safe_name + '/'
+        names = sorted(n[len(prefix):] for n in self.infos if n.startswith(prefix))
+        if subdir is not None:
+            names = [n for n in names if n.startswith(subdir.rstrip('/') + '/')]
+        return names
+
+    def measurements(self, swaths=None, pols=None):
+        '''
+        Measurement members of the given swaths and polarizations (all if None).
+        '''
+        swaths = None if swaths is None else set(swath_name(s) for s in swaths)
+        pols = None if pols is None else set(p.lower() for p in pols)
+        ret = []
+        for name in self.members('measurement'):
+            match = MEMBER_RE.search(os.path.basename(name))
+            if not match:
+                continue
+            if swaths is not None and match.group('swath').lower() not in swaths:
+                continue
+            if pols is not None and match.group('pol').lower() not in pols:
+                continue
+            ret.append(name)
+        return ret
+
+    def read(self, member):
+        '''
+        Contents of a member (path relative to the SAFE directory) without extracting it.
+        '''
+        return self.zf.read(self.safe_name + '/' + member)
+
+    def open(self, member):
+        '''
+        File object on a member (path relative to the SAFE directory).
+        '''
+        return self.zf.open(self.safe_name + '/' + member)
+
+    def extract(self, members):
+        '''
+        Extract members (paths relative to the SAFE directory) that are not
+        already on disk. Returns the number of bytes written.
+        '''
+        written = 0
+        for member in members:
+            info = self.infos[self.safe_name + '/' + member]
+            path = os.path.join(self.safe_dir, member)
+            if os.path.exists(path) and os.path.getsize(path) == info.file_size:
+                continue
+            parent = os.path.dirname(path)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            tmp = path + '.tmp'
+            with self.zf.open(info) as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.rename(tmp, path)
+            written += info.file_size
+        return written
+
+    def extract_metadata(self):
+        '''
+        Extract everything except the measurement TIFFs. Returns the SAFE directory.
+        '''
+        members = [n for n in self.members() if not n.startswith('measurement/')]
+        written = self.extract(members)
+        logger.info('Extracted {} metadata members ({} bytes) of {}'.format(len(members), written, self.zip_file))
+        return self.safe_dir
+
+    def extract_swaths(self, swaths=None, pols=None):
+        '''
+        Extract the metadata and the measurement TIFFs of the given swaths and
+        polarizations. Returns the SAFE directory.
+        '''
+        self.extract_metadata()
+        members = self.measurements(swaths, pols)
+        written = self.extract(members)
+        skipped = len(self.members('measurement')) - len(members)
+        logger.info('Extracted {} measurement members ({} bytes) of {}, skipped {}'.format(
+                    len(members), written, self.zip_file, skipped))
+        return self.safe_dir
+
+
+def extract_safe(zip_file, swaths=None, pols=None, dest='.'):
+    '''
+    Extract the metadata and the requested swaths / polarizations of a zipped SAFE.
+    Returns the SAFE directory.
+    '''
+    with SafeArchive(zip_file, dest) as safe:
+        return safe.extract_swaths(swaths, pols)